@@ -0,0 +1,83 @@
+"""
+Compare reading the processes on a gpu and its power samples as lists of
+ctypes structures with reading them as numpy arrays (as_array=True), and
+then adding up the memory and power.
+
+The simulated gpu runs --procs processes and holds --samples power samples.
+
+To Run:
+$ python benchmarks/bench_arrays.py --procs 1000 --samples 1000
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceGetComputeRunningProcesses,
+                             nvmlDeviceGetSamples,
+                             NVML_TOTAL_POWER_SAMPLES)
+from py3nvml.simulated import SimulatedNvml
+
+
+def timed(fn, runs):
+    start = time.time()
+    for _ in range(runs):
+        fn()
+    return (time.time() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--procs', type=int, default=1000)
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    with SimulatedNvml(1) as sim:
+        d = sim.devices[0]
+        for pid in range(args.procs):
+            d.add_process(1000 + pid, 1 << 20)
+        d.sample_buffer_size = args.samples
+        d.add_samples(NVML_TOTAL_POWER_SAMPLES,
+                      [(t, 100000 + t) for t in range(1, args.samples + 1)])
+        nvmlInit()
+        h = nvmlDeviceGetHandleByIndex(0)
+
+        # The simulated driver fills the buffers in Python, which a real one
+        # doesn't, so it is timed on its own
+        def driver():
+            nvmlDeviceGetComputeRunningProcesses(h, as_array=True)
+            nvmlDeviceGetSamples(h, NVML_TOTAL_POWER_SAMPLES, 0,
+                                 as_array=True)
+
+        def lists():
+            procs = nvmlDeviceGetComputeRunningProcesses(h)
+            memory = sum(p.usedGpuMemory for p in procs)
+            _, samples = nvmlDeviceGetSamples(h, NVML_TOTAL_POWER_SAMPLES, 0)
+            power = sum(s.sampleValue.uiVal for s in samples)
+            return memory, power
+
+        def arrays():
+            procs = nvmlDeviceGetComputeRunningProcesses(h, as_array=True)
+            memory = procs['usedGpuMemory'].sum()
+            _, samples = nvmlDeviceGetSamples(h, NVML_TOTAL_POWER_SAMPLES, 0,
+                                              as_array=True)
+            power = samples['sampleValue']['uiVal'].sum()
+            return memory, power
+
+        assert lists() == arrays()
+        t_driver = timed(driver, args.runs)
+        t_lists = timed(lists, args.runs)
+        t_arrays = timed(arrays, args.runs)
+        nvmlShutdown()
+
+    print('{} processes, {} samples'.format(args.procs, args.samples))
+    print('Simulated driver: {:.0f} us'.format(t_driver * 1e6))
+    print('As lists:  {:.0f} us'.format(t_lists * 1e6))
+    print('As arrays: {:.0f} us'.format(t_arrays * 1e6))
+
+
+if __name__ == '__main__':
+    main()
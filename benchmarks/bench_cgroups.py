@@ -0,0 +1,114 @@
+"""
+Measure the cost of attributing gpu use to containers on a busy node.
+
+Builds a fake /proc with --containers containers of --per-container processes
+each, spread over --gpus simulated gpus with accounting on. Times a poll of the
+attributor when nothing changed and when --churn of the processes were
+replaced since the last poll, and with accounting off, next to reading
+/proc/<pid>/cgroup for every process on every poll. With accounting on, most of
+a poll goes to reading the stats of the running processes.
+
+To Run:
+$ python benchmarks/bench_cgroups.py --containers 300
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.cgroups import CgroupAttributor
+from py3nvml.procinfo import parse_cgroup
+
+
+def make_process(proc, pid, container):
+    d = os.path.join(proc, str(pid))
+    os.mkdir(d)
+    with open(os.path.join(d, 'stat'), 'w') as f:
+        f.write('{} (python) S 1 1 1 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 100 0 '
+                '0\n'.format(pid))
+    with open(os.path.join(d, 'cgroup'), 'w') as f:
+        f.write('0::/system.slice/docker-{:064x}.scope\n'.format(container))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--containers', type=int, default=300)
+    parser.add_argument('--per-container', type=int, default=2)
+    parser.add_argument('--churn', type=float, default=0.05)
+    parser.add_argument('--polls', type=int, default=20)
+    args = parser.parse_args()
+
+    proc = tempfile.mkdtemp()
+    try:
+        with SimulatedNvml(args.gpus) as sim:
+            pids = []
+            for c in range(args.containers):
+                for _ in range(args.per_container):
+                    pid = 1000 + len(pids)
+                    make_process(proc, pid, c)
+                    d = sim.devices[len(pids) % args.gpus]
+                    d.add_process(pid, 1 << 20)
+                    d.account(pid, time=1)
+                    pids.append((pid, c, d))
+            nvmlInit()
+            attributor = CgroupAttributor(proc=proc)
+            attributor.poll()
+
+            start = time.time()
+            for _ in range(args.polls):
+                attributor.poll()
+            t_steady = (time.time() - start) / args.polls
+            memory_only = CgroupAttributor(proc=proc, accounting=False)
+            memory_only.poll()
+            start = time.time()
+            for _ in range(args.polls):
+                memory_only.poll()
+            t_memory = (time.time() - start) / args.polls
+
+            churn = int(len(pids) * args.churn)
+            next_pid = 1000 + len(pids)
+            spent = 0
+            for _ in range(args.polls):
+                for i in range(churn):
+                    pid, c, d = pids.pop(0)
+                    d.remove_process(pid)
+                    d.account(pid, isRunning=0)
+                    shutil.rmtree(os.path.join(proc, str(pid)))
+                    make_process(proc, next_pid, c)
+                    d.add_process(next_pid, 1 << 20)
+                    d.account(next_pid, time=1)
+                    pids.append((next_pid, c, d))
+                    next_pid += 1
+                start = time.time()
+                attributor.poll()
+                spent += time.time() - start
+            t_churn = spent / args.polls
+
+            start = time.time()
+            for _ in range(args.polls):
+                for pid, _, _ in pids:
+                    with open(os.path.join(proc, str(pid), 'cgroup')) as f:
+                        parse_cgroup(f.read())
+            t_naive = (time.time() - start) / args.polls
+            nvmlShutdown()
+    finally:
+        shutil.rmtree(proc)
+
+    print('{} containers, {} processes on {} gpus'.format(
+        args.containers, len(pids), args.gpus))
+    print('poll, nothing changed:       {:.2f} ms'.format(t_steady * 1e3))
+    print('poll, accounting off:        {:.2f} ms'.format(t_memory * 1e3))
+    print('poll, {:.0f}% of pids replaced:  {:.2f} ms'.format(
+        args.churn * 100, t_churn * 1e3))
+    print('read every cgroup file only: {:.2f} ms'.format(t_naive * 1e3))
+
+
+if __name__ == "__main__":
+    main()
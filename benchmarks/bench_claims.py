@@ -0,0 +1,65 @@
+"""
+Benchmark grab_gpus with claims when many jobs start at once.
+
+Starts a number of processes on a simulated node that all call
+grab_gpus(claim=...) at the same moment, checks that no two of them got the
+same GPU and reports the claim throughput.
+
+To Run:
+$ python benchmarks/bench_claims.py --jobs 100 --gpus 128
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.utils import grab_gpus, GpuClaimRegistry
+
+
+def job(args):
+    path, num_devices, num_gpus, barrier, results = args
+    registry = GpuClaimRegistry(path)
+    sim = SimulatedNvml(num_devices).install()
+    barrier.wait()
+    start = time.time()
+    n = grab_gpus(num_gpus, claim=registry)
+    results.put((os.getpid(), n, os.environ['CUDA_VISIBLE_DEVICES'],
+                 start, time.time()))
+    sim.uninstall()
+    # Hold on to the claims until everyone is done
+    barrier.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=100)
+    parser.add_argument('--gpus', type=int, default=128)
+    parser.add_argument('--per-job', type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'claims.json')
+    barrier = multiprocessing.Barrier(args.jobs)
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(
+        target=job, args=((path, args.gpus, args.per_job, barrier, results),))
+        for _ in range(args.jobs)]
+    for p in procs:
+        p.start()
+    out = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    grabbed = [g for r in out for g in r[2].split(',') if g]
+    start = min(r[3] for r in out)
+    end = max(r[4] for r in out)
+    print('{} jobs claimed {} gpus in {:.3f}s ({:.0f} claims/s)'.format(
+        args.jobs, len(grabbed), end - start, args.jobs / (end - start)))
+    print('Disjoint: {}'.format(len(grabbed) == len(set(grabbed))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare answering "highest graphics clock at memory clock X" from the driver
+with answering it from a :class:`ClockTable`.
+
+Each simulated gpu supports --memory memory clocks, with --graphics graphics
+clocks each.
+
+To Run:
+$ python benchmarks/bench_clocks.py --memory 4 --graphics 180
+"""
+from __future__ import print_function
+
+import argparse
+from collections import OrderedDict
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceGetSupportedMemoryClocks,
+                             nvmlDeviceGetSupportedGraphicsClocks)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.clocks import ClockTable, get_clock_table
+
+
+def from_driver(handle):
+    return dict((m, nvmlDeviceGetSupportedGraphicsClocks(handle, m))
+                for m in nvmlDeviceGetSupportedMemoryClocks(handle))
+
+
+def timed(fn, runs):
+    start = time.time()
+    for _ in range(runs):
+        fn()
+    return (time.time() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--memory', type=int, default=4)
+    parser.add_argument('--graphics', type=int, default=180)
+    parser.add_argument('--runs', type=int, default=1000)
+    args = parser.parse_args()
+
+    with SimulatedNvml(1) as sim:
+        d = sim.devices[0]
+        d.supported_clocks = OrderedDict(
+            (877 + 100 * m, [2000 - 7 * g for g in range(args.graphics)])
+            for m in range(args.memory))
+        nvmlInit()
+        h = nvmlDeviceGetHandleByIndex(0)
+        mem = 877
+
+        calls = sim.calls
+        from_driver(h)
+        c_lists = sim.calls - calls
+        calls = sim.calls
+        ClockTable.from_device(h)
+        c_table = sim.calls - calls
+
+        t_lists = timed(lambda: from_driver(h), args.runs)
+        t_table = timed(lambda: ClockTable.from_device(h), args.runs)
+        t_lookup_driver = timed(
+            lambda: max(nvmlDeviceGetSupportedGraphicsClocks(h, mem)),
+            args.runs)
+        table = get_clock_table(h)
+        t_lookup_table = timed(lambda: table.max_graphics(mem),
+                               args.runs * 100)
+        t_nearest = timed(lambda: table.nearest_graphics(mem, 1500),
+                          args.runs * 100)
+        nvmlShutdown()
+
+    print('{} memory clocks x {} graphics clocks'.format(args.memory,
+                                                         args.graphics))
+    print('Read as lists:     {} calls, {:.0f} us'.format(c_lists,
+                                                           t_lists * 1e6))
+    print('Read as a table:   {} calls, {:.0f} us'.format(c_table,
+                                                           t_table * 1e6))
+    print('max graphics clock from the driver {:.1f} us, from the table '
+          '{:.2f} us'.format(t_lookup_driver * 1e6, t_lookup_table * 1e6))
+    print('nearest graphics clock from the table {:.2f} us'.format(
+        t_nearest * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure the cost and accuracy of metering energy on a simulated node.
+
+Each simulated gpu runs bursts of work: 300 W for a fraction of every
+--period seconds and 60 W otherwise, with the driver taking a power sample
+every 10 ms. The meter polls once a second of simulated time. Prints the
+driver calls and time each poll takes, and the error of the metered energy
+next to the error of reading nvmlDeviceGetPowerUsage once a second instead.
+
+To Run:
+$ python benchmarks/bench_energy.py --gpus 64
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             NVML_TOTAL_POWER_SAMPLES)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.energy import EnergyMeter
+
+
+def power(t, period, duty):
+    return 300000 if (t % period) < duty * period else 60000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=64)
+    parser.add_argument('--seconds', type=int, default=120)
+    parser.add_argument('--period', type=float, default=2.3)
+    parser.add_argument('--duty', type=float, default=0.3)
+    args = parser.parse_args()
+
+    step = 10000  # us between samples
+    t0 = int(time.time()) * 10 ** 6
+    with SimulatedNvml(args.gpus) as sim:
+        nvmlInit()
+        meter = EnergyMeter(history=args.seconds + 10)
+        polled = 0.0
+        spent = 0.0
+        calls = 0
+        for s in range(args.seconds):
+            for d in sim.devices:
+                d.add_samples(NVML_TOTAL_POWER_SAMPLES, [
+                    (t0 + s * 10 ** 6 + i * step,
+                     power(s + i * step / 1e6, args.period, args.duty))
+                    for i in range(10 ** 6 // step)])
+            # The once a second reading sees the power at that instant
+            if s:
+                polled += power(s, args.period, args.duty) / 1000
+            c = sim.calls
+            start = time.time()
+            meter.poll()
+            spent += time.time() - start
+            calls += sim.calls - c
+        metered = meter.energy([sim.devices[0].uuid])[sim.devices[0].uuid]
+        nvmlShutdown()
+
+    end = args.seconds - 1 + (10 ** 6 - step) / 1e6
+    dt = 0.001
+    true = sum(power(i * dt, args.period, args.duty) / 1000 * dt
+               for i in range(int(round(end / dt))))
+    t = spent / args.seconds
+    print('{} gpus: {:.0f} driver calls and {:.2f} ms per poll '
+          '({:.1f} us per gpu)'.format(args.gpus, calls / args.seconds,
+                                       t * 1e3, t / args.gpus * 1e6))
+    print('{:.0f} J used over {:.0f} s'.format(true, end))
+    print('samples: {:.0f} J ({:+.2f}%)'.format(
+        metered, (metered - true) / true * 100))
+    print('power usage once a second: {:.0f} J ({:+.2f}%)'.format(
+        polled, (polled - true) / true * 100))
+
+
+if __name__ == "__main__":
+    main()
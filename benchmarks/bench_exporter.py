@@ -0,0 +1,75 @@
+"""
+Load test the Prometheus exporter on a simulated node.
+
+Serves the metrics of --gpus simulated gpus, whose driver calls each take
+--latency seconds, and scrapes /metrics from --clients threads for --duration
+seconds. Scrape latency should not depend on either.
+
+To Run:
+$ python benchmarks/bench_exporter.py --gpus 64 --latency 0.001
+"""
+from __future__ import print_function
+
+import argparse
+import threading
+import time
+from urllib.request import urlopen
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.exporter import MetricsExporter
+
+
+def scrape(url, stop, latencies):
+    while not stop.is_set():
+        start = time.time()
+        urlopen(url).read()
+        latencies.append(time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.001)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--interval', type=float, default=1)
+    args = parser.parse_args()
+
+    with SimulatedNvml(args.gpus, latency=args.latency) as sim:
+        nvmlInit()
+        for i, d in enumerate(sim.devices):
+            d.add_process(1000 + i, 1 << 30)
+        exporter = MetricsExporter(interval=args.interval)
+        start = time.time()
+        _, port = exporter.start(port=0, addr='127.0.0.1')
+        t_sample = time.time() - start
+        url = 'http://127.0.0.1:{}/metrics'.format(port)
+
+        stop = threading.Event()
+        latencies = []
+        threads = [threading.Thread(target=scrape, args=(url, stop, latencies))
+                   for _ in range(args.clients)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        size = len(exporter.metrics())
+        exporter.stop()
+        nvmlShutdown()
+
+    latencies.sort()
+    print('{} gpus, {:.0f} ms per snapshot, {} byte page'.format(
+        args.gpus, t_sample * 1e3, size))
+    print('{} scrapes in {}s from {} clients ({:.0f}/s)'.format(
+        len(latencies), args.duration, args.clients,
+        len(latencies) / args.duration))
+    print('Scrape latency p50 {:.2f} ms, p99 {:.2f} ms'.format(
+        latencies[len(latencies) // 2] * 1e3,
+        latencies[int(len(latencies) * 0.99)] * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Run a simulated fleet on one machine.
+
+Starts a collector and --hosts agent processes, each with --gpus simulated
+gpus sampled every --interval seconds, and a job starting or stopping on
+a random gpu of every host now and then. Prints how many bytes the deltas take
+compared to full snapshots, and how long fleet queries take.
+
+To Run:
+$ python benchmarks/bench_fleet.py --hosts 64 --gpus 8
+"""
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import random
+import time
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml, SimulatedDevice
+from py3nvml.snapshot import Sampler
+from py3nvml.fleet import Agent, Collector, KEYFRAME
+
+
+def agent(address, host, gpus, interval, duration, results):
+    rng = random.Random(host)
+    sizes = {True: [], False: []}
+    devices = [SimulatedDevice(i, total_memory=80 << 30) for i in range(gpus)]
+    with SimulatedNvml(devices=devices) as sim:
+        nvmlInit()
+        sampler = Sampler(interval)
+        a = Agent(address, host=host)
+        pid = 1000
+        end = time.time() + duration
+        while time.time() < end:
+            d = rng.choice(sim.devices)
+            if rng.random() < 0.1:
+                if d.processes:
+                    d.remove_process(d.processes[0].pid)
+                else:
+                    pid += 1
+                    d.add_process(pid, rng.randint(1, 60) << 30)
+            d.power_usage = rng.randint(50, 300) * 1000
+            snap = sampler.sample()
+            message = a.encode(snap)
+            sizes[message[0] == KEYFRAME].append(len(message))
+            a.send(snap)
+            time.sleep(interval)
+        a.close()
+        nvmlShutdown()
+    results.put(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hosts', type=int, default=64)
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--interval', type=float, default=0.1)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    collector = Collector(('127.0.0.1', 0))
+    address = collector.start()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(
+        target=agent, args=(address, 'node{}'.format(i), args.gpus,
+                            args.interval, args.duration, results))
+        for i in range(args.hosts)]
+    for p in procs:
+        p.start()
+    time.sleep(args.duration / 2)
+
+    n = 200
+    start = time.time()
+    for _ in range(n):
+        free = collector.free_gpus(min_free=40 << 30, max_age=10)
+    t_query = (time.time() - start) / n
+    ages = collector.hosts().values()
+
+    keyframes, deltas = [], []
+    for _ in procs:
+        sizes = results.get()
+        keyframes += sizes[True]
+        deltas += sizes[False]
+    for p in procs:
+        p.join()
+    collector.stop()
+
+    print('{} hosts of {} gpus, {} gpus free with 40GB'.format(
+        args.hosts, args.gpus, len(free)))
+    print('Full snapshot {:.0f} bytes, delta {:.0f} bytes on average '
+          '({} deltas)'.format(sum(keyframes) / len(keyframes),
+                               sum(deltas) / max(1, len(deltas)), len(deltas)))
+    print('free_gpus over the fleet {:.2f} ms, oldest host {:.2f}s'.format(
+        t_query * 1e3, max(ages)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare a per minute health check with :class:`HealthScanner` to reading the
+ECC and retired page sections of nvidia_smi every time.
+
+To Run:
+$ python benchmarks/bench_health.py --gpus 64 --latency 0.0001
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, nvmlDeviceGetCount,
+                             nvmlDeviceGetHandleByIndex, NVML_VOLATILE_ECC,
+                             NVML_AGGREGATE_ECC,
+                             NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                             NVML_MEMORY_ERROR_TYPE_UNCORRECTED)
+from py3nvml import nvidia_smi
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.health import HealthScanner
+
+
+def smi(handles):
+    for h in handles:
+        for c in (NVML_VOLATILE_ECC, NVML_AGGREGATE_ECC):
+            for e in (NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                      NVML_MEMORY_ERROR_TYPE_UNCORRECTED):
+                nvidia_smi.GetEccByType(h, c, e)
+        nvidia_smi.GetRetiredPagesStr(h)
+
+
+def measure(sim, fn, runs):
+    calls = sim.calls
+    start = time.time()
+    for _ in range(runs):
+        fn()
+    return (time.time() - start) / runs, (sim.calls - calls) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.0001)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with SimulatedNvml(args.gpus, latency=args.latency) as sim:
+        nvmlInit()
+        handles = [nvmlDeviceGetHandleByIndex(i)
+                   for i in range(nvmlDeviceGetCount())]
+        scanner = HealthScanner()
+        scanner.scan()
+        t_smi, c_smi = measure(sim, lambda: smi(handles), args.runs)
+        t_scan, c_scan = measure(sim, scanner.scan, args.runs)
+        nvmlShutdown()
+
+    print('{} gpus, {:.1f} ms per driver call'.format(args.gpus,
+                                                      args.latency * 1e3))
+    print('nvidia_smi sections: {:.0f} calls, {:.1f} ms'.format(
+        c_smi, t_smi * 1e3))
+    print('HealthScanner.scan:  {:.0f} calls, {:.1f} ms'.format(
+        c_scan, t_scan * 1e3))
+
+
+if __name__ == "__main__":
+    main()
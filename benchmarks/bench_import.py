@@ -0,0 +1,61 @@
+"""
+Benchmark the import time of py3nvml.
+
+Runs a fresh interpreter with -X importtime for each import statement and
+reports the median of the time python spent importing py3nvml and its
+submodules, including everything they import.
+
+To Run:
+$ python benchmarks/bench_import.py --runs 20
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+STATEMENTS = [
+    'import py3nvml',
+    'import py3nvml.py3nvml',
+    'from py3nvml import grab_gpus',
+    'import py3nvml.nvidia_smi',
+]
+
+
+def import_time(statement):
+    """ Returns the import time of the statement in us """
+    env = dict(os.environ)
+    # Import the py3nvml next to this script
+    path = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+    if env.get('PYTHONPATH'):
+        path.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(path)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                         stderr=subprocess.PIPE, env=env,
+                         universal_newlines=True, check=True).stderr
+    total = 0
+    for line in out.splitlines():
+        # import time: self [us] | cumulative | imported package
+        # Nested imports are indented. The submodules are imported after the
+        # package when they are loaded lazily, so they are at the top level
+        # too.
+        fields = line.split('|')
+        if (len(fields) == 3 and fields[2].startswith(' py3nvml')):
+            total += int(fields[1])
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    for statement in STATEMENTS:
+        times = sorted(import_time(statement) for _ in range(args.runs))
+        print('{:<32} {:6.1f} ms'.format(statement,
+                                         times[len(times) // 2] / 1e3))
+
+
+if __name__ == "__main__":
+    main()
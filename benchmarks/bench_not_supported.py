@@ -0,0 +1,87 @@
+"""
+Benchmark querying fields that aren't supported by the device.
+
+Compares catching NVMLError_NotSupported with passing default= to the query
+functions, on simulated GeForce-like boards where about half of the queried
+fields are not supported. Both benefit from the capability cache, which stops
+unsupported queries reaching the driver after the first time.
+
+To Run:
+$ python benchmarks/bench_not_supported.py
+"""
+from __future__ import print_function
+
+import timeit
+
+from py3nvml.py3nvml import *
+from py3nvml.simulated import SimulatedNvml, GEFORCE_UNSUPPORTED
+
+QUERIES = [
+    (nvmlDeviceGetSerial, ()),
+    (nvmlDeviceGetInforomImageVersion, ()),
+    (nvmlDeviceGetInforomVersion, (NVML_INFOROM_ECC,)),
+    (nvmlDeviceGetEccMode, ()),
+    (nvmlDeviceGetTotalEccErrors, (NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                                   NVML_VOLATILE_ECC)),
+    (nvmlDeviceGetMemoryErrorCounter, (NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                                       NVML_VOLATILE_ECC,
+                                       NVML_MEMORY_LOCATION_L1_CACHE)),
+    (nvmlDeviceGetAccountingMode, ()),
+    (nvmlDeviceGetApplicationsClock, (NVML_CLOCK_GRAPHICS,)),
+    (nvmlDeviceGetName, ()),
+    (nvmlDeviceGetUUID, ()),
+    (nvmlDeviceGetFanSpeed, ()),
+    (nvmlDeviceGetTemperature, (NVML_TEMPERATURE_GPU,)),
+    (nvmlDeviceGetPowerUsage, ()),
+    (nvmlDeviceGetClockInfo, (NVML_CLOCK_GRAPHICS,)),
+    (nvmlDeviceGetMemoryInfo, ()),
+    (nvmlDeviceGetUtilizationRates, ()),
+]
+
+
+def with_exceptions(handles):
+    for h in handles:
+        for fn, args in QUERIES:
+            try:
+                fn(h, *args)
+            except NVMLError_NotSupported:
+                pass
+
+
+def with_default(handles):
+    for h in handles:
+        for fn, args in QUERIES:
+            fn(h, *args, default=None)
+
+
+def main(num_devices=8, number=200):
+    sim = SimulatedNvml(num_devices).install()
+    for d in sim.devices:
+        d.unsupported = set(GEFORCE_UNSUPPORTED)
+    nvmlInit()
+    handles = [nvmlDeviceGetHandleByIndex(i) for i in range(num_devices)]
+    n = number * num_devices * len(QUERIES)
+
+    # Alternate the two so that noise on the machine hits both alike
+    t_exc = t_def = float('inf')
+    for _ in range(7):
+        t_exc = min(t_exc, timeit.timeit(lambda: with_exceptions(handles),
+                                         number=number))
+        t_def = min(t_def, timeit.timeit(lambda: with_default(handles),
+                                         number=number))
+    print('{} queries, {} unsupported per device'.format(
+        len(QUERIES), sum(fn.__name__ in GEFORCE_UNSUPPORTED
+                          for fn, _ in QUERIES)))
+    print('try/except NVMLError:  {:.2f} us/query'.format(t_exc / n * 1e6))
+    print('default=None:          {:.2f} us/query'.format(t_def / n * 1e6))
+    print('Speedup: {:.2f}x'.format(t_exc / t_def))
+    calls = sim.calls
+    with_default(handles)
+    print('Driver calls per pass: {} of {} queries'.format(
+        sim.calls - calls, num_devices * len(QUERIES)))
+    nvmlShutdown()
+    sim.uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare reading PCIe throughput one call at a time with :class:`PcieMonitor`.
+
+Every simulated driver call blocks for --latency seconds, like the sampling
+window of nvmlDeviceGetPcieThroughput.
+
+To Run:
+$ python benchmarks/bench_pcie.py --gpus 16 --latency 0.02
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, nvmlDeviceGetCount,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceGetPcieThroughput,
+                             nvmlDeviceGetCurrPcieLinkGeneration,
+                             nvmlDeviceGetCurrPcieLinkWidth,
+                             NVML_PCIE_UTIL_TX_BYTES, NVML_PCIE_UTIL_RX_BYTES)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.pcie import PcieMonitor
+
+
+def sequential(handles):
+    for h in handles:
+        nvmlDeviceGetPcieThroughput(h, NVML_PCIE_UTIL_TX_BYTES)
+        nvmlDeviceGetPcieThroughput(h, NVML_PCIE_UTIL_RX_BYTES)
+        nvmlDeviceGetCurrPcieLinkGeneration(h)
+        nvmlDeviceGetCurrPcieLinkWidth(h)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with SimulatedNvml(args.gpus, latency=args.latency):
+        nvmlInit()
+        handles = [nvmlDeviceGetHandleByIndex(i)
+                   for i in range(nvmlDeviceGetCount())]
+        t_seq = t_pool = 0
+        with PcieMonitor() as monitor:
+            for _ in range(args.runs):
+                start = time.time()
+                sequential(handles)
+                t_seq += time.time() - start
+                start = time.time()
+                monitor.poll()
+                t_pool += time.time() - start
+        nvmlShutdown()
+
+    print('{} gpus, {:.0f} ms per call'.format(args.gpus, args.latency * 1e3))
+    print('One at a time: {:.0f} ms'.format(t_seq / args.runs * 1e3))
+    print('PcieMonitor:   {:.0f} ms'.format(t_pool / args.runs * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare pool workers reading a shared snapshot to querying the driver.
+
+Runs --tasks tasks on a pool of --workers processes forked from a parent with
+a simulated node of --gpus gpus. Each task needs the state of the gpus: either
+it reads the snapshot shared by the parent's sampler, or it initializes NVML
+and takes a snapshot itself. Prints the time per task both ways.
+
+To Run:
+$ python benchmarks/bench_pool.py --gpus 8 --workers 8
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import time
+
+from py3nvml import py3nvml
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import Sampler, take_snapshot
+from py3nvml.pool import snapshot_pool, worker_snapshot
+
+
+def shared(_):
+    return len(worker_snapshot().uuids)
+
+
+def own(_):
+    py3nvml.nvmlInit()
+    try:
+        return len(take_snapshot().uuids)
+    finally:
+        py3nvml.nvmlShutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.00005)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('fork')
+    with SimulatedNvml(args.gpus, latency=args.latency):
+        py3nvml.nvmlInit()
+        sampler = Sampler()
+        pool = snapshot_pool(sampler, args.workers, context=ctx)
+        for fn in (shared, own):
+            pool.map(fn, range(args.workers))
+            start = time.time()
+            pool.map(fn, range(args.tasks), chunksize=1)
+            t = (time.time() - start) / args.tasks
+            print('{:>6}: {:.3f} ms per task'.format(fn.__name__, t * 1e3))
+        pool.terminate()
+        pool.join()
+        py3nvml.nvmlShutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measure the cost of naming the processes on the gpus in every report.
+
+Puts up to --processes of the processes running on this machine onto
+--gpus simulated gpus, then times naming all of them the way reports used to,
+with nvmlSystemGetProcessName each time, and through a ProcessInfoCache
+(which reads /proc/<pid>/stat to check for reused pids). The simulated driver
+takes --latency seconds per call.
+
+To Run:
+$ python benchmarks/bench_procinfo.py --processes 256
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os
+import time
+
+from py3nvml import py3nvml
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.procinfo import ProcessInfoCache
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=256)
+    parser.add_argument('--reports', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.00002)
+    args = parser.parse_args()
+
+    pids = sorted(int(p) for p in os.listdir('/proc') if p.isdigit())
+    pids = pids[:args.processes]
+    with SimulatedNvml(args.gpus, latency=args.latency) as sim:
+        for i, pid in enumerate(pids):
+            sim.devices[i % args.gpus].add_process(pid, 1 << 20)
+        py3nvml.nvmlInit()
+
+        start = time.time()
+        for _ in range(args.reports):
+            for pid in pids:
+                py3nvml.nvmlSystemGetProcessName(pid)
+        t_nvml = (time.time() - start) / args.reports
+
+        cache = ProcessInfoCache()
+        calls = sim.calls
+        start = time.time()
+        for _ in range(args.reports):
+            for pid in pids:
+                cache.get(pid)
+        t_cache = (time.time() - start) / args.reports
+        calls = sim.calls - calls
+        py3nvml.nvmlShutdown()
+
+    print('{} processes, {} reports'.format(len(pids), args.reports))
+    print('nvmlSystemGetProcessName: {:.2f} ms per report'.format(
+        t_nvml * 1e3))
+    print('ProcessInfoCache:         {:.2f} ms per report, {} driver calls '
+          'in all'.format(t_cache * 1e3, calls))
+
+
+if __name__ == "__main__":
+    main()
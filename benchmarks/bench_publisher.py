@@ -0,0 +1,74 @@
+"""
+Compare reading a published snapshot to taking one from the driver.
+
+Publishes the snapshots of a simulated node of --gpus gpus through shared
+memory, then times reading them back in another process, both when a new
+snapshot was published since the last read and when it wasn't, next to the
+time taking a snapshot from the driver takes.
+
+To Run:
+$ python benchmarks/bench_publisher.py --gpus 8
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import Sampler
+from py3nvml.publisher import SnapshotPublisher, SnapshotReader
+
+
+def read(name, reads, results):
+    reader = SnapshotReader(name)
+    start = time.time()
+    for _ in range(reads):
+        reader.read()
+    cached = (time.time() - start) / reads
+    start = time.time()
+    for _ in range(reads):
+        reader._last = (0, None)
+        reader.read()
+    fresh = (time.time() - start) / reads
+    reader.close()
+    results.put((cached, fresh))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--reads', type=int, default=100000)
+    parser.add_argument('--latency', type=float, default=0.00005)
+    args = parser.parse_args()
+
+    name = 'py3nvml_bench_{}'.format(os.getpid())
+    with SimulatedNvml(args.gpus, latency=args.latency) as sim:
+        for i, d in enumerate(sim.devices):
+            d.add_process(1000 + i, 1 << 30)
+        nvmlInit()
+        sampler = Sampler()
+        with SnapshotPublisher(sampler, name):
+            start = time.time()
+            for _ in range(100):
+                sampler.sample()
+            t_sample = (time.time() - start) / 100
+            results = multiprocessing.Queue()
+            p = multiprocessing.Process(target=read,
+                                        args=(name, args.reads, results))
+            p.start()
+            cached, fresh = results.get()
+            p.join()
+        nvmlShutdown()
+
+    print('{} gpus'.format(args.gpus))
+    print('take a snapshot and publish it: {:.1f} us'.format(t_sample * 1e6))
+    print('read a new snapshot:            {:.1f} us'.format(fresh * 1e6))
+    print('read an unchanged snapshot:     {:.2f} us'.format(cached * 1e6))
+
+
+if __name__ == "__main__":
+    main()
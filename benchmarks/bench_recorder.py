@@ -0,0 +1,79 @@
+"""
+Benchmark the binary recorder.
+
+Writes an hour of per second snapshots of 8 gpus, then reads them back, and
+compares the size on disk with the same data written as text, one dict per
+gpu per line.
+
+To Run:
+$ python benchmarks/bench_recorder.py --seconds 3600 --gpus 8
+"""
+from __future__ import print_function
+
+import argparse
+from array import array
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from py3nvml.snapshot import Snapshot
+from py3nvml.recorder import Recorder, RECORD_FIELDS, load_segments
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=int, default=3600)
+    parser.add_argument('--gpus', type=int, default=8)
+    args = parser.parse_args()
+
+    uuids = ['GPU-{:08x}'.format(i) for i in range(args.gpus)]
+    snaps = []
+    for t in range(args.seconds):
+        values = array('q')
+        for _ in uuids:
+            values.extend([16 << 30, random.randrange(16 << 30), 0,
+                           random.randrange(100), random.randrange(100),
+                           random.randrange(50000, 250000),
+                           random.randrange(30, 90), 1100, 1100, 2505,
+                           random.randrange(1 << 20), random.randrange(1 << 20)])
+        snaps.append(Snapshot(t, uuids, RECORD_FIELDS, values, array('q')))
+
+    d = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        with Recorder(d, segment_size=16 << 20) as rec:
+            for s in snaps:
+                rec.write(s)
+        t_write = time.time() - start
+        size = sum(os.path.getsize(os.path.join(d, p)) for p in os.listdir(d))
+
+        text = os.path.join(tempfile.mkdtemp(), 'text.log')
+        with open(text, 'w') as f:
+            for s in snaps:
+                for u in uuids:
+                    f.write('{} {} {}\n'.format(s.timestamp, u, s.device(u)))
+        text_size = os.path.getsize(text)
+        shutil.rmtree(os.path.dirname(text))
+
+        start = time.time()
+        total = 0
+        for seg in load_segments(d):
+            total += seg.column(seg.array(), 'power.draw').sum()
+        t_read = time.time() - start
+    finally:
+        shutil.rmtree(d)
+
+    n = args.seconds * args.gpus
+    print('{} records written in {:.2f}s ({:.1f} us/snapshot)'.format(
+        n, t_write, t_write / args.seconds * 1e6))
+    print('Binary: {:.1f} MB ({:.0f} bytes/record)'.format(size / 1e6,
+                                                           size / n))
+    print('Text:   {:.1f} MB ({:.0f} bytes/record)'.format(text_size / 1e6,
+                                                           text_size / n))
+    print('Read back and summed one column in {:.1f} ms'.format(t_read * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare decoding the value union of the samples from nvmlDeviceGetSamples one
+sample at a time with decoding it in one step into numpy arrays, as
+decode=True does.
+
+Only the decoding is timed: the simulated driver fills its buffers in Python,
+which a real one doesn't. The simulated gpu holds --samples samples of each
+value type.
+
+To Run:
+$ python benchmarks/bench_samples.py --samples 10000
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceGetSamples, nvmlSamplesToNumpy,
+                             NVML_TOTAL_POWER_SAMPLES,
+                             NVML_VALUE_TYPE_DOUBLE,
+                             NVML_VALUE_TYPE_UNSIGNED_INT,
+                             NVML_VALUE_TYPE_UNSIGNED_LONG,
+                             NVML_VALUE_TYPE_UNSIGNED_LONG_LONG)
+from py3nvml.simulated import SimulatedNvml
+
+
+def per_sample(value_type, samples):
+    stamps, values = [], []
+    for s in samples:
+        stamps.append(s.timeStamp)
+        if value_type == NVML_VALUE_TYPE_DOUBLE:
+            values.append(s.sampleValue.dVal)
+        elif value_type == NVML_VALUE_TYPE_UNSIGNED_INT:
+            values.append(s.sampleValue.uiVal)
+        elif value_type == NVML_VALUE_TYPE_UNSIGNED_LONG:
+            values.append(s.sampleValue.ulVal)
+        else:
+            values.append(s.sampleValue.ullVal)
+    return stamps, values
+
+
+def timed(fn, runs):
+    start = time.time()
+    for _ in range(runs):
+        fn()
+    return (time.time() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=100)
+    args = parser.parse_args()
+
+    print('{} samples'.format(args.samples))
+    for value_type, name in ((NVML_VALUE_TYPE_DOUBLE, 'double'),
+                             (NVML_VALUE_TYPE_UNSIGNED_INT, 'unsigned int'),
+                             (NVML_VALUE_TYPE_UNSIGNED_LONG_LONG,
+                              'unsigned long long')):
+        with SimulatedNvml(1) as sim:
+            d = sim.devices[0]
+            d.sample_buffer_size = args.samples
+            d.add_samples(NVML_TOTAL_POWER_SAMPLES,
+                          [(t, t * 3) for t in range(1, args.samples + 1)],
+                          value_type)
+            nvmlInit()
+            h = nvmlDeviceGetHandleByIndex(0)
+            _, samples = nvmlDeviceGetSamples(h, NVML_TOTAL_POWER_SAMPLES, 0)
+            _, array = nvmlDeviceGetSamples(h, NVML_TOTAL_POWER_SAMPLES, 0,
+                                            as_array=True)
+            nvmlShutdown()
+        stamps, values = nvmlSamplesToNumpy(value_type, array)
+        assert (stamps.tolist(), values.tolist()) == \
+            per_sample(value_type, samples)
+        t_loop = timed(lambda: per_sample(value_type, samples), args.runs)
+        t_step = timed(lambda: nvmlSamplesToNumpy(value_type, array),
+                       args.runs)
+        print('{:>18}: one at a time {:.0f} us, in one step {:.1f} us'.format(
+            name, t_loop * 1e6, t_step * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure what a shared NVML session saves on repeated short queries.
+
+Calls grab_gpus --calls times on a simulated node, first on its own, where each
+call initializes and shuts down NVML, then inside one session. Prints the
+driver calls and time per grab_gpus. The simulated driver takes --latency
+seconds per call, and --init seconds to initialize, as a real driver takes much
+longer to initialize than to answer a query.
+
+To Run:
+$ python benchmarks/bench_session.py --gpus 8 --calls 200
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.session import get_session
+from py3nvml.utils import grab_gpus
+
+
+class SlowInitNvml(SimulatedNvml):
+    init_time = 0
+
+    def nvmlInit_v2(self):
+        time.sleep(self.init_time)
+        return super(SlowInitNvml, self).nvmlInit_v2()
+
+
+def run(sim, calls):
+    n = sim.calls
+    start = time.time()
+    for _ in range(calls):
+        grab_gpus(1)
+    return (sim.calls - n) / calls, (time.time() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0001)
+    parser.add_argument('--init', type=float, default=0.02)
+    args = parser.parse_args()
+
+    SlowInitNvml.init_time = args.init
+    with SlowInitNvml(args.gpus, latency=args.latency) as sim:
+        calls, t = run(sim, args.calls)
+        print('on its own:   {:.0f} driver calls, {:.2f} ms per '
+              'grab_gpus'.format(calls, t * 1e3))
+        with get_session():
+            calls, t = run(sim, args.calls)
+        print('in a session: {:.0f} driver calls, {:.2f} ms per '
+              'grab_gpus'.format(calls, t * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark diffing snapshots.
+
+Takes a series of snapshots of a simulated node while a few things change
+between them, then diffs every consecutive pair. For comparison, also diffs
+nvidia_smi.XmlDeviceQuery output of the same node as text with difflib.
+
+To Run:
+$ python benchmarks/bench_snapshot_diff.py --gpus 8 --snapshots 2000
+"""
+from __future__ import print_function
+
+import argparse
+import difflib
+import time
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown, NVML_CLOCK_SM
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import take_snapshot
+from py3nvml import nvidia_smi
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--snapshots', type=int, default=2000)
+    parser.add_argument('--xml', type=int, default=20,
+                        help='number of nvidia_smi xml dumps to diff')
+    args = parser.parse_args()
+
+    with SimulatedNvml(args.gpus) as sim:
+        nvmlInit()
+        snaps = []
+        start = time.time()
+        for i in range(args.snapshots):
+            dev = sim.devices[i % args.gpus]
+            if i % 10 == 0:
+                dev.add_process(1000 + i, 1 << 20)
+            dev.clocks[NVML_CLOCK_SM] = 1100 + i % 7
+            snaps.append(take_snapshot())
+        t_take = time.time() - start
+
+        start = time.time()
+        changes = 0
+        for a, b in zip(snaps, snaps[1:]):
+            d = a.diff(b)
+            changes += len(d.changes) + len(d.started)
+        t_diff = time.time() - start
+
+        xml = []
+        for i in range(args.xml):
+            sim.devices[i % args.gpus].clocks[NVML_CLOCK_SM] = 1100 + i % 7
+            xml.append(nvidia_smi.XmlDeviceQuery().splitlines())
+        start = time.time()
+        for a, b in zip(xml, xml[1:]):
+            list(difflib.unified_diff(a, b, n=0))
+        t_xml = time.time() - start
+        nvmlShutdown()
+
+    n = args.snapshots - 1
+    print('{} gpus, {} snapshots taken in {:.2f}s'.format(
+        args.gpus, args.snapshots, t_take))
+    print('Snapshot diff: {:.1f} us/diff ({} changes)'.format(
+        t_diff / n * 1e6, changes))
+    print('XML text diff: {:.1f} us/diff'.format(
+        t_xml / (args.xml - 1) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark reading the static gpu information from the cache file.
+
+Compares asking the (simulated) driver for everything with reading the cache
+file written by an earlier process. Each driver call is made to take --latency
+seconds.
+
+To Run:
+$ python benchmarks/bench_static_info.py --gpus 8 --latency 0.0001
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import tempfile
+import time
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.static_info import StaticInfoCache
+
+
+def timed_get(sim, cache):
+    nvmlInit()
+    calls = sim.calls
+    start = time.time()
+    cache.get()
+    t = time.time() - start
+    calls = sim.calls - calls
+    nvmlShutdown()
+    return t, calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.0001)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'static.json')
+    cache = StaticInfoCache(path)
+    with SimulatedNvml(args.gpus, latency=args.latency) as sim:
+        t_cold, calls_cold = timed_get(sim, cache)
+        t_warm, calls_warm = timed_get(sim, cache)
+    print('From the driver: {:.1f} ms, {} calls'.format(t_cold * 1e3,
+                                                       calls_cold))
+    print('From the cache:  {:.1f} ms, {} calls'.format(t_warm * 1e3,
+                                                       calls_warm))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure the cost of sampling throttling on a simulated node.
+
+Half the --gpus simulated gpus don't keep violation counters, like GeForce
+boards. Prints the driver calls and time each poll of the analyzer takes.
+
+To Run:
+$ python benchmarks/bench_throttle.py --gpus 64
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.throttle import ThrottleAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=64)
+    parser.add_argument('--polls', type=int, default=1000)
+    args = parser.parse_args()
+
+    with SimulatedNvml(args.gpus) as sim:
+        for d in sim.devices[::2]:
+            d.unsupported.add('nvmlDeviceGetViolationStatus')
+        nvmlInit()
+        analyzer = ThrottleAnalyzer(window=60)
+        analyzer.poll()
+        calls = sim.calls
+        start = time.time()
+        for _ in range(args.polls):
+            analyzer.poll()
+        t = (time.time() - start) / args.polls
+        calls = (sim.calls - calls) / args.polls
+        start = time.time()
+        for _ in range(args.polls):
+            analyzer.throttled()
+        t_query = (time.time() - start) / args.polls
+        nvmlShutdown()
+
+    print('{} gpus: {:.0f} driver calls and {:.2f} ms per poll '
+          '({:.1f} us per gpu)'.format(args.gpus, calls, t * 1e3,
+                                       t / args.gpus * 1e6))
+    print('throttled() over the window {:.2f} ms'.format(t_query * 1e3))
+
+
+if __name__ == "__main__":
+    main()
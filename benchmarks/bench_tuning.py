@@ -0,0 +1,63 @@
+"""
+Compare applying a profile to every gpu in parallel with :class:`Tuner` to
+setting one gpu at a time.
+
+Every simulated driver call takes --latency seconds; setting clocks and
+limits on real gpus can take tens of milliseconds.
+
+To Run:
+$ python benchmarks/bench_tuning.py --gpus 16 --latency 0.01
+"""
+from __future__ import print_function
+
+import argparse
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, nvmlDeviceGetCount,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceSetApplicationsClocks,
+                             nvmlDeviceSetPowerManagementLimit)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.tuning import Tuner, Profile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gpus', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    profile = Profile(memory_clock=2505, graphics_clock=1328,
+                      power_limit=200000)
+    with SimulatedNvml(args.gpus, latency=args.latency):
+        nvmlInit()
+        handles = [nvmlDeviceGetHandleByIndex(i)
+                   for i in range(nvmlDeviceGetCount())]
+        start = time.time()
+        for h in handles:
+            nvmlDeviceSetPowerManagementLimit(h, profile.power_limit)
+            nvmlDeviceSetApplicationsClocks(h, profile.memory_clock,
+                                            profile.graphics_clock)
+        t_seq = time.time() - start
+
+        tuner = Tuner()
+        # Read the constraints, as a long running tool would have
+        tuner.check(profile)
+        start = time.time()
+        tuner.apply(profile)
+        t_apply = time.time() - start
+        start = time.time()
+        tuner.rollback()
+        t_rollback = time.time() - start
+        nvmlShutdown()
+
+    print('{} gpus, {:.0f} ms per driver call'.format(args.gpus,
+                                                      args.latency * 1e3))
+    print('One at a time, unchecked: {:.0f} ms'.format(t_seq * 1e3))
+    print('Tuner.apply (checked, saving state): {:.0f} ms'.format(
+        t_apply * 1e3))
+    print('Tuner.rollback: {:.0f} ms'.format(t_rollback * 1e3))
+
+
+if __name__ == "__main__":
+    main()
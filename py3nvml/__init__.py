@@ -1,6 +1,27 @@
-from py3nvml import py3nvml
-from py3nvml import nvidia_smi
-from py3nvml.utils import grab_gpus
+import sys
 
-__all__ = ['py3nvml', 'nvidia_smi', 'grab_gpus']
+__all__ = ['py3nvml', 'nvidia_smi', 'grab_gpus', 'wait_for_gpus']
 __version__ = "0.1.0rc7"
+
+if sys.version_info >= (3, 7):
+    # Import the submodules when they are first used, so that importing the
+    # package doesn't pay for nvidia_smi and utils (and what they import)
+    # when only the bindings are needed.
+    def __getattr__(name):
+        if name in ('py3nvml', 'nvidia_smi'):
+            # importing a submodule sets it as an attribute of the package
+            __import__('py3nvml.' + name)
+            return globals()[name]
+        if name in ('grab_gpus', 'wait_for_gpus'):
+            __import__('py3nvml.utils')
+            value = globals()[name] = getattr(globals()['utils'], name)
+            return value
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:
+    from py3nvml import py3nvml
+    from py3nvml import nvidia_smi
+    from py3nvml.utils import grab_gpus, wait_for_gpus
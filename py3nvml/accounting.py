@@ -0,0 +1,176 @@
+"""
+Incremental collection of NVML accounting stats.
+
+With accounting mode on, the driver keeps stats for every process that ran on
+a gpu in a circular buffer. Re-reading the stats of every pid in that buffer
+on every poll gets expensive on busy nodes, so :class:`AccountingCollector`
+remembers what it has already seen. Each poll it only asks for the stats of
+pids that are new or were still running last time, and it reports every
+finished process exactly once.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.accounting import AccountingCollector
+
+    nvmlInit()
+    for record in AccountingCollector().stream(interval=10):
+        print(record.uuid, record.pid, record.time, record.maxMemoryUsage)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+from collections import Counter, namedtuple
+import logging
+import time
+
+from py3nvml import py3nvml
+
+#: The accounting stats of a process that has finished on a gpu. The fields
+#: are those of c_nvmlAccountingStats_t plus the gpu ``uuid`` and the ``pid``.
+#: ``complete`` is False if the process dropped out of the driver's buffer
+#: before it was seen to finish, in which case the stats are the last ones
+#: seen while it was running.
+AccountingRecord = namedtuple('AccountingRecord', [
+    'uuid', 'pid', 'gpuUtilization', 'memoryUtilization', 'maxMemoryUsage',
+    'time', 'startTime', 'complete'])
+
+
+class _DeviceState(object):
+    def __init__(self, handle, uuid):
+        self.handle = handle
+        self.uuid = uuid
+        self.bufferSize = None
+        # pid -> the last stats seen for processes that are still running
+        self.running = {}
+        # (pid, startTime) of the processes that have been reported and are
+        # still in the driver's buffer
+        self.done = set()
+        # pid -> how many times it was in the driver's buffer last poll
+        self.counts = {}
+
+
+class AccountingCollector(object):
+    """
+    Collects accounting stats of finished processes across gpus.
+
+    NVML must be initialized for as long as the collector is used.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to collect from. If None, uses all gpus.
+    """
+    def __init__(self, devices=None):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.devices = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.devices.append(
+                _DeviceState(handle, py3nvml.nvmlDeviceGetUUID(handle)))
+        self.logger = logging.getLogger(__name__)
+
+    def _pids(self, dev):
+        if dev.bufferSize is None:
+            dev.bufferSize = py3nvml.nvmlDeviceGetAccountingBufferSize(
+                dev.handle)
+        try:
+            return py3nvml.nvmlDeviceGetAccountingPids(
+                dev.handle, dev.bufferSize)
+        except py3nvml.NVMLError_InsufficientSize:
+            dev.bufferSize = None
+            return self._pids(dev)
+
+    def _poll_device(self, dev):
+        records = []
+        counts = Counter(self._pids(dev))
+        pids = set(counts)
+
+        # Processes that left the buffer between polls never get to say
+        # they finished. Report what we last saw of them.
+        for pid in list(dev.running):
+            if pid not in pids:
+                stats = dev.running.pop(pid)
+                records.append(self._record(dev, pid, stats, False))
+        dev.done = set(d for d in dev.done if d[0] in pids)
+
+        # The driver lists a pid once for each process in its buffer, but only
+        # has stats for the latest. A pid that was reported is only looked at
+        # again when it is listed more often than before, i.e. a new process
+        # reused it.
+        reported = set(pid for pid, _ in dev.done)
+        for pid in pids:
+            if pid in reported and pid not in dev.running and \
+                    counts[pid] <= dev.counts.get(pid, 0):
+                continue
+            try:
+                stats = py3nvml.nvmlDeviceGetAccountingStats(dev.handle, pid)
+            except py3nvml.NVMLError_NotFound:
+                # probably went away
+                dev.running.pop(pid, None)
+                continue
+            if stats.isRunning:
+                dev.running[pid] = stats
+            else:
+                dev.running.pop(pid, None)
+                if (pid, stats.startTime) not in dev.done:
+                    dev.done.add((pid, stats.startTime))
+                    records.append(self._record(dev, pid, stats, True))
+        dev.counts = counts
+        return records
+
+    @staticmethod
+    def _record(dev, pid, stats, complete):
+        return AccountingRecord(
+            dev.uuid, pid, stats.gpuUtilization, stats.memoryUtilization,
+            stats.maxMemoryUsage, stats.time, stats.startTime, complete)
+
+    def running(self):
+        """
+        Returns the last stats seen for processes that are still running.
+
+        Returns
+        -------
+        running : dict
+            Maps (uuid, pid) to a c_nvmlAccountingStats_t.
+        """
+        return dict(((dev.uuid, pid), stats) for dev in self.devices
+                    for pid, stats in dev.running.items())
+
+    def poll(self):
+        """
+        Checks all gpus for processes that finished since the last poll.
+
+        The first poll reports every finished process still in the driver's
+        buffers.
+
+        Returns
+        -------
+        records : list of :class:`AccountingRecord`
+        """
+        records = []
+        for dev in self.devices:
+            try:
+                records.extend(self._poll_device(dev))
+            except py3nvml.NVMLError as err:
+                self.logger.debug('Could not collect accounting stats from '
+                                  '{}: {}'.format(dev.uuid, err))
+        return records
+
+    def stream(self, interval=5.0):
+        """
+        Polls forever, yielding each finished process once.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between polls.
+        """
+        while True:
+            start = time.time()
+            for record in self.poll():
+                yield record
+            time.sleep(max(0, interval - (time.time() - start)))
@@ -0,0 +1,179 @@
+"""
+Attributing gpu use to cgroups and containers.
+
+To bill the tenants of a shared node, the processes on the gpus have to be
+mapped to the containers they run in. :class:`CgroupAttributor` keeps a map of
+pid to cgroup, read from /proc/<pid>/cgroup only for pids it hasn't seen on a
+gpu before or that a new process has taken since, and each poll adds up the
+gpu memory and, with accounting mode on, the gpu time of every cgroup across
+all gpus. Apart from the start time that tells reused pids apart, it only
+reads /proc as processes come and go, so it is cheap to poll every second.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.cgroups import CgroupAttributor
+
+    nvmlInit()
+    attributor = CgroupAttributor()
+    for usage in attributor.poll().values():
+        print(usage.container, usage.memory, usage.gpu_time)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import logging
+
+from py3nvml import py3nvml
+from py3nvml.accounting import AccountingCollector
+from py3nvml.procinfo import ProcessInfoCache
+
+#: The gpu use of a cgroup. ``memory`` is the gpu memory its processes use now,
+#: in bytes, and ``gpus`` splits it by gpu uuid. ``gpu_time`` is the
+#: milliseconds its processes have spent on gpus, as accounted by the driver:
+#: those that finished since the attributor started plus those running now.
+#: ``finished`` counts the processes that finished.
+CgroupUsage = namedtuple('CgroupUsage', [
+    'cgroup', 'container', 'pids', 'memory', 'gpus', 'gpu_time', 'finished'])
+
+
+class CgroupAttributor(object):
+    """
+    Adds up the gpu use of each cgroup across gpus.
+
+    NVML must be initialized for as long as the attributor is used.
+
+    Processes whose cgroup can't be read (e.g. they finished before they were
+    seen running) are counted under the cgroup None.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to watch. If None, watches all gpus.
+    proc : str
+        Where procfs is mounted.
+    accounting : bool
+        Add up gpu time from the driver's accounting stats. Gpus with
+        accounting mode off only count memory.
+    """
+    def __init__(self, devices=None, proc='/proc', accounting=True):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        devices = list(devices)
+        self.handles = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.handles.append((py3nvml.nvmlDeviceGetUUID(handle), handle))
+        self.cache = ProcessInfoCache(proc, use_nvml=False)
+        self.accounting = AccountingCollector(devices) if accounting else None
+        self.logger = logging.getLogger(__name__)
+        # pid -> (start time, (cgroup, container)) of the pids seen last poll
+        self._cgroups = {}
+        # cgroup -> [gpu time, processes] of finished processes
+        self._finished = {}
+        self._last = {}
+
+    def _cgroup(self, pid):
+        # -> (start time, (cgroup, container)). A pid seen last poll keeps its
+        # cgroup unless it now belongs to a process that started since.
+        start_time = self.cache.start_time(pid)
+        seen = self._cgroups.get(pid)
+        if seen is not None and start_time in (None, seen[0]):
+            return seen
+        info = self.cache.get(pid)
+        cgroup = (None, None) if info is None else \
+            (info.cgroup, info.container)
+        return start_time, cgroup
+
+    def poll(self):
+        """
+        Reads the processes on the gpus and adds up their use by cgroup.
+
+        Returns
+        -------
+        usage : dict
+            Maps each cgroup to a :data:`CgroupUsage`.
+        """
+        memory = {}
+        for uuid, handle in self.handles:
+            try:
+                procs = py3nvml.nvmlDeviceGetComputeRunningProcesses(handle)
+            except py3nvml.NVMLError as err:
+                self.logger.debug('Could not get the processes on {}: '
+                                  '{}'.format(uuid, err))
+                continue
+            for p in procs:
+                memory.setdefault(p.pid, {})[uuid] = p.usedGpuMemory or 0
+
+        running, records = {}, []
+        if self.accounting is not None:
+            records = self.accounting.poll()
+            for (_, pid), stats in self.accounting.running().items():
+                running[pid] = running.get(pid, 0) + stats.time
+
+        # Only pids not seen last poll, or reused since, are looked up.
+        # Finished processes are attributed to the cgroup they were seen in.
+        seen = dict((pid, self._cgroup(pid))
+                    for pid in set(memory) | set(running))
+        cgroups = dict((pid, cgroup) for pid, (_, cgroup) in seen.items())
+        for r in records:
+            cgroup = (self._cgroups.get(r.pid) or seen.get(r.pid) or
+                      (None, (None, None)))[1]
+            total = self._finished.setdefault(cgroup, [0, 0])
+            total[0] += r.time
+            total[1] += 1
+        self._cgroups = seen
+        self.cache.prune(cgroups)
+
+        groups = {}
+        for cgroup, (gpu_time, finished) in self._finished.items():
+            groups[cgroup] = [set(), {}, gpu_time, finished]
+        for pid, cgroup in cgroups.items():
+            g = groups.setdefault(cgroup, [set(), {}, 0, 0])
+            g[0].add(pid)
+            for uuid, used in memory.get(pid, {}).items():
+                g[1][uuid] = g[1].get(uuid, 0) + used
+            g[2] += running.get(pid, 0)
+
+        self._last = dict(
+            (cgroup, CgroupUsage(cgroup, container, tuple(sorted(pids)),
+                                 sum(gpus.values()), gpus, gpu_time,
+                                 finished))
+            for (cgroup, container), (pids, gpus, gpu_time, finished)
+            in groups.items())
+        return self._last
+
+    def usage(self):
+        """ Returns what the last :meth:`poll` returned """
+        return self._last
+
+    def containers(self):
+        """
+        Returns the usage of the last poll by container, adding up the
+        cgroups of each container. Processes outside containers are left out.
+
+        Returns
+        -------
+        usage : dict
+            Maps container id to a :data:`CgroupUsage` whose cgroup is None.
+        """
+        result = {}
+        for u in self._last.values():
+            if u.container is None:
+                continue
+            c = result.get(u.container)
+            if c is None:
+                result[u.container] = u._replace(cgroup=None)
+                continue
+            gpus = dict(c.gpus)
+            for uuid, used in u.gpus.items():
+                gpus[uuid] = gpus.get(uuid, 0) + used
+            result[u.container] = c._replace(
+                pids=tuple(sorted(c.pids + u.pids)), memory=c.memory + u.memory,
+                gpus=gpus, gpu_time=c.gpu_time + u.gpu_time,
+                finished=c.finished + u.finished)
+        return result
@@ -0,0 +1,192 @@
+"""
+Tables of the supported clocks of a gpu.
+
+A gpu supports a list of graphics clocks for each of its memory clocks. A
+:class:`ClockTable` holds them all in one flat array('I'), a row per memory
+clock, so lookups like "the highest graphics clock at this memory clock" don't
+go to the driver or build lists. :func:`get_clock_table` reads the table of a
+gpu once and keeps it for the life of the process.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit, nvmlDeviceGetHandleByIndex
+    from py3nvml.clocks import get_clock_table
+
+    nvmlInit()
+    table = get_clock_table(nvmlDeviceGetHandleByIndex(0))
+    mem = table.max_memory()
+    print(mem, table.max_graphics(mem), table.nearest_graphics(mem, 1300))
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from array import array
+from bisect import bisect_right
+import threading
+
+from py3nvml import py3nvml
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ClockTable(object):
+    """
+    The supported clocks of a gpu, in MHz.
+
+    Parameters
+    ----------
+    clocks : iterable of (memory, graphics) pairs
+        graphics is the list of graphics clocks supported at memory clock
+        memory, as returned by nvmlDeviceGetSupportedClocks. A dict of memory
+        clock to graphics clocks also works.
+
+    Attributes
+    ----------
+    memory : array.array of uint32
+        The memory clocks, highest first.
+    graphics : array.array of uint32
+        The graphics clocks for each memory clock, lowest first, in rows of
+        :attr:`width`. Rows with fewer clocks are padded with 0.
+    counts : array.array of uint32
+        How many graphics clocks each row has.
+    width : int
+    """
+    def __init__(self, clocks):
+        if isinstance(clocks, dict):
+            clocks = clocks.items()
+        rows = sorted(((int(mem), sorted(gfx)) for mem, gfx in clocks),
+                      reverse=True)
+        self.width = max([len(gfx) for _, gfx in rows] or [0])
+        self.memory = array('I', [mem for mem, _ in rows])
+        self.counts = array('I', [len(gfx) for _, gfx in rows])
+        self.graphics = array('I')
+        for _, gfx in rows:
+            self.graphics.extend(gfx)
+            self.graphics.extend([0] * (self.width - len(gfx)))
+        self._rows = dict((mem, i) for i, mem in enumerate(self.memory))
+
+    @classmethod
+    def from_device(cls, handle):
+        """
+        Reads the table of a gpu from the driver, or returns None if the gpu
+        doesn't report its supported clocks.
+        """
+        clocks = py3nvml.nvmlDeviceGetSupportedClocks(handle, default=None)
+        return None if clocks is None else cls(clocks)
+
+    def __len__(self):
+        return len(self.memory)
+
+    def __repr__(self):
+        return '<ClockTable of {} memory clocks>'.format(len(self.memory))
+
+    def _row(self, memory):
+        i = self._rows.get(memory)
+        if i is None:
+            raise KeyError('{} MHz is not a supported memory clock'.format(
+                memory))
+        start = i * self.width
+        return self.graphics[start:start + self.counts[i]]
+
+    def graphics_clocks(self, memory):
+        """ Returns the graphics clocks supported at a memory clock """
+        return self._row(memory)
+
+    def _nonempty_row(self, memory):
+        row = self._row(memory)
+        if not row:
+            raise KeyError('No graphics clocks are supported at {} '
+                           'MHz'.format(memory))
+        return row
+
+    def max_memory(self):
+        """ Returns the highest memory clock, or None if there are none """
+        return self.memory[0] if self.memory else None
+
+    def max_graphics(self, memory):
+        """ Returns the highest graphics clock at a memory clock """
+        i = self._rows.get(memory)
+        if i is None or not self.counts[i]:
+            # Raises a KeyError saying why
+            self._nonempty_row(memory)
+        return self.graphics[i * self.width + self.counts[i] - 1]
+
+    def min_graphics(self, memory):
+        """ Returns the lowest graphics clock at a memory clock """
+        return self._nonempty_row(memory)[0]
+
+    def nearest_memory(self, target):
+        """
+        Returns the highest memory clock at or below target, or the lowest
+        memory clock if they are all above it. Returns None if there are no
+        memory clocks.
+        """
+        for mem in self.memory:
+            if mem <= target:
+                return mem
+        return self.memory[-1] if self.memory else None
+
+    def nearest_graphics(self, memory, target):
+        """
+        Returns the highest graphics clock at or below target at a memory
+        clock, or the lowest graphics clock if they are all above it.
+        """
+        row = self._nonempty_row(memory)
+        i = bisect_right(row, target)
+        return row[i - 1] if i else row[0]
+
+    def supports(self, memory, graphics):
+        """ Returns whether a (memory, graphics) pair of clocks is supported """
+        if memory not in self._rows:
+            return False
+        row = self._row(memory)
+        i = bisect_right(row, graphics)
+        return bool(i) and row[i - 1] == graphics
+
+    def pairs(self):
+        """ Returns every supported (memory, graphics) pair """
+        return [(mem, gfx) for mem in self.memory for gfx in self._row(mem)]
+
+    def as_dict(self):
+        """
+        Returns a dict of memory clock to graphics clocks, highest first, as
+        listed by the driver.
+        """
+        return dict((mem, list(reversed(self._row(mem))))
+                    for mem in self.memory)
+
+    def as_array(self):
+        """
+        Returns the graphics clocks as a (memory clocks, width) numpy array of
+        uint32, sharing memory with the table.
+        """
+        if np is None:
+            raise ImportError('numpy is needed for ClockTable.as_array')
+        return np.frombuffer(self.graphics, dtype=np.uint32).reshape(
+            len(self.memory), self.width)
+
+
+# uuid -> ClockTable
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_clock_table(handle):
+    """
+    Returns the :class:`ClockTable` of a gpu, reading it from the driver the
+    first time only. Returns None if the gpu doesn't report its supported
+    clocks.
+    """
+    uuid = py3nvml.nvmlDeviceGetUUID(handle)
+    with _tables_lock:
+        if uuid in _tables:
+            return _tables[uuid]
+    table = ClockTable.from_device(handle)
+    with _tables_lock:
+        return _tables.setdefault(uuid, table)
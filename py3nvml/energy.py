@@ -0,0 +1,316 @@
+"""
+Measuring the energy used by jobs.
+
+The driver keeps a buffer of recent power samples for each gpu, taken much
+more often than anyone would poll nvmlDeviceGetPowerUsage. :class:`EnergyMeter`
+collects the samples it hasn't seen yet from every gpu, integrates them with
+the trapezoid rule into a running energy count, and answers how many joules
+each gpu used between any two times, e.g. over the life of a job. Collecting
+is one driver call per gpu, so it can be left running.
+
+The buffer only holds the last few seconds of samples, so the meter should
+poll at least every second or so. Gaps between polls are bridged by a straight
+line. Gpus without a sample buffer are measured by polling their power usage
+instead.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.energy import EnergyMeter
+
+    nvmlInit()
+    meter = EnergyMeter()
+    meter.start(interval=1)
+    meter.begin('train', uuids)
+    ...
+    job = meter.end('train')
+    print(job.total, 'J', job.joules)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from py3nvml import py3nvml
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The c_nvmlValue_t member of each _nvmlValueType_t
+_VALUE_FIELDS = ['dVal', 'uiVal', 'ulVal', 'ullVal']
+
+#: The energy used by a job. ``joules`` maps each gpu uuid to the joules it
+#: used between ``start`` and ``end``, and ``total`` is their sum.
+JobEnergy = namedtuple('JobEnergy', ['job', 'start', 'end', 'joules',
+                                     'total'])
+
+
+def integrate(times, power, start_energy=0.0):
+    """
+    Integrates power over time with the trapezoid rule.
+
+    Parameters
+    ----------
+    times : sequence of float
+        Seconds, increasing.
+    power : sequence of float
+        Watts at each time.
+    start_energy : float
+        Joules at the first time.
+
+    Returns
+    -------
+    energy : list or numpy array of float
+        The joules used up to each time, plus start_energy.
+    """
+    if np is not None:
+        t = np.asarray(times, dtype=np.float64)
+        p = np.asarray(power, dtype=np.float64)
+        energy = np.empty(len(t))
+        if len(t):
+            energy[0] = start_energy
+            np.cumsum((p[1:] + p[:-1]) * np.diff(t) / 2, out=energy[1:])
+            energy[1:] += start_energy
+        return energy
+    energy = []
+    total = start_energy
+    for i in range(len(times)):
+        if i:
+            total += (power[i] + power[i - 1]) * (times[i] - times[i - 1]) / 2
+        energy.append(total)
+    return energy
+
+
+def _decode(result):
+    # -> (last timeStamp, seconds, watts) of the milliwatt samples
+    # nvmlDeviceGetSamples returned, decoded if numpy is there
+    if np is not None:
+        stamps, values = result
+        if not len(stamps):
+            return None, [], []
+        return (int(stamps[-1]), (stamps / 1e6).tolist(),
+                (values / 1000).tolist())
+    value_type, samples = result
+    if not samples:
+        return None, [], []
+    field = _VALUE_FIELDS[value_type]
+    return (samples[-1].timeStamp, [s.timeStamp / 1e6 for s in samples],
+            [getattr(s.sampleValue, field) / 1000 for s in samples])
+
+
+class _GpuMeter(object):
+    def __init__(self, uuid, handle):
+        self.uuid = uuid
+        self.handle = handle
+        self.sampled = True
+        # the timeStamp of the last sample seen
+        self.last_seen = 0
+        self.last_power = None
+        # the joules used up to each time
+        self.times = array('d')
+        self.energy = array('d')
+
+    def add(self, times, power):
+        if self.times:
+            # Samples that aren't newer than the count would make it go back
+            new = [i for i, t in enumerate(times) if t > self.times[-1]]
+            if not new:
+                return
+            times = [times[i] for i in new]
+            power = [power[i] for i in new]
+            times = [self.times[-1]] + times
+            power = [self.last_power] + power
+            energy = integrate(times, power, self.energy[-1])[1:]
+            times = times[1:]
+        else:
+            energy = integrate(times, power)
+        self.times.extend(times)
+        self.energy.extend(energy)
+        self.last_power = power[-1]
+
+    def at(self, t):
+        """ Joules used up to t, interpolating between samples """
+        times, energy = self.times, self.energy
+        i = bisect_right(times, t)
+        if i == 0:
+            return energy[0] if energy else 0.0
+        if i == len(times):
+            return energy[-1]
+        t0, t1 = times[i - 1], times[i]
+        return energy[i - 1] + (energy[i] - energy[i - 1]) * (t - t0) / \
+            (t1 - t0)
+
+    def prune(self, before):
+        i = bisect_right(self.times, before) - 1
+        if i > 0:
+            del self.times[:i]
+            del self.energy[:i]
+
+
+class EnergyMeter(object):
+    """
+    Keeps a running count of the energy used by every gpu.
+
+    NVML must be initialized for as long as the meter is used.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to measure. If None, measures all gpus.
+    history : float
+        Seconds of energy counts to keep, to answer :meth:`energy` for
+        times in the past. Counts are kept from the start of open jobs
+        regardless.
+    """
+    def __init__(self, devices=None, history=3600.0):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.gpus = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.gpus.append(_GpuMeter(py3nvml.nvmlDeviceGetUUID(handle),
+                                       handle))
+        self.history = history
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Held while reading and adding samples, so polls don't interleave
+        self._poll_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _read(self, gpu):
+        # -> (seconds, watts) lists of the new power readings of a gpu
+        if gpu.sampled:
+            try:
+                result = py3nvml.nvmlDeviceGetSamples(
+                    gpu.handle, py3nvml.NVML_TOTAL_POWER_SAMPLES,
+                    gpu.last_seen, default=None, decode=np is not None)
+            except py3nvml.NVMLError_NotFound:
+                # no samples since the last poll
+                return [], []
+            if result is not None:
+                last_seen, times, power = _decode(result)
+                if times:
+                    gpu.last_seen = last_seen
+                return times, power
+            gpu.sampled = False
+            self.logger.debug('{} has no power samples, polling its power '
+                              'usage instead'.format(gpu.uuid))
+        power = py3nvml.nvmlDeviceGetPowerUsage(gpu.handle, default=None)
+        if power is None:
+            return [], []
+        return [time.time()], [power / 1000]
+
+    def poll(self):
+        """ Collects the new power samples of every gpu """
+        with self._poll_lock:
+            readings = [self._read(gpu) for gpu in self.gpus]
+            with self.lock:
+                cutoff = time.time() - self.history
+                if self.jobs:
+                    cutoff = min(cutoff,
+                                 min(s for s, _ in self.jobs.values()))
+                for gpu, (times, power) in zip(self.gpus, readings):
+                    if times:
+                        gpu.add(times, power)
+                    gpu.prune(cutoff)
+
+    def start(self, interval=1.0):
+        """ Polls every interval seconds in a background thread """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                start = time.time()
+                try:
+                    self.poll()
+                except py3nvml.NVMLError as err:
+                    self.logger.warning('Could not read power samples: '
+                                        '{}'.format(err))
+                self._stop.wait(max(0, interval - (time.time() - start)))
+        self._thread = threading.Thread(target=run, name='EnergyMeter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread started by :meth:`start` """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def energy(self, uuids=None, start=None, end=None):
+        """
+        Returns the joules used by gpus between two times.
+
+        Only the samples collected so far are counted, so :meth:`poll` first
+        to include the latest ones.
+
+        Parameters
+        ----------
+        uuids : list of str
+            The gpus. If None, all of them.
+        start, end : float
+            Times as returned by time.time(). None for as early or as late as
+            the meter has counts for.
+
+        Returns
+        -------
+        joules : dict
+            Maps uuid to joules.
+        """
+        with self.lock:
+            result = {}
+            for gpu in self.gpus:
+                if uuids is not None and gpu.uuid not in uuids:
+                    continue
+                if not gpu.times:
+                    result[gpu.uuid] = 0.0
+                    continue
+                a = gpu.energy[0] if start is None else gpu.at(start)
+                b = gpu.energy[-1] if end is None else gpu.at(end)
+                result[gpu.uuid] = b - a
+            return result
+
+    def begin(self, job, uuids=None):
+        """
+        Starts counting the energy of a job.
+
+        Parameters
+        ----------
+        job : hashable
+            Names the job in :meth:`end`.
+        uuids : list of str
+            The gpus the job runs on. If None, all of them.
+        """
+        self.poll()
+        with self.lock:
+            self.jobs[job] = (time.time(), uuids)
+
+    def end(self, job):
+        """
+        Stops counting the energy of a job.
+
+        Returns
+        -------
+        energy : :data:`JobEnergy`
+        """
+        self.poll()
+        with self.lock:
+            start, uuids = self.jobs.pop(job)
+        end = time.time()
+        joules = self.energy(uuids, start, end)
+        return JobEnergy(job, start, end, joules, sum(joules.values()))
@@ -0,0 +1,267 @@
+"""
+A Prometheus exporter for the gpus.
+
+:class:`MetricsExporter` serves ``/metrics`` in the Prometheus text format.
+The metrics come from a :class:`~py3nvml.snapshot.Sampler` running in the
+background, and the page is rendered once per snapshot, so a scrape never
+waits on the driver and costs the same however many gpus there are.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.exporter import MetricsExporter
+
+    nvmlInit()
+    MetricsExporter(interval=5).serve_forever(port=9445)
+
+or from the command line::
+
+    python -m py3nvml.exporter --port 9445 --interval 5
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import logging
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from py3nvml import py3nvml
+from py3nvml.snapshot import Sampler, DEFAULT_FIELDS, MISSING
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# field -> (metric, type, help, extra labels, scale)
+METRICS = [
+    ('memory.total', 'nvml_memory_total_bytes', 'gauge',
+     'Total memory of the gpu', '', 1),
+    ('memory.used', 'nvml_memory_used_bytes', 'gauge',
+     'Memory in use on the gpu', '', 1),
+    ('memory.free', 'nvml_memory_free_bytes', 'gauge',
+     'Free memory on the gpu', '', 1),
+    ('utilization.gpu', 'nvml_utilization_gpu_ratio', 'gauge',
+     'Fraction of time a kernel was running', '', 0.01),
+    ('utilization.memory', 'nvml_utilization_memory_ratio', 'gauge',
+     'Fraction of time memory was being read or written', '', 0.01),
+    ('power.draw', 'nvml_power_draw_watts', 'gauge',
+     'Power drawn by the board', '', 0.001),
+    ('temperature.gpu', 'nvml_temperature_celsius', 'gauge',
+     'Core temperature of the gpu', '', 1),
+    ('clocks.gr', 'nvml_clock_hertz', 'gauge',
+     'Current clock speeds', 'clock="graphics"', 1e6),
+    ('clocks.sm', 'nvml_clock_hertz', 'gauge',
+     'Current clock speeds', 'clock="sm"', 1e6),
+    ('clocks.mem', 'nvml_clock_hertz', 'gauge',
+     'Current clock speeds', 'clock="memory"', 1e6),
+    ('pstate', 'nvml_performance_state', 'gauge',
+     'Performance state, 0 is the highest', '', 1),
+    ('clocks_throttle_reasons.active', 'nvml_clocks_throttle_reasons',
+     'gauge', 'Bit mask of the reasons the clocks are held back', '', 1),
+    ('ecc.errors.corrected.volatile.total', 'nvml_ecc_errors', 'gauge',
+     'ECC errors', 'error="corrected",counter="volatile"', 1),
+    ('ecc.errors.uncorrected.volatile.total', 'nvml_ecc_errors', 'gauge',
+     'ECC errors', 'error="uncorrected",counter="volatile"', 1),
+    ('ecc.errors.corrected.aggregate.total', 'nvml_ecc_errors', 'gauge',
+     'ECC errors', 'error="corrected",counter="aggregate"', 1),
+    ('ecc.errors.uncorrected.aggregate.total', 'nvml_ecc_errors', 'gauge',
+     'ECC errors', 'error="uncorrected",counter="aggregate"', 1),
+    ('retired_pages.single_bit_ecc.count', 'nvml_retired_pages', 'gauge',
+     'Retired memory pages', 'cause="multiple_single_bit_ecc"', 1),
+    ('retired_pages.double_bit.count', 'nvml_retired_pages', 'gauge',
+     'Retired memory pages', 'cause="double_bit_ecc"', 1),
+    ('retired_pages.pending', 'nvml_retired_pages_pending', 'gauge',
+     '1 if pages are waiting to be retired at the next reboot', '', 1),
+    ('pcie.tx', 'nvml_pcie_throughput_bytes_per_second', 'gauge',
+     'PCIe throughput', 'direction="tx"', 1024),
+    ('pcie.rx', 'nvml_pcie_throughput_bytes_per_second', 'gauge',
+     'PCIe throughput', 'direction="rx"', 1024),
+]
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class MetricsExporter(object):
+    """
+    Serves the state of the gpus to Prometheus.
+
+    NVML must be initialized for as long as the exporter runs.
+
+    Parameters
+    ----------
+    sampler : :class:`~py3nvml.snapshot.Sampler`
+        Where the metrics come from. If None, makes one for all gpus. The
+        exporter starts and stops the sampler with the server.
+    interval : float
+        Seconds between snapshots, if the exporter makes the sampler.
+    """
+    def __init__(self, sampler=None, interval=5.0):
+        if sampler is None:
+            sampler = Sampler(interval)
+        self.sampler = sampler
+        self.logger = logging.getLogger(__name__)
+        # The labels of each gpu, preformatted
+        self._labels = {}
+        for i, (uuid, handle) in enumerate(sampler.handles):
+            index = py3nvml.nvmlDeviceGetIndex(handle, default=i)
+            name = py3nvml.nvmlDeviceGetName(handle, default='')
+            self._labels[uuid] = 'gpu="{}",uuid="{}",name="{}"'.format(
+                index, _escape(uuid), _escape(name))
+        self._metrics = [m for m in METRICS if m[0] in sampler.fields]
+        self._body = b''
+        self._server = None
+        self._thread = None
+        sampler.add_callback(self._update)
+
+    def render(self, snapshot):
+        """ Returns the metrics page for a snapshot, as bytes """
+        fields = snapshot.fields
+        n = len(fields)
+        values = snapshot.values
+        labels = [self._labels.get(u) or 'uuid="{}"'.format(_escape(u))
+                  for u in snapshot.uuids]
+
+        lines = []
+        last = None
+        for field, metric, typ, help_, extra, scale in self._metrics:
+            if metric != last:
+                lines.append('# HELP {} {}'.format(metric, help_))
+                lines.append('# TYPE {} {}'.format(metric, typ))
+                last = metric
+            col = fields.index(field)
+            extra = ',' + extra if extra else ''
+            for g, label in enumerate(labels):
+                v = values[g * n + col]
+                if v == MISSING:
+                    continue
+                if v < 0:
+                    # bit masks are stored signed
+                    v += 1 << 64
+                lines.append('{}{{{}{}}} {}'.format(
+                    metric, label, extra, _format(v * scale if scale != 1
+                                                  else v)))
+
+        lines.append('# HELP nvml_process_used_memory_bytes Memory used by '
+                     'each process')
+        lines.append('# TYPE nvml_process_used_memory_bytes gauge')
+        p = snapshot.processes
+        for i in range(0, len(p), 3):
+            if p[i + 2] != MISSING:
+                lines.append('nvml_process_used_memory_bytes{{{},pid="{}"}} '
+                             '{}'.format(labels[p[i]], p[i + 1], p[i + 2]))
+
+        lines.append('# HELP nvml_snapshot_timestamp_seconds When the '
+                     'metrics were collected')
+        lines.append('# TYPE nvml_snapshot_timestamp_seconds gauge')
+        lines.append('nvml_snapshot_timestamp_seconds {}'.format(
+            _format(float(snapshot.timestamp))))
+        lines.append('')
+        return '\n'.join(lines).encode('utf-8')
+
+    def _update(self, snapshot):
+        self._body = self.render(snapshot)
+
+    def metrics(self):
+        """ Returns the current metrics page, as bytes """
+        return self._body
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] == '/metrics':
+                    body = exporter.metrics()
+                    self.send_response(200)
+                    self.send_header('Content-Type', CONTENT_TYPE)
+                else:
+                    body = b'<a href="/metrics">Metrics</a>\n'
+                    self.send_response(200 if self.path == '/' else 404)
+                    self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                exporter.logger.debug(format % args)
+        return Handler
+
+    def start(self, port=9445, addr=''):
+        """
+        Starts the sampler and serves the metrics from a background thread.
+
+        Returns
+        -------
+        address : tuple
+            The address the server listens on. Pass port=0 to get a free port.
+        """
+        if self._server is not None:
+            return self._server.server_address
+        self.sampler.sample()
+        self.sampler.start()
+        self._server = _ThreadingHTTPServer((addr, port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='MetricsExporter')
+        self._thread.daemon = True
+        self._thread.start()
+        return self._server.server_address
+
+    def stop(self):
+        """ Stops the server and the sampler """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = self._thread = None
+        self.sampler.stop()
+
+    def serve_forever(self, port=9445, addr=''):
+        """ Serves the metrics until interrupted """
+        self.start(port, addr)
+        try:
+            while True:
+                self._thread.join(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve gpu metrics to Prometheus')
+    parser.add_argument('--port', type=int, default=9445)
+    parser.add_argument('--addr', default='')
+    parser.add_argument('--interval', type=float, default=5.0,
+                        help='seconds between snapshots')
+    parser.add_argument('--pcie', action='store_true',
+                        help='also export pcie throughput (slow)')
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    py3nvml.nvmlInit()
+    fields = DEFAULT_FIELDS + (('pcie.tx', 'pcie.rx') if args.pcie else ())
+    try:
+        MetricsExporter(Sampler(args.interval, fields=fields)).serve_forever(
+            args.port, args.addr)
+    finally:
+        py3nvml.nvmlShutdown()
+
+
+if __name__ == "__main__":
+    main()
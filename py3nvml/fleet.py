@@ -0,0 +1,450 @@
+"""
+Collecting the state of the gpus of many hosts in one place.
+
+An :class:`Agent` runs on every gpu host and streams the snapshots of its
+local :class:`~py3nvml.snapshot.Sampler` to a :class:`Collector` over TCP or a
+Unix socket. Only the first snapshot (and one every keyframe_interval after
+that) is sent in full. The others only carry the values that changed, and the
+processes if they changed, which is a few bytes on a quiet host.
+
+The collector keeps the latest snapshot of every host in memory and answers
+questions about the whole fleet, like which gpus are free.
+
+Agents aren't authenticated and messages aren't encrypted, so only run the
+protocol on a trusted network. Each host is named by its agent. Once a host
+has been heard from, the collector only takes its snapshots from the same
+address, until the host has been silent for takeover_after seconds.
+
+E.g. on every gpu host
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.snapshot import Sampler
+    from py3nvml.fleet import Agent
+
+    nvmlInit()
+    sampler = Sampler(interval=5)
+    sampler.add_callback(Agent(('collector.example.com', 9446)).send)
+    sampler.start()
+
+and on the collector
+
+.. code:: python
+
+    from py3nvml.fleet import Collector
+
+    collector = Collector(('', 9446))
+    collector.start()
+    ...
+    for host, uuid, free in collector.free_gpus(min_free=40 << 30,
+                                                max_age=30):
+        print(host, uuid, free)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+from array import array
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from py3nvml.snapshot import Snapshot, MISSING, _changed
+
+KEYFRAME = 1
+DELTA = 2
+
+# Every message is a frame: its length, then the message
+_FRAME = struct.Struct('<I')
+# type, timestamp
+_MESSAGE = struct.Struct('<Bd')
+_COUNT = struct.Struct('<i')
+_CHANGE = struct.Struct('<Iq')
+
+
+def _pack_array(a):
+    return _COUNT.pack(len(a)) + a.tobytes()
+
+
+def _unpack_array(buf, offset):
+    n, = _COUNT.unpack_from(buf, offset)
+    offset += _COUNT.size
+    a = array('q')
+    a.frombytes(buf[offset:offset + 8 * n])
+    return a, offset + 8 * n
+
+
+def _is_unix(address):
+    return isinstance(address, str)
+
+
+class Agent(object):
+    """
+    Sends snapshots to a collector.
+
+    Connection errors are logged and the snapshot dropped. The agent connects
+    again on the next one.
+
+    Parameters
+    ----------
+    address : tuple or str
+        The (host, port) of the collector, or the path of its Unix socket.
+    host : str
+        The name of this host. Defaults to socket.gethostname().
+    keyframe_interval : int
+        Send a full snapshot after this many deltas.
+    timeout : float
+        Seconds to wait on the collector.
+    """
+    def __init__(self, address, host=None, keyframe_interval=60, timeout=5.0):
+        self.address = address
+        self.host = socket.gethostname() if host is None else host
+        self.keyframe_interval = keyframe_interval
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self._sock = None
+        self._last = None
+        self._deltas = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        family = socket.AF_UNIX if _is_unix(self.address) else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def encode(self, snapshot):
+        """ Returns the message for snapshot, given what was last sent """
+        last = self._last
+        if (last is None or last.uuids != snapshot.uuids or
+                last.fields != snapshot.fields or
+                self._deltas >= self.keyframe_interval):
+            meta = json.dumps({'host': self.host, 'uuids': snapshot.uuids,
+                               'fields': snapshot.fields}).encode('utf-8')
+            return (_MESSAGE.pack(KEYFRAME, snapshot.timestamp) +
+                    _COUNT.pack(len(meta)) + meta +
+                    _pack_array(snapshot.values) +
+                    _pack_array(snapshot.processes))
+
+        parts = [_MESSAGE.pack(DELTA, snapshot.timestamp)]
+        changed = _changed(last.values, snapshot.values)
+        parts.append(_COUNT.pack(len(changed)))
+        values = snapshot.values
+        parts.extend(_CHANGE.pack(i, values[i]) for i in changed)
+        if snapshot.processes == last.processes:
+            parts.append(_COUNT.pack(-1))
+        else:
+            parts.append(_pack_array(snapshot.processes))
+        return b''.join(parts)
+
+    def send(self, snapshot):
+        """
+        Sends a snapshot to the collector.
+
+        Can be used as a :class:`~py3nvml.snapshot.Sampler` callback.
+
+        Returns
+        -------
+        sent : bool
+        """
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = self._connect()
+                    self._last = None
+                message = self.encode(snapshot)
+                self._sock.sendall(_FRAME.pack(len(message)) + message)
+            except (OSError, socket.error) as err:
+                self.logger.debug('Could not send to {}: {}'.format(
+                    self.address, err))
+                self._close()
+                return False
+            if message[0] == KEYFRAME:
+                self._deltas = 0
+            else:
+                self._deltas += 1
+            self._last = snapshot
+            return True
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._last = None
+
+    def close(self):
+        """ Closes the connection """
+        with self._lock:
+            self._close()
+
+
+class _Host(object):
+    def __init__(self, name, snapshot, peer):
+        self.name = name
+        self.snapshot = snapshot
+        # the address the snapshots come from
+        self.peer = peer
+        self.received = time.time()
+
+
+class Collector(object):
+    """
+    Receives snapshots from agents and keeps the latest one of every host.
+
+    Parameters
+    ----------
+    address : tuple or str
+        The (host, port) to listen on, or the path of a Unix socket.
+    max_message_size : int
+        Bytes. Connections that send a bigger message are closed.
+    takeover_after : float
+        Seconds a host must have been silent before its snapshots are taken
+        from another address.
+    """
+    def __init__(self, address, max_message_size=16 << 20,
+                 takeover_after=60.0):
+        self.address = address
+        self.max_message_size = max_message_size
+        self.takeover_after = takeover_after
+        self.logger = logging.getLogger(__name__)
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def apply(self, message, host=None, peer=None):
+        """
+        Applies a message from an agent.
+
+        Parameters
+        ----------
+        message : bytes
+        host : str
+            The host that sent the previous messages on this connection, as
+            returned by the last call. Needed for deltas.
+        peer : str
+            The address the message came from, or None if it can't be known
+            (e.g. over a Unix socket).
+
+        Returns
+        -------
+        host : str
+            The host that sent the message.
+
+        Raises
+        ------
+        ValueError
+            If the message is malformed, or is for a host that is sent from
+            another address.
+        """
+        typ, timestamp = _MESSAGE.unpack_from(message, 0)
+        offset = _MESSAGE.size
+        if typ == KEYFRAME:
+            n, = _COUNT.unpack_from(message, offset)
+            offset += _COUNT.size
+            meta = json.loads(message[offset:offset + n].decode('utf-8'))
+            offset += n
+            values, offset = _unpack_array(message, offset)
+            processes, offset = _unpack_array(message, offset)
+            uuids, fields, name = meta['uuids'], meta['fields'], meta['host']
+            if not isinstance(name, str) or \
+                    len(values) != len(uuids) * len(fields) or \
+                    len(processes) % 3:
+                raise ValueError('Malformed keyframe')
+            if host is not None and name != host:
+                raise ValueError('{} sent a keyframe for {}'.format(host,
+                                                                    name))
+            snap = Snapshot(timestamp, uuids, fields, values, processes)
+            host = name
+        elif typ == DELTA:
+            with self._lock:
+                last = self._hosts.get(host)
+            if last is None:
+                raise ValueError('Delta before a keyframe')
+            last = last.snapshot
+            values = array('q', last.values)
+            n, = _COUNT.unpack_from(message, offset)
+            offset += _COUNT.size
+            for _ in range(n):
+                i, v = _CHANGE.unpack_from(message, offset)
+                if i >= len(values):
+                    raise ValueError('Delta of value {} of {}'.format(
+                        i, len(values)))
+                values[i] = v
+                offset += _CHANGE.size
+            n, = _COUNT.unpack_from(message, offset)
+            if n < 0:
+                processes = last.processes
+            else:
+                processes, offset = _unpack_array(message, offset)
+                if len(processes) % 3:
+                    raise ValueError('Malformed delta')
+            snap = Snapshot(timestamp, last.uuids, last.fields, values,
+                            processes)
+        else:
+            raise ValueError('Unknown message type {}'.format(typ))
+
+        with self._lock:
+            current = self._hosts.get(host)
+            if current is not None and current.peer != peer and \
+                    time.time() - current.received < self.takeover_after:
+                raise ValueError('{} is sent from {}, not {}'.format(
+                    host, current.peer, peer))
+            self._hosts[host] = _Host(host, snap, peer)
+        return host
+
+    def _handler(self):
+        collector = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                host = None
+                # The ip address of TCP peers. Unix socket peers are local.
+                peer = self.client_address[0] \
+                    if isinstance(self.client_address, tuple) else None
+                while True:
+                    head = self.rfile.read(_FRAME.size)
+                    if len(head) < _FRAME.size:
+                        return
+                    n, = _FRAME.unpack(head)
+                    if n > collector.max_message_size:
+                        collector.logger.warning(
+                            'Message of {} bytes from {} ({}) is too '
+                            'big'.format(n, host, peer))
+                        return
+                    message = self.rfile.read(n)
+                    if len(message) < n:
+                        return
+                    try:
+                        host = collector.apply(message, host, peer)
+                    except (ValueError, KeyError, IndexError, TypeError,
+                            struct.error) as err:
+                        collector.logger.warning(
+                            'Bad message from {} ({}): {}'.format(
+                                host, peer, err))
+                        return
+        return Handler
+
+    def start(self):
+        """
+        Listens for agents in a background thread.
+
+        Returns
+        -------
+        address : tuple or str
+            The address listened on. Pass port 0 to get a free port.
+        """
+        if self._server is not None:
+            return self._server.server_address
+        if _is_unix(self.address):
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            server = _ThreadingUnixServer(self.address, self._handler())
+        else:
+            server = _ThreadingTCPServer(self.address, self._handler())
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever,
+                                        name='Collector')
+        self._thread.daemon = True
+        self._thread.start()
+        return server.server_address
+
+    def stop(self):
+        """ Stops listening """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            if _is_unix(self.address) and os.path.exists(self.address):
+                os.remove(self.address)
+            self._server = self._thread = None
+
+    def hosts(self):
+        """
+        Returns a dict of host name to the number of seconds since its last
+        snapshot arrived.
+        """
+        now = time.time()
+        with self._lock:
+            return dict((h.name, now - h.received)
+                        for h in self._hosts.values())
+
+    def snapshot(self, host):
+        """ Returns the latest snapshot of a host """
+        with self._lock:
+            return self._hosts[host].snapshot
+
+    def _fresh(self, max_age):
+        now = time.time()
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return [h for h in hosts
+                if max_age is None or now - h.received <= max_age]
+
+    def gpus(self, max_age=None):
+        """
+        Lists every gpu in the fleet.
+
+        Parameters
+        ----------
+        max_age : float
+            Leave out hosts not heard from in this many seconds.
+
+        Returns
+        -------
+        gpus : list of (host, uuid, fields) tuples
+            fields is a dict as returned by Snapshot.device.
+        """
+        return [(h.name, u, h.snapshot.device(u))
+                for h in self._fresh(max_age) for u in h.snapshot.uuids]
+
+    def free_gpus(self, min_free=0, max_age=None):
+        """
+        Finds the gpus with no processes and at least min_free bytes of free
+        memory.
+
+        Parameters
+        ----------
+        min_free : int
+            Bytes of free memory needed, e.g. 40 << 30 for 40GB.
+        max_age : float
+            Leave out hosts not heard from in this many seconds.
+
+        Returns
+        -------
+        gpus : list of (host, uuid, free) tuples
+            Most free memory first.
+        """
+        found = []
+        for h in self._fresh(max_age):
+            snap = h.snapshot
+            if 'memory.free' not in snap.fields:
+                continue
+            n = len(snap.fields)
+            col = snap.fields.index('memory.free')
+            busy = set(snap.processes[0::3])
+            for g, uuid in enumerate(snap.uuids):
+                free = snap.values[g * n + col]
+                if g not in busy and free != MISSING and free >= min_free:
+                    found.append((h.name, uuid, free))
+        found.sort(key=lambda x: x[2], reverse=True)
+        return found
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
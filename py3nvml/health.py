@@ -0,0 +1,217 @@
+"""
+Cheap, repeated ECC and retired page health checks.
+
+:class:`HealthScanner` remembers the ECC counters and retired pages of every
+gpu from the last scan and only reports what changed. A quiet gpu costs five
+driver calls per scan: the four ECC totals and the pending retirement flag.
+The counters of each memory location are only read for the totals that
+changed, and the lists of retired pages only when pages may have been retired
+since the last scan, i.e. when an ECC total went up, the pending flag changed,
+or, while pages are pending, the number of retired pages changed.
+
+E.g. as a per minute health check
+
+.. code:: python
+
+    import time
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.health import HealthScanner
+
+    nvmlInit()
+    scanner = HealthScanner()
+    while True:
+        for report in scanner.scan():
+            print(report.uuid, report.ecc, report.new_pages, report.pending)
+        time.sleep(60)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import time
+
+from py3nvml import py3nvml
+
+ERROR_TYPES = [
+    (py3nvml.NVML_MEMORY_ERROR_TYPE_CORRECTED, 'corrected'),
+    (py3nvml.NVML_MEMORY_ERROR_TYPE_UNCORRECTED, 'uncorrected'),
+]
+
+COUNTER_TYPES = [
+    (py3nvml.NVML_VOLATILE_ECC, 'volatile'),
+    (py3nvml.NVML_AGGREGATE_ECC, 'aggregate'),
+]
+
+LOCATIONS = [
+    (py3nvml.NVML_MEMORY_LOCATION_L1_CACHE, 'l1_cache'),
+    (py3nvml.NVML_MEMORY_LOCATION_L2_CACHE, 'l2_cache'),
+    (py3nvml.NVML_MEMORY_LOCATION_DEVICE_MEMORY, 'device_memory'),
+    (py3nvml.NVML_MEMORY_LOCATION_REGISTER_FILE, 'register_file'),
+    (py3nvml.NVML_MEMORY_LOCATION_TEXTURE_MEMORY, 'texture_memory'),
+]
+
+CAUSES = [
+    (py3nvml.NVML_PAGE_RETIREMENT_CAUSE_MULTIPLE_SINGLE_BIT_ECC_ERRORS,
+     'multiple_single_bit'),
+    (py3nvml.NVML_PAGE_RETIREMENT_CAUSE_DOUBLE_BIT_ECC_ERROR, 'double_bit'),
+]
+
+#: What changed on one gpu since the last scan.
+#:
+#: ``ecc`` maps counter names like 'uncorrected.volatile' to the number of
+#: new errors, and ``locations`` maps the same names to a dict of the new
+#: errors by memory location, where the gpu reports them. ``new_pages`` maps
+#: a retirement cause to the list of newly retired page addresses.
+#: ``pending`` is True if pages are waiting to be retired at the next reboot,
+#: or None if the gpu doesn't say. ``rescanned`` is True if the retired pages
+#: were read in this scan.
+HealthReport = namedtuple('HealthReport', [
+    'uuid', 'timestamp', 'ecc', 'locations', 'new_pages', 'pending',
+    'rescanned'])
+
+
+class _GpuState(object):
+    def __init__(self, uuid, handle):
+        self.uuid = uuid
+        self.handle = handle
+        # (errorType, counterType) -> total, or None if not supported
+        self.totals = None
+        # (errorType, counterType, location) -> count
+        self.locations = {}
+        # cause -> set of pages
+        self.pages = dict((cause, set()) for cause, _ in CAUSES)
+        self.pending = None
+
+
+def _delta(before, after):
+    # Volatile counters start again when the driver is reloaded
+    return after - before if after >= before else after
+
+
+def _key(error_type, counter_type):
+    return '{}.{}'.format(dict(ERROR_TYPES)[error_type],
+                          dict(COUNTER_TYPES)[counter_type])
+
+
+class HealthScanner(object):
+    """
+    Reports new ECC errors and retired pages.
+
+    The first scan reports every error and retired page found, later scans
+    only the new ones. NVML must be initialized for as long as the scanner is
+    used.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to scan. If None, scans all gpus.
+    """
+    def __init__(self, devices=None):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.gpus = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.gpus.append(_GpuState(py3nvml.nvmlDeviceGetUUID(handle),
+                                       handle))
+
+    def _scan(self, gpu, full):
+        h = gpu.handle
+        totals = {}
+        for e, _ in ERROR_TYPES:
+            for c, _ in COUNTER_TYPES:
+                totals[(e, c)] = py3nvml.nvmlDeviceGetTotalEccErrors(
+                    h, e, c, default=None)
+        pending = py3nvml.nvmlDeviceGetRetiredPagesPendingStatus(
+            h, default=None)
+        if pending is not None:
+            pending = pending != py3nvml.NVML_FEATURE_DISABLED
+
+        first = gpu.totals is None
+        previous = gpu.totals or {}
+        ecc = {}
+        locations = {}
+        went_up = False
+        for (e, c), total in sorted(totals.items()):
+            if total is None:
+                continue
+            new = _delta(previous.get((e, c)) or 0, total)
+            if new == 0:
+                continue
+            went_up = True
+            ecc[_key(e, c)] = new
+            by_location = {}
+            for loc, name in LOCATIONS:
+                n = py3nvml.nvmlDeviceGetMemoryErrorCounter(h, e, c, loc,
+                                                            default=None)
+                if n is None:
+                    continue
+                new = _delta(gpu.locations.get((e, c, loc), 0), n)
+                gpu.locations[(e, c, loc)] = n
+                if new:
+                    by_location[name] = new
+            if by_location:
+                locations[_key(e, c)] = by_location
+        gpu.totals = totals
+
+        new_pages = {}
+        rescan = full or first or went_up or pending != gpu.pending
+        if not rescan and pending:
+            # Pending pages may be retired at any time, but only a count
+            # that changed means there is a new one to read
+            for cause, _ in CAUSES:
+                count = py3nvml.nvmlDeviceGetRetiredPageCount(h, cause,
+                                                              default=None)
+                if count is not None and count != len(gpu.pages[cause]):
+                    rescan = True
+        if rescan:
+            for cause, name in CAUSES:
+                pages = py3nvml.nvmlDeviceGetRetiredPages(h, cause,
+                                                          default=None)
+                if pages is None:
+                    continue
+                added = [p for p in pages if p not in gpu.pages[cause]]
+                if added:
+                    new_pages[name] = added
+                gpu.pages[cause] = set(pages)
+        changed = bool(ecc or new_pages) or (
+            pending != gpu.pending and (pending or not first))
+        gpu.pending = pending
+        if not changed:
+            return None
+        return HealthReport(gpu.uuid, time.time(), ecc, locations, new_pages,
+                            pending, rescan)
+
+    def scan(self, full=False):
+        """
+        Scans every gpu.
+
+        Parameters
+        ----------
+        full : bool
+            Read the retired pages of every gpu, even where nothing suggests
+            they changed.
+
+        Returns
+        -------
+        reports : list of :data:`HealthReport`
+            One for each gpu where something changed.
+        """
+        reports = []
+        for gpu in self.gpus:
+            report = self._scan(gpu, full)
+            if report is not None:
+                reports.append(report)
+        return reports
+
+    def retired_pages(self, uuid):
+        """
+        Returns the retired pages of a gpu as of the last scan that read them,
+        as a dict of cause name to sorted list of page addresses.
+        """
+        for gpu in self.gpus:
+            if gpu.uuid == uuid:
+                return dict((name, sorted(gpu.pages[cause]))
+                            for cause, name in CAUSES)
+        raise KeyError(uuid)
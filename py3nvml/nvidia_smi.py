@@ -40,6 +40,8 @@
 #
 
 from .py3nvml import *
+from .session import get_session
+from .procinfo import get_process_info
 import datetime
 
 #
@@ -50,14 +52,14 @@ def GetEccByType(handle, counterType, errorType):
 
     try:
         deviceMemory = nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType,
-                                                       NVML_MEMORY_LOCATION_DEVICE_MEMORY)
+                                                       NVML_MEMORY_LOCATION_DEVICE_MEMORY, default='N/A')
     except NVMLError as err:
         deviceMemory = handleError(err)
     strResult += '          <device_memory>' + str(deviceMemory) + '</device_memory>\n'
 
     try:
         registerFile = nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType,
-                                                       NVML_MEMORY_LOCATION_REGISTER_FILE)
+                                                       NVML_MEMORY_LOCATION_REGISTER_FILE, default='N/A')
     except NVMLError as err:
         registerFile = handleError(err)
 
@@ -65,27 +67,27 @@ def GetEccByType(handle, counterType, errorType):
 
     try:
         l1Cache = nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType,
-                                                  NVML_MEMORY_LOCATION_L1_CACHE)
+                                                  NVML_MEMORY_LOCATION_L1_CACHE, default='N/A')
     except NVMLError as err:
         l1Cache = handleError(err)
     strResult += '          <l1_cache>' + str(l1Cache) + '</l1_cache>\n'
 
     try:
         l2Cache = nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType,
-                                                  NVML_MEMORY_LOCATION_L2_CACHE)
+                                                  NVML_MEMORY_LOCATION_L2_CACHE, default='N/A')
     except NVMLError as err:
         l2Cache = handleError(err)
     strResult += '          <l2_cache>' + str(l2Cache) + '</l2_cache>\n'
 
     try:
         textureMemory = nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType,
-                                                        NVML_MEMORY_LOCATION_TEXTURE_MEMORY)
+                                                        NVML_MEMORY_LOCATION_TEXTURE_MEMORY, default='N/A')
     except NVMLError as err:
         textureMemory = handleError(err)
     strResult += '          <texture_memory>' + str(textureMemory) + '</texture_memory>\n'
 
     try:
-        count = str(nvmlDeviceGetTotalEccErrors(handle, errorType, counterType))
+        count = str(nvmlDeviceGetTotalEccErrors(handle, errorType, counterType, default='N/A'))
     except NVMLError as err:
         count = handleError(err)
     strResult += '          <total>' + count + '</total>\n'
@@ -189,6 +191,15 @@ def GetClocksThrottleReasons(handle):
 
     return strResult;
 
+#
+# Formats the result of a query made with default=None, which is None if the
+# query is not supported
+#
+def FormatValue(value, fmt):
+    if value is None:
+        return "N/A"
+    return fmt % value
+
 #
 # Converts errors into string messages
 #
@@ -202,11 +213,14 @@ def handleError(err):
 def XmlDeviceQuery():
 
     strResult = ''
+    session = get_session()
+    initialized = False
     try:
         #
-        # Initialize NVML
+        # Initialize NVML, unless a session already has
         #
-        nvmlInit()
+        session.acquire()
+        initialized = True
 
         strResult += '<?xml version="1.0" ?>\n'
         strResult += '<!DOCTYPE nvidia_smi_log SYSTEM "nvsmi_device_v4.dtd">\n'
@@ -273,11 +287,13 @@ def XmlDeviceQuery():
             strResult += '    <accounting_mode>' + mode + '</accounting_mode>\n'
 
             try:
-                bufferSize = str(nvmlDeviceGetAccountingBufferSize(handle))
+                bufferSize = nvmlDeviceGetAccountingBufferSize(handle)
+                bufferSizeStr = str(bufferSize)
             except NVMLError as err:
-                bufferSize = handleError(err)
+                bufferSize = None
+                bufferSizeStr = handleError(err)
 
-            strResult += '    <accounting_mode_buffer_size>' + bufferSize + '</accounting_mode_buffer_size>\n'
+            strResult += '    <accounting_mode_buffer_size>' + bufferSizeStr + '</accounting_mode_buffer_size>\n'
 
             strResult += '    <driver_model>\n'
 
@@ -297,28 +313,28 @@ def XmlDeviceQuery():
             strResult += '    </driver_model>\n'
 
             try:
-                serial = str(nvmlDeviceGetSerial(handle))
+                serial = str(nvmlDeviceGetSerial(handle, default='N/A'))
             except NVMLError as err:
                 serial = handleError(err)
 
             strResult += '    <serial>' + serial + '</serial>\n'
 
             try:
-                uuid = str(nvmlDeviceGetUUID(handle))
+                uuid = str(nvmlDeviceGetUUID(handle, default='N/A'))
             except NVMLError as err:
                 uuid = handleError(err)
 
             strResult += '    <uuid>' + uuid + '</uuid>\n'
 
             try:
-                minor_number = str(nvmlDeviceGetMinorNumber(handle))
+                minor_number = str(nvmlDeviceGetMinorNumber(handle, default='N/A'))
             except NVMLError as err:
                 minor_number = handleError(err)
 
             strResult += '    <minor_number>' + str(minor_number) + '</minor_number>\n'
 
             try:
-                vbios = str(nvmlDeviceGetVbiosVersion(handle))
+                vbios = str(nvmlDeviceGetVbiosVersion(handle, default='N/A'))
             except NVMLError as err:
                 vbios = handleError(err)
 
@@ -351,28 +367,28 @@ def XmlDeviceQuery():
             strResult += '    <inforom_version>\n'
 
             try:
-                img = str(nvmlDeviceGetInforomImageVersion(handle))
+                img = str(nvmlDeviceGetInforomImageVersion(handle, default='N/A'))
             except NVMLError as err:
                 img = handleError(err)
 
             strResult += '      <img_version>' + img + '</img_version>\n'
 
             try:
-                oem = str(nvmlDeviceGetInforomVersion(handle, NVML_INFOROM_OEM))
+                oem = str(nvmlDeviceGetInforomVersion(handle, NVML_INFOROM_OEM, default='N/A'))
             except NVMLError as err:
                 oem = handleError(err)
 
             strResult += '      <oem_object>' + oem + '</oem_object>\n'
 
             try:
-                ecc = str(nvmlDeviceGetInforomVersion(handle, NVML_INFOROM_ECC))
+                ecc = str(nvmlDeviceGetInforomVersion(handle, NVML_INFOROM_ECC, default='N/A'))
             except NVMLError as err:
                 ecc = handleError(err)
 
             strResult += '      <ecc_object>' + ecc + '</ecc_object>\n'
 
             try:
-                pwr = str(nvmlDeviceGetInforomVersion(handle, NVML_INFOROM_POWER))
+                pwr = str(nvmlDeviceGetInforomVersion(handle, NVML_INFOROM_POWER, default='N/A'))
             except NVMLError as err:
                 pwr = handleError(err)
 
@@ -410,14 +426,14 @@ def XmlDeviceQuery():
             strResult += '        <pcie_gen>\n'
 
             try:
-                gen = str(nvmlDeviceGetMaxPcieLinkGeneration(handle))
+                gen = str(nvmlDeviceGetMaxPcieLinkGeneration(handle, default='N/A'))
             except NVMLError as err:
                 gen = handleError(err)
 
             strResult += '          <max_link_gen>' + gen + '</max_link_gen>\n'
 
             try:
-                gen = str(nvmlDeviceGetCurrPcieLinkGeneration(handle))
+                gen = str(nvmlDeviceGetCurrPcieLinkGeneration(handle, default='N/A'))
             except NVMLError as err:
                 gen = handleError(err)
 
@@ -426,14 +442,14 @@ def XmlDeviceQuery():
             strResult += '        <link_widths>\n'
 
             try:
-                width = str(nvmlDeviceGetMaxPcieLinkWidth(handle)) + 'x'
+                width = FormatValue(nvmlDeviceGetMaxPcieLinkWidth(handle, default=None), '%sx')
             except NVMLError as err:
                 width = handleError(err)
 
             strResult += '          <max_link_width>' + width + '</max_link_width>\n'
 
             try:
-                width = str(nvmlDeviceGetCurrPcieLinkWidth(handle)) + 'x'
+                width = FormatValue(nvmlDeviceGetCurrPcieLinkWidth(handle, default=None), '%sx')
             except NVMLError as err:
                 width = handleError(err)
 
@@ -467,7 +483,7 @@ def XmlDeviceQuery():
             strResult += '      </pci_bridge_chip>\n'
 
             try:
-                replay = nvmlDeviceGetPcieReplayCounter(handle)
+                replay = nvmlDeviceGetPcieReplayCounter(handle, default='N/A')
                 strResult += '      <replay_counter>' + str(replay) + '</replay_counter>'
             except NVMLError as err:
                 strResult += '      <replay_counter>' + handleError(err) + '</replay_counter>'
@@ -488,7 +504,7 @@ def XmlDeviceQuery():
             strResult += '    </pci>\n'
 
             try:
-                fan = str(nvmlDeviceGetFanSpeed(handle)) + ' %'
+                fan = FormatValue(nvmlDeviceGetFanSpeed(handle, default=None), '%s %%')
             except NVMLError as err:
                 fan = handleError(err)
             strResult += '    <fan_speed>' + fan + '</fan_speed>\n'
@@ -609,7 +625,7 @@ def XmlDeviceQuery():
             strResult += '    </retired_pages>\n'
 
             try:
-                temp = str(nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)) + ' C'
+                temp = FormatValue(nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU, default=None), '%s C')
             except NVMLError as err:
                 temp = handleError(err)
 
@@ -617,14 +633,14 @@ def XmlDeviceQuery():
             strResult += '      <gpu_temp>' + temp + '</gpu_temp>\n'
 
             try:
-                temp = str(nvmlDeviceGetTemperatureThreshold(handle, NVML_TEMPERATURE_THRESHOLD_SHUTDOWN)) + ' C'
+                temp = FormatValue(nvmlDeviceGetTemperatureThreshold(handle, NVML_TEMPERATURE_THRESHOLD_SHUTDOWN, default=None), '%s C')
             except NVMLError as err:
                 temp = handleError(err)
 
             strResult += '      <gpu_temp_max_threshold>' + temp + '</gpu_temp_max_threshold>\n'
 
             try:
-                temp = str(nvmlDeviceGetTemperatureThreshold(handle, NVML_TEMPERATURE_THRESHOLD_SLOWDOWN)) + ' C'
+                temp = FormatValue(nvmlDeviceGetTemperatureThreshold(handle, NVML_TEMPERATURE_THRESHOLD_SLOWDOWN, default=None), '%s C')
             except NVMLError as err:
                 temp = handleError(err)
 
@@ -685,17 +701,17 @@ def XmlDeviceQuery():
 
             strResult += '    <clocks>\n'
             try:
-                graphics = str(nvmlDeviceGetClockInfo(handle, NVML_CLOCK_GRAPHICS)) + ' MHz'
+                graphics = FormatValue(nvmlDeviceGetClockInfo(handle, NVML_CLOCK_GRAPHICS, default=None), '%s MHz')
             except NVMLError as err:
                 graphics = handleError(err)
             strResult += '      <graphics_clock>' +graphics + '</graphics_clock>\n'
             try:
-                sm = str(nvmlDeviceGetClockInfo(handle, NVML_CLOCK_SM)) + ' MHz'
+                sm = FormatValue(nvmlDeviceGetClockInfo(handle, NVML_CLOCK_SM, default=None), '%s MHz')
             except NVMLError as err:
                 sm = handleError(err)
             strResult += '      <sm_clock>' + sm + '</sm_clock>\n'
             try:
-                mem = str(nvmlDeviceGetClockInfo(handle, NVML_CLOCK_MEM)) + ' MHz'
+                mem = FormatValue(nvmlDeviceGetClockInfo(handle, NVML_CLOCK_MEM, default=None), '%s MHz')
             except NVMLError as err:
                 mem = handleError(err)
             strResult += '      <mem_clock>' + mem + '</mem_clock>\n'
@@ -703,12 +719,12 @@ def XmlDeviceQuery():
 
             strResult += '    <applications_clocks>\n'
             try:
-                graphics = str(nvmlDeviceGetApplicationsClock(handle, NVML_CLOCK_GRAPHICS)) + ' MHz'
+                graphics = FormatValue(nvmlDeviceGetApplicationsClock(handle, NVML_CLOCK_GRAPHICS, default=None), '%s MHz')
             except NVMLError as err:
                 graphics = handleError(err)
             strResult += '      <graphics_clock>' +graphics + '</graphics_clock>\n'
             try:
-                mem = str(nvmlDeviceGetApplicationsClock(handle, NVML_CLOCK_MEM)) + ' MHz'
+                mem = FormatValue(nvmlDeviceGetApplicationsClock(handle, NVML_CLOCK_MEM, default=None), '%s MHz')
             except NVMLError as err:
                 mem = handleError(err)
             strResult += '      <mem_clock>' + mem + '</mem_clock>\n'
@@ -716,12 +732,12 @@ def XmlDeviceQuery():
 
             strResult += '    <default_applications_clocks>\n'
             try:
-                graphics = str(nvmlDeviceGetDefaultApplicationsClock(handle, NVML_CLOCK_GRAPHICS)) + ' MHz'
+                graphics = FormatValue(nvmlDeviceGetDefaultApplicationsClock(handle, NVML_CLOCK_GRAPHICS, default=None), '%s MHz')
             except NVMLError as err:
                 graphics = handleError(err)
             strResult += '      <graphics_clock>' +graphics + '</graphics_clock>\n'
             try:
-                mem = str(nvmlDeviceGetDefaultApplicationsClock(handle, NVML_CLOCK_MEM)) + ' MHz'
+                mem = FormatValue(nvmlDeviceGetDefaultApplicationsClock(handle, NVML_CLOCK_MEM, default=None), '%s MHz')
             except NVMLError as err:
                 mem = handleError(err)
             strResult += '      <mem_clock>' + mem + '</mem_clock>\n'
@@ -729,17 +745,17 @@ def XmlDeviceQuery():
 
             strResult += '    <max_clocks>\n'
             try:
-                graphics = str(nvmlDeviceGetMaxClockInfo(handle, NVML_CLOCK_GRAPHICS)) + ' MHz'
+                graphics = FormatValue(nvmlDeviceGetMaxClockInfo(handle, NVML_CLOCK_GRAPHICS, default=None), '%s MHz')
             except NVMLError as err:
                 graphics = handleError(err)
             strResult += '      <graphics_clock>' + graphics + '</graphics_clock>\n'
             try:
-                sm = str(nvmlDeviceGetMaxClockInfo(handle, NVML_CLOCK_SM)) + ' MHz'
+                sm = FormatValue(nvmlDeviceGetMaxClockInfo(handle, NVML_CLOCK_SM, default=None), '%s MHz')
             except NVMLError as err:
                 sm = handleError(err)
             strResult += '      <sm_clock>' + sm + '</sm_clock>\n'
             try:
-                mem = str(nvmlDeviceGetMaxClockInfo(handle, NVML_CLOCK_MEM)) + ' MHz'
+                mem = FormatValue(nvmlDeviceGetMaxClockInfo(handle, NVML_CLOCK_MEM, default=None), '%s MHz')
             except NVMLError as err:
                 mem = handleError(err)
             strResult += '      <mem_clock>' + mem + '</mem_clock>\n'
@@ -770,14 +786,21 @@ def XmlDeviceQuery():
             strResult += '    </clock_policy>\n'
 
             try:
-                memClocks = nvmlDeviceGetSupportedMemoryClocks(handle)
+                try:
+                    supportedClocks = nvmlDeviceGetSupportedClocks(handle)
+                except NVMLError:
+                    # Ask for each memory clock on its own, so one that fails
+                    # only shows the error in its own entry
+                    supportedClocks = [(m, None) for m in
+                                       nvmlDeviceGetSupportedMemoryClocks(handle)]
                 strResult += '    <supported_clocks>\n'
 
-                for m in memClocks:
+                for m, clocks in supportedClocks:
                     strResult += '      <supported_mem_clock>\n'
                     strResult += '        <value>%d MHz</value>\n' % m
                     try:
-                        clocks = nvmlDeviceGetSupportedGraphicsClocks(handle, m)
+                        if clocks is None:
+                            clocks = nvmlDeviceGetSupportedGraphicsClocks(handle, m)
                         for c in clocks:
                             strResult += '        <supported_graphics_clock>%d MHz</supported_graphics_clock>\n' % c
                     except NVMLError as err:
@@ -793,14 +816,20 @@ def XmlDeviceQuery():
                 strResult += '    <processes>\n'
 
                 for p in procs:
-                    try:
-                        name = str(nvmlSystemGetProcessName(p.pid))
-                    except NVMLError as err:
-                        if (err.value == NVML_ERROR_NOT_FOUND):
-                            # probably went away
-                            continue
-                        else:
-                            name = handleError(err)
+                    info = get_process_info(p.pid)
+                    if info is not None and info.name is not None:
+                        name = str(info.name)
+                    else:
+                        # Not in /proc (e.g. in another pid namespace) and
+                        # NVML couldn't name it either
+                        try:
+                            name = str(nvmlSystemGetProcessName(p.pid))
+                        except NVMLError as err:
+                            if (err.value == NVML_ERROR_NOT_FOUND):
+                                # probably went away
+                                continue
+                            else:
+                                name = handleError(err)
 
                     strResult += '    <process_info>\n'
                     strResult += '      <pid>%d</pid>\n' % p.pid
@@ -819,7 +848,7 @@ def XmlDeviceQuery():
 
 
             try:
-                pids = nvmlDeviceGetAccountingPids(handle)
+                pids = nvmlDeviceGetAccountingPids(handle, bufferSize)
                 strResult += '    <accounted_processes>\n'
 
                 for pid in pids :
@@ -864,7 +893,8 @@ def XmlDeviceQuery():
     except NVMLError as err:
         strResult += 'nvidia_smi.py: ' + err.__str__() + '\n'
 
-    nvmlShutdown()
+    if initialized:
+        session.release()
 
     return strResult
 
@@ -0,0 +1,187 @@
+"""
+Monitoring PCIe bandwidth.
+
+Every call to nvmlDeviceGetPcieThroughput blocks in the driver for a sampling
+window. :class:`PcieMonitor` makes the TX and RX calls of every gpu at the same
+time on a thread pool (ctypes lets go of the GIL during the call), so reading
+all the gpus takes about one window instead of two per gpu. The throughput is
+reported against the most the current link generation and width can carry.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.pcie import PcieMonitor
+
+    nvmlInit()
+    with PcieMonitor() as monitor:
+        for s in monitor.poll():
+            print(s.uuid, s.tx, s.rx, s.tx_utilization, s.rx_utilization)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from py3nvml import py3nvml
+
+#: Bytes per second one lane carries in each direction, by link generation,
+#: after line encoding
+LANE_BANDWIDTH = {
+    1: 250e6,
+    2: 500e6,
+    3: 8e9 * 128 / 130 / 8,
+    4: 16e9 * 128 / 130 / 8,
+    5: 32e9 * 128 / 130 / 8,
+    6: 64e9 * 242 / 256 / 8,
+}
+
+#: The PCIe throughput of one gpu.
+#:
+#: ``tx`` and ``rx`` are in bytes per second, ``max`` is what the current
+#: link carries in each direction, and ``tx_utilization`` and
+#: ``rx_utilization`` are the fractions of it in use. Any of them are None if
+#: the gpu doesn't report what they need.
+PcieSample = namedtuple('PcieSample', [
+    'uuid', 'timestamp', 'tx', 'rx', 'generation', 'width', 'max',
+    'tx_utilization', 'rx_utilization'])
+
+
+def max_bandwidth(generation, width):
+    """
+    Returns the bytes per second a link carries in each direction, or None for
+    an unknown generation.
+    """
+    lane = LANE_BANDWIDTH.get(generation)
+    if lane is None or not width:
+        return None
+    return lane * width
+
+
+def _throughput(handle, counter):
+    # in KB/s
+    kb = py3nvml.nvmlDeviceGetPcieThroughput(handle, counter, default=None)
+    return None if kb is None else kb * 1024
+
+
+def _link(handle):
+    return (py3nvml.nvmlDeviceGetCurrPcieLinkGeneration(handle, default=None),
+            py3nvml.nvmlDeviceGetCurrPcieLinkWidth(handle, default=None))
+
+
+def _utilization(value, maximum):
+    if value is None or maximum is None:
+        return None
+    return value / maximum
+
+
+class PcieMonitor(object):
+    """
+    Reads the PCIe throughput of all gpus concurrently.
+
+    NVML must be initialized for as long as the monitor is used. Call
+    :meth:`close`, or use the monitor as a context manager, to stop the
+    threads.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to watch. If None, watches all gpus.
+    workers : int
+        Threads in the pool. Defaults to three per gpu, so the TX, RX and
+        link queries of every gpu are all made at once.
+    """
+    def __init__(self, devices=None, workers=None):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.handles = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.handles.append((py3nvml.nvmlDeviceGetUUID(handle), handle))
+        self.workers = workers or max(1, 3 * len(self.handles))
+        self.logger = logging.getLogger(__name__)
+        self._pool = None
+        self._latest = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def poll(self):
+        """
+        Reads the throughput of every gpu.
+
+        Returns
+        -------
+        samples : list of :data:`PcieSample`
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers)
+        submit = self._pool.submit
+        # The link can change speed to save power, so read it every time
+        futures = [(submit(_throughput, h, py3nvml.NVML_PCIE_UTIL_TX_BYTES),
+                    submit(_throughput, h, py3nvml.NVML_PCIE_UTIL_RX_BYTES),
+                    submit(_link, h))
+                   for _, h in self.handles]
+
+        now = time.time()
+        samples = []
+        for (uuid, _), (tx, rx, link) in zip(self.handles, futures):
+            tx, rx = tx.result(), rx.result()
+            gen, width = link.result()
+            maximum = max_bandwidth(gen, width)
+            samples.append(PcieSample(
+                uuid, now, tx, rx, gen, width, maximum,
+                _utilization(tx, maximum), _utilization(rx, maximum)))
+        with self._lock:
+            self._latest = samples
+        return samples
+
+    def latest(self):
+        """ Returns the samples of the last poll, or None """
+        with self._lock:
+            return self._latest
+
+    def start(self, interval=1.0):
+        """ Polls every interval seconds in a background thread """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                start = time.time()
+                try:
+                    self.poll()
+                except py3nvml.NVMLError as err:
+                    self.logger.warning('Could not read PCIe throughput: '
+                                        '{}'.format(err))
+                self._stop.wait(max(0, interval - (time.time() - start)))
+        self._thread = threading.Thread(target=run, name='PcieMonitor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread started by :meth:`start` """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """ Stops polling and shuts down the thread pool """
+        self.stop()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,169 @@
+"""
+Sharing one sampler with the workers of a multiprocessing pool.
+
+Workers that want to know the state of the gpus shouldn't each initialize
+NVML and query the driver. :func:`snapshot_pool` makes a
+``multiprocessing.Pool`` whose workers read the latest snapshot of a
+:class:`~py3nvml.snapshot.Sampler` running in the parent instead. The sampler
+publishes every snapshot it takes into a block of shared memory, and
+:func:`worker_snapshot` reads it back in a worker, only unpickling it when it
+has changed.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.snapshot import Sampler
+    from py3nvml.pool import snapshot_pool, worker_snapshot
+
+    def work(item):
+        snap = worker_snapshot()
+        ...
+
+    nvmlInit()
+    sampler = Sampler(interval=1)
+    sampler.start()
+    with snapshot_pool(sampler, processes=16) as pool:
+        pool.map(work, items)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import ctypes
+import multiprocessing
+import multiprocessing.pool
+import pickle
+import struct
+
+# version, length of the pickled snapshot
+_HEADER = struct.Struct('<QQ')
+
+
+class SharedSnapshot(object):
+    """
+    A snapshot in shared memory, written by one process and read by many.
+
+    Make it before starting the processes that read it, and pass it to them
+    (e.g. as a Pool initializer argument).
+
+    Parameters
+    ----------
+    size : int
+        Bytes of shared memory. Snapshots that don't fit can't be published.
+    context : multiprocessing context
+        The context of the processes that read it. Defaults to the default
+        one.
+    """
+    def __init__(self, size=1 << 20, context=None):
+        context = context or multiprocessing.get_context()
+        self._lock = context.Lock()
+        self._buf = context.RawArray(ctypes.c_char, _HEADER.size + size)
+        self._cache = (0, None)
+
+    def publish(self, snapshot):
+        """ Replaces the shared snapshot """
+        data = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+        if len(data) > len(self._buf) - _HEADER.size:
+            raise ValueError('A snapshot of {} bytes does not fit in {} '
+                             'bytes'.format(len(data),
+                                            len(self._buf) - _HEADER.size))
+        address = ctypes.addressof(self._buf)
+        with self._lock:
+            version, _ = _HEADER.unpack(ctypes.string_at(address,
+                                                         _HEADER.size))
+            ctypes.memmove(address + _HEADER.size, data, len(data))
+            header = _HEADER.pack(version + 1, len(data))
+            ctypes.memmove(address, header, _HEADER.size)
+
+    def read(self):
+        """
+        Returns the shared snapshot, or None if none was published yet.
+        """
+        address = ctypes.addressof(self._buf)
+        with self._lock:
+            version, length = _HEADER.unpack(ctypes.string_at(address,
+                                                              _HEADER.size))
+            if version == self._cache[0]:
+                return self._cache[1]
+            data = ctypes.string_at(address + _HEADER.size, length)
+        self._cache = (version, pickle.loads(data))
+        return self._cache[1]
+
+
+# The SharedSnapshot of this worker
+_shared = None
+
+
+def _init_worker(shared, initializer, initargs):
+    global _shared
+    _shared = shared
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def worker_snapshot():
+    """
+    Returns the latest snapshot of the sampler, in a worker of a
+    :func:`snapshot_pool`. Returns None outside one.
+    """
+    return None if _shared is None else _shared.read()
+
+
+class _SnapshotPool(multiprocessing.pool.Pool):
+    # A Pool that stops publishing the snapshots of the sampler once it is
+    # closed or terminated
+    def __init__(self, sampler, publish, *args, **kwargs):
+        self._sampler = sampler
+        self._publish = publish
+        super(_SnapshotPool, self).__init__(*args, **kwargs)
+
+    def _stop_publishing(self):
+        self._sampler.remove_callback(self._publish)
+
+    def close(self):
+        self._stop_publishing()
+        super(_SnapshotPool, self).close()
+
+    def terminate(self):
+        self._stop_publishing()
+        super(_SnapshotPool, self).terminate()
+
+
+def snapshot_pool(sampler, processes=None, initializer=None, initargs=(),
+                  size=1 << 20, context=None, **kwargs):
+    """
+    Makes a multiprocessing.Pool whose workers can read the snapshots of a
+    sampler with :func:`worker_snapshot`.
+
+    The latest snapshot of the sampler, or a new one if it has none, is
+    shared straight away. After that, whatever it samples, until the pool is
+    closed or terminated.
+
+    Parameters
+    ----------
+    sampler : :class:`~py3nvml.snapshot.Sampler`
+        Takes the snapshots, in this process.
+    processes, initializer, initargs, kwargs
+        As for multiprocessing.Pool.
+    size : int
+        Bytes of shared memory to hold a pickled snapshot.
+    context : multiprocessing context
+        The context to start the workers with. Defaults to the default one.
+
+    Returns
+    -------
+    pool : multiprocessing.Pool
+    """
+    context = context or multiprocessing.get_context()
+    shared = SharedSnapshot(size, context)
+    shared.publish(sampler.latest() or sampler.sample())
+    sampler.add_callback(shared.publish)
+    try:
+        return _SnapshotPool(sampler, shared.publish, processes, _init_worker,
+                             (shared, initializer, initargs), context=context,
+                             **kwargs)
+    except BaseException:
+        sampler.remove_callback(shared.publish)
+        raise
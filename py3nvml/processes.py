@@ -0,0 +1,226 @@
+"""
+A process centric view of gpu memory use.
+
+:class:`ProcessMonitor` polls the running processes of every gpu and keeps
+a short memory history for each (pid, gpu) pair. Process names are looked up
+once per process, not once per poll, through a
+:class:`~py3nvml.procinfo.ProcessInfoCache`. Questions like "who is using the most
+gpu memory" or "whose memory is growing fastest" are then answered from that
+index without touching the driver.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.processes import ProcessMonitor
+
+    nvmlInit()
+    monitor = ProcessMonitor()
+    monitor.start(interval=1)
+    ...
+    for pid, name, used in monitor.top_memory(5):
+        print(pid, name, used)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import deque
+import logging
+import threading
+import time
+
+from py3nvml import py3nvml
+from py3nvml.procinfo import ProcessInfoCache
+
+
+class _ProcessEntry(object):
+    def __init__(self, start_time, name):
+        # tells a process from a later one that reused its pid
+        self.start_time = start_time
+        self.name = name
+        # gpu uuid -> deque of (timestamp, usedGpuMemory)
+        self.gpus = {}
+
+
+class ProcessMonitor(object):
+    """
+    Keeps the memory history of every process on every gpu.
+
+    NVML must be initialized for as long as the monitor is used.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to watch. If None, watches all gpus.
+    history : int
+        How many samples to keep per process and gpu.
+    cache : :class:`~py3nvml.procinfo.ProcessInfoCache`
+        Where to look up processes. Defaults to a cache of the monitor's own.
+    """
+    def __init__(self, devices=None, history=60, cache=None):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.handles = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.handles.append((py3nvml.nvmlDeviceGetUUID(handle), handle))
+        self.history = history
+        self.cache = ProcessInfoCache() if cache is None else cache
+        self.processes = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _name(self, pid):
+        info = self.cache.get(pid)
+        return None if info is None else info.name
+
+    def poll(self):
+        """
+        Takes one sample of the processes on every gpu.
+
+        The history of a gpu that can't be read this time is kept as it is.
+        """
+        now = time.time()
+        seen = {}
+        failed = set()
+        for uuid, handle in self.handles:
+            try:
+                procs = py3nvml.nvmlDeviceGetComputeRunningProcesses(handle)
+            except py3nvml.NVMLError as err:
+                self.logger.debug('Could not get the processes on {}: '
+                                  '{}'.format(uuid, err))
+                failed.add(uuid)
+                continue
+            for p in procs:
+                seen.setdefault(p.pid, {})[uuid] = p.usedGpuMemory
+
+        # Look up names outside the lock so readers aren't held up. A pid
+        # that started again since the last poll belongs to a new process.
+        start_times = dict((pid, self.cache.start_time(pid)) for pid in seen)
+        with self.lock:
+            new = [pid for pid in seen if pid not in self.processes or
+                   self.processes[pid].start_time != start_times[pid]]
+        names = dict((pid, self._name(pid)) for pid in new)
+
+        with self.lock:
+            for pid in new:
+                self.processes[pid] = _ProcessEntry(start_times[pid],
+                                                    names[pid])
+            for pid, entry in list(self.processes.items()):
+                gpus = seen.get(pid, {})
+                # Only the gpus that answered say a process has left them
+                for uuid in list(entry.gpus):
+                    if uuid not in gpus and uuid not in failed:
+                        del entry.gpus[uuid]
+                for uuid, used in gpus.items():
+                    if uuid not in entry.gpus:
+                        entry.gpus[uuid] = deque(maxlen=self.history)
+                    entry.gpus[uuid].append((now, used))
+                # Forget processes that have finished
+                if not entry.gpus:
+                    del self.processes[pid]
+            self.cache.prune(self.processes)
+
+    def start(self, interval=1.0):
+        """ Polls every interval seconds in a background thread """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                start = time.time()
+                self.poll()
+                self._stop.wait(max(0, interval - (time.time() - start)))
+        self._thread = threading.Thread(target=run, name='ProcessMonitor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread started by :meth:`start` """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def usage(self, pid):
+        """
+        Returns the memory history of a process.
+
+        Returns
+        -------
+        usage : dict
+            Maps gpu uuid to a list of (timestamp, usedGpuMemory) samples,
+            oldest first. usedGpuMemory is None where the driver doesn't
+            report it.
+        """
+        with self.lock:
+            entry = self.processes.get(pid)
+            if entry is None:
+                return {}
+            return dict((uuid, list(h)) for uuid, h in entry.gpus.items())
+
+    def name(self, pid):
+        """ Returns the cached name of a process """
+        with self.lock:
+            entry = self.processes.get(pid)
+            return None if entry is None else entry.name
+
+    def top_memory(self, k=10):
+        """
+        Finds the processes using the most gpu memory right now.
+
+        Parameters
+        ----------
+        k : int
+            How many processes to return.
+
+        Returns
+        -------
+        top : list of (pid, name, used) tuples
+            used is the total memory of the process across all gpus, in bytes.
+            Sorted by used, largest first.
+        """
+        with self.lock:
+            totals = [(pid, e.name, sum(h[-1][1] or 0 for h in
+                                        e.gpus.values()))
+                      for pid, e in self.processes.items()]
+        totals.sort(key=lambda x: x[2], reverse=True)
+        return totals[:k]
+
+    def top_growth(self, k=10, window=None):
+        """
+        Finds the processes whose gpu memory is growing fastest.
+
+        Parameters
+        ----------
+        k : int
+            How many processes to return.
+        window : float
+            Only look at samples from the last window seconds. If None, uses
+            the whole history.
+
+        Returns
+        -------
+        top : list of (pid, name, rate) tuples
+            rate is the growth of the memory of the process summed across all
+            gpus, in bytes per second. Sorted by rate, largest first.
+        """
+        cutoff = None if window is None else time.time() - window
+        rates = []
+        with self.lock:
+            for pid, e in self.processes.items():
+                rate = 0.0
+                for h in e.gpus.values():
+                    samples = [s for s in h if s[1] is not None and
+                               (cutoff is None or s[0] >= cutoff)]
+                    if len(samples) >= 2 and samples[-1][0] > samples[0][0]:
+                        rate += (samples[-1][1] - samples[0][1]) / \
+                            (samples[-1][0] - samples[0][0])
+                rates.append((pid, e.name, rate))
+        rates.sort(key=lambda x: x[2], reverse=True)
+        return rates[:k]
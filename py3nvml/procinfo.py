@@ -0,0 +1,198 @@
+"""
+Cached information about the processes using the gpus.
+
+Reports that name the processes on every gpu call nvmlSystemGetProcessName
+for each of them every time. :class:`ProcessInfoCache` looks each process up
+once and keeps the result, with its command line, owner and cgroup read from
+/proc. Entries are keyed by the pid and the start time of the process, so a
+pid that is reused by a new process is looked up again.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.procinfo import get_process_info
+
+    for p in nvmlDeviceGetComputeRunningProcesses(handle):
+        info = get_process_info(p.pid)
+        print(p.pid, info.name, info.uid, info.container)
+
+Where there is no /proc (or the pid isn't in it, e.g. in a container with its
+own pid namespace) only the name is known, from NVML, and reused pids can't
+be told apart.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import OrderedDict, namedtuple
+import os
+import re
+import threading
+
+from py3nvml import py3nvml
+
+#: What is known about a process. ``start_time`` is in clock ticks since boot,
+#: as in /proc/<pid>/stat. ``name`` is what nvmlSystemGetProcessName reports,
+#: or the first word of the command line. ``cgroup`` is the path of the
+#: process in the cgroup v2 hierarchy, or in the memory hierarchy with cgroup
+#: v1. ``container`` is the id of the container the cgroup belongs to. Fields
+#: that can't be read are None.
+ProcessInfo = namedtuple('ProcessInfo', [
+    'pid', 'start_time', 'name', 'comm', 'cmdline', 'uid', 'cgroup',
+    'container'])
+
+# The 64 hex digit ids of docker, containerd, cri-o and podman containers
+_CONTAINER_ID = re.compile(r'([0-9a-f]{64})')
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def parse_cgroup(text):
+    """
+    Returns the cgroup path of a process from the contents of
+    /proc/<pid>/cgroup: its cgroup v2 path if it has one, otherwise its
+    memory cgroup, otherwise the first.
+    """
+    paths = {}
+    for line in text.splitlines():
+        parts = line.split(':', 2)
+        if len(parts) == 3:
+            for controller in parts[1].split(','):
+                paths.setdefault(controller, parts[2])
+            paths.setdefault(None, parts[2])
+    if '' in paths and paths[''] != '/':
+        return paths['']
+    return paths.get('memory', paths.get(None))
+
+
+def container_id(cgroup):
+    """ Returns the id of the container a cgroup path belongs to, or None """
+    if cgroup is None:
+        return None
+    m = _CONTAINER_ID.search(cgroup)
+    return None if m is None else m.group(1)
+
+
+class ProcessInfoCache(object):
+    """
+    Looks up processes, once each.
+
+    Parameters
+    ----------
+    proc : str
+        Where procfs is mounted.
+    use_nvml : bool
+        Name processes with nvmlSystemGetProcessName, like nvidia-smi does.
+        Otherwise they're named from /proc, without a driver call. NVML must
+        be initialized while looking up processes if this is True.
+    max_size : int
+        How many processes to remember. The oldest entries are forgotten
+        first.
+    """
+    def __init__(self, proc='/proc', use_nvml=True, max_size=4096):
+        self.proc = proc
+        self.use_nvml = use_nvml
+        self.max_size = max_size
+        # (pid, start_time) -> ProcessInfo
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, pid, name):
+        return os.path.join(self.proc, str(pid), name)
+
+    def start_time(self, pid):
+        """ Returns the start time of a process, or None if it's unknown """
+        stat = _read(self._path(pid, 'stat'))
+        if stat is None:
+            return None
+        # The name in parentheses can hold anything, so count fields from the
+        # last ')'. starttime is the 22nd field.
+        fields = stat[stat.rfind(b')') + 2:].split()
+        try:
+            return int(fields[19])
+        except (IndexError, ValueError):
+            return None
+
+    def _lookup(self, pid, start_time):
+        name = None
+        if self.use_nvml:
+            try:
+                name = py3nvml.nvmlSystemGetProcessName(pid)
+            except py3nvml.NVMLError:
+                pass
+        if start_time is None:
+            if name is None:
+                return None
+            return ProcessInfo(pid, None, name, None, None, None, None, None)
+
+        comm = _read(self._path(pid, 'comm'))
+        if comm is not None:
+            comm = comm.decode('utf-8', 'replace').rstrip('\n')
+        cmdline = _read(self._path(pid, 'cmdline'))
+        if cmdline is not None:
+            cmdline = [a.decode('utf-8', 'replace')
+                       for a in cmdline.split(b'\0')[:-1]]
+        if name is None:
+            name = cmdline[0] if cmdline else comm
+        uid = None
+        status = _read(self._path(pid, 'status'))
+        for line in (status or b'').splitlines():
+            if line.startswith(b'Uid:'):
+                uid = int(line.split()[1])
+                break
+        cgroup = _read(self._path(pid, 'cgroup'))
+        if cgroup is not None:
+            cgroup = parse_cgroup(cgroup.decode('utf-8', 'replace'))
+        return ProcessInfo(pid, start_time, name, comm, cmdline, uid, cgroup,
+                           container_id(cgroup))
+
+    def get(self, pid):
+        """
+        Returns the :data:`ProcessInfo` of a process, or None if the process
+        doesn't exist.
+        """
+        key = (pid, self.start_time(pid))
+        with self._lock:
+            info = self._entries.get(key)
+        if info is not None:
+            return info
+        info = self._lookup(*key)
+        if info is not None:
+            with self._lock:
+                self._entries[key] = info
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return info
+
+    def prune(self, pids):
+        """ Forgets every process whose pid isn't in pids """
+        pids = set(pids)
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] not in pids:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = ProcessInfoCache()
+
+
+def get_process_info(pid):
+    """
+    Returns the :data:`ProcessInfo` of a process from a cache shared by the
+    whole process, or None if the process doesn't exist.
+    """
+    return _cache.get(pid)
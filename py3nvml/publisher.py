@@ -0,0 +1,271 @@
+"""
+Publishing snapshots to every process on a node through shared memory.
+
+When many processes on a node each poll NVML for the same numbers, the
+driver does the same work over and over. Instead, one process can run a
+:class:`SnapshotPublisher`, which writes every snapshot its
+:class:`~py3nvml.snapshot.Sampler` takes into a named block of shared memory.
+Any other process opens the block with a :class:`SnapshotReader` and reads the
+latest snapshot straight from memory, without NVML or a system call.
+
+The block has a fixed layout, so a snapshot is written in place. The header
+holds a sequence number that is odd while a write is in progress. Readers copy
+the snapshot, and if the number was odd or changed meanwhile, they try again.
+Writers never wait for readers.
+
+Needs Python 3.8 or later for multiprocessing.shared_memory.
+
+E.g. in the publishing process
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.snapshot import Sampler
+    from py3nvml.publisher import SnapshotPublisher
+
+    nvmlInit()
+    sampler = Sampler(interval=1)
+    publisher = SnapshotPublisher(sampler)
+    sampler.start()
+
+and in any other process
+
+.. code:: python
+
+    from py3nvml.publisher import SnapshotReader
+
+    reader = SnapshotReader()
+    snap = reader.read()
+    print(snap.value(snap.uuids[0], 'memory.used'))
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from array import array
+import json
+import struct
+import time
+
+from py3nvml.snapshot import Snapshot
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+#: The name of the block when none is given
+DEFAULT_NAME = 'py3nvml_snapshot'
+
+_MAGIC = b'PY3NVML1'
+# magic, sequence number, timestamp, gpus, fields, max processes, processes,
+# bytes of names. The sequence number is at offset 8.
+_HEADER = struct.Struct('<8sQdIIIII4x')
+_SEQ = struct.Struct('<Q')
+_SEQ_OFFSET = 8
+# timestamp, processes
+_STATE = struct.Struct('<d12xI')
+_STATE_OFFSET = 16
+
+# The names of the blocks made by this process
+_published = set()
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class _Layout(object):
+    # Offsets of the parts of a block
+    def __init__(self, num_gpus, num_fields, max_processes, names_size):
+        self.num_values = num_gpus * num_fields
+        self.max_processes = max_processes
+        self.names = _HEADER.size
+        self.values = _align(self.names + names_size)
+        self.processes = self.values + 8 * self.num_values
+        self.size = self.processes + 24 * max_processes
+
+
+def _check():
+    if shared_memory is None:
+        raise ImportError('multiprocessing.shared_memory (Python 3.8+) is '
+                          'needed to share snapshots')
+
+
+class SnapshotPublisher(object):
+    """
+    Writes snapshots into a named block of shared memory.
+
+    The block is made for the gpus and fields of the sampler, and removed by
+    :meth:`close`.
+
+    Parameters
+    ----------
+    sampler : :class:`~py3nvml.snapshot.Sampler`
+        Every snapshot it takes is published. If None, call :meth:`publish`.
+    name : str
+        The name of the block.
+    uuids, fields : sequence of str
+        The gpus and fields of the snapshots, if there is no sampler.
+    max_processes : int
+        Room for this many running processes, on all gpus together.
+    """
+    def __init__(self, sampler=None, name=DEFAULT_NAME, uuids=None,
+                 fields=None, max_processes=1024):
+        _check()
+        if sampler is not None:
+            uuids = [u for u, _ in sampler.handles]
+            fields = sampler.fields
+        self.uuids = tuple(uuids)
+        self.fields = tuple(fields)
+        names = json.dumps({'uuids': self.uuids,
+                            'fields': self.fields}).encode('utf-8')
+        self.layout = _Layout(len(self.uuids), len(self.fields),
+                              max_processes, len(names))
+        self.shm = shared_memory.SharedMemory(name, create=True,
+                                              size=self.layout.size)
+        _published.add(self.shm.name)
+        self.buf = self.shm.buf
+        self.seq = 0
+        _HEADER.pack_into(self.buf, 0, _MAGIC, 0, 0.0, len(self.uuids),
+                          len(self.fields), max_processes, 0, len(names))
+        self.buf[self.layout.names:self.layout.names + len(names)] = names
+        self.sampler = sampler
+        if sampler is not None:
+            sampler.add_callback(self.publish)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, snapshot):
+        """ Writes a snapshot over the last one """
+        if self.shm is None:
+            raise ValueError('The publisher is closed')
+        if snapshot.uuids != self.uuids or snapshot.fields != self.fields:
+            raise ValueError('The snapshot is not of the gpus and fields '
+                             'being published')
+        procs = snapshot.processes
+        if len(procs) > 3 * self.layout.max_processes:
+            raise ValueError('{} processes do not fit in room for '
+                             '{}'.format(len(procs) // 3,
+                                         self.layout.max_processes))
+        layout, buf = self.layout, self.buf
+        self.seq += 1
+        _SEQ.pack_into(buf, _SEQ_OFFSET, self.seq)
+        _STATE.pack_into(buf, _STATE_OFFSET, snapshot.timestamp,
+                         len(procs) // 3)
+        buf[layout.values:layout.processes] = \
+            memoryview(snapshot.values).cast('B')
+        buf[layout.processes:layout.processes + 8 * len(procs)] = \
+            memoryview(procs).cast('B')
+        self.seq += 1
+        _SEQ.pack_into(buf, _SEQ_OFFSET, self.seq)
+
+    def close(self):
+        """ Removes the block. Readers that have it open keep their copy """
+        if self.sampler is not None:
+            self.sampler.remove_callback(self.publish)
+            self.sampler = None
+        if self.shm is not None:
+            self.buf.release()
+            self.shm.close()
+            self.shm.unlink()
+            _published.discard(self.shm.name)
+            self.shm = self.buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SnapshotReader(object):
+    """
+    Reads the snapshots of a :class:`SnapshotPublisher` in any process.
+
+    Parameters
+    ----------
+    name : str
+        The name of the block.
+    """
+    def __init__(self, name=DEFAULT_NAME):
+        _check()
+        self.shm = shared_memory.SharedMemory(name)
+        if self.shm.name not in _published:
+            # Only the publisher may remove the block, but Python < 3.13
+            # would remove it when this process exits
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+            except (ImportError, AttributeError):
+                pass
+        self.buf = self.shm.buf
+        magic, _, _, num_gpus, num_fields, max_processes, _, names_size = \
+            _HEADER.unpack_from(self.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('{} does not hold py3nvml snapshots'.format(name))
+        self.layout = _Layout(num_gpus, num_fields, max_processes, names_size)
+        names = json.loads(bytes(self.buf[
+            self.layout.names:self.layout.names + names_size]).decode('utf-8'))
+        self.uuids = tuple(names['uuids'])
+        self.fields = tuple(names['fields'])
+        self._last = (0, None)
+
+    def read(self, timeout=1.0):
+        """
+        Returns the latest snapshot, or None if none was published yet.
+
+        Parameters
+        ----------
+        timeout : float
+            Seconds to keep trying while the publisher is writing.
+
+        Raises
+        ------
+        RuntimeError
+            If the publisher was writing for all of timeout, e.g. because it
+            died in the middle of it.
+        """
+        layout, buf = self.layout, self.buf
+        deadline = None
+        tries = 0
+        while True:
+            seq = _SEQ.unpack_from(buf, _SEQ_OFFSET)[0]
+            if seq == self._last[0]:
+                return self._last[1]
+            if not seq & 1:
+                timestamp, num_procs = _STATE.unpack_from(buf, _STATE_OFFSET)
+                num_procs = min(num_procs, layout.max_processes)
+                values = array('q')
+                values.frombytes(buf[layout.values:layout.processes])
+                procs = array('q')
+                procs.frombytes(buf[layout.processes:
+                                    layout.processes + 24 * num_procs])
+                if _SEQ.unpack_from(buf, _SEQ_OFFSET)[0] == seq:
+                    snap = Snapshot(timestamp, self.uuids, self.fields, values,
+                                    procs)
+                    self._last = (seq, snap)
+                    return snap
+            # Spin for a moment, then back off
+            tries += 1
+            if tries > 100:
+                if deadline is None:
+                    deadline = time.time() + timeout
+                elif time.time() > deadline:
+                    raise RuntimeError('The snapshot publisher did not finish '
+                                       'writing')
+                time.sleep(0.0001)
+
+    def close(self):
+        if self.shm is not None:
+            self.buf.release()
+            self.shm.close()
+            self.shm = self.buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -30,10 +30,10 @@
 # Python bindings for the NVML library
 ##
 from ctypes import *    # noqa
+from ctypes import _Pointer
 import sys
 import os
 import threading
-import string
 
 # C Type mappings #
 # Enums
@@ -232,6 +232,8 @@ nvmlLib = None
 libLoadLock = threading.Lock()
 # Incremented on each nvmlInit and decremented on nvmlShutdown
 _nvmlLib_refcount = 0
+# Set in a forked child whose parent had initialized NVML
+_nvmlReinitAfterFork = False
 
 
 # Error Checking #
@@ -259,13 +261,15 @@ class NVMLError(Exception):
         NVML_ERROR_LIB_RM_VERSION_MISMATCH: "RM has detected an NVML/RM version mismatch.",
         NVML_ERROR_UNKNOWN:             "Unknown Error",
         }
-    def __new__(typ, value):
+    def __new__(typ, value=None):
         '''
         Maps value to a proper subclass of NVMLError.
-        See _extractNVMLErrorsAsClasses function for more details
+        The subclasses are made without a value, e.g. NVMLError_NotFound()
         '''
         if typ == NVMLError:
             typ = NVMLError._valClassMapping.get(value, typ)
+        elif value is None:
+            value = typ._value
         obj = Exception.__new__(typ)
         obj.value = value
         return obj
@@ -282,34 +286,72 @@ class NVMLError(Exception):
         return self.value == other.value
 
 
-def _extractNVMLErrorsAsClasses():
-    '''
-    Generates a hierarchy of classes on top of NVMLError class.
+# A hierarchy of classes on top of NVMLError.
+#
+# Each NVML error gets its own NVMLError subclass, so try, except blocks can
+# filter the errors they expect. e.g. NVML_ERROR_ALREADY_INITIALIZED becomes
+# NVMLError_AlreadyInitialized. NVMLError(value) returns an instance of the
+# subclass for value.
+class NVMLError_Uninitialized(NVMLError):
+    _value = NVML_ERROR_UNINITIALIZED
 
-    Each NVML Error gets a new NVMLError subclass. This way try,except blocks can filter appropriate
-    exceptions more easily.
+class NVMLError_InvalidArgument(NVMLError):
+    _value = NVML_ERROR_INVALID_ARGUMENT
 
-    NVMLError is a parent class. Each NVML_ERROR_* gets it's own subclass.
-    e.g. NVML_ERROR_ALREADY_INITIALIZED will be turned into NVMLError_AlreadyInitialized
-    '''
-    this_module = sys.modules[__name__]
-    nvmlErrorsNames = [x for x in dir(this_module) if x.startswith("NVML_ERROR_")]
-    for err_name in nvmlErrorsNames:
-        # e.g. Turn NVML_ERROR_ALREADY_INITIALIZED into NVMLError_AlreadyInitialized
-        class_name = "NVMLError_" + string.capwords(err_name.replace("NVML_ERROR_", ""), "_").replace("_", "")
-        err_val = getattr(this_module, err_name)
-        def gen_new(val):
-            def new(typ):
-                obj = NVMLError.__new__(typ, val)
-                return obj
-            return new
-        new_error_class = type(class_name, (NVMLError,), {'__new__': gen_new(err_val)})
-        new_error_class.__module__ = __name__
-        setattr(this_module, class_name, new_error_class)
-        NVMLError._valClassMapping[err_val] = new_error_class
-
-
-_extractNVMLErrorsAsClasses()
+class NVMLError_NotSupported(NVMLError):
+    _value = NVML_ERROR_NOT_SUPPORTED
+
+class NVMLError_NoPermission(NVMLError):
+    _value = NVML_ERROR_NO_PERMISSION
+
+class NVMLError_AlreadyInitialized(NVMLError):
+    _value = NVML_ERROR_ALREADY_INITIALIZED
+
+class NVMLError_NotFound(NVMLError):
+    _value = NVML_ERROR_NOT_FOUND
+
+class NVMLError_InsufficientSize(NVMLError):
+    _value = NVML_ERROR_INSUFFICIENT_SIZE
+
+class NVMLError_InsufficientPower(NVMLError):
+    _value = NVML_ERROR_INSUFFICIENT_POWER
+
+class NVMLError_DriverNotLoaded(NVMLError):
+    _value = NVML_ERROR_DRIVER_NOT_LOADED
+
+class NVMLError_Timeout(NVMLError):
+    _value = NVML_ERROR_TIMEOUT
+
+class NVMLError_IrqIssue(NVMLError):
+    _value = NVML_ERROR_IRQ_ISSUE
+
+class NVMLError_LibraryNotFound(NVMLError):
+    _value = NVML_ERROR_LIBRARY_NOT_FOUND
+
+class NVMLError_FunctionNotFound(NVMLError):
+    _value = NVML_ERROR_FUNCTION_NOT_FOUND
+
+class NVMLError_CorruptedInforom(NVMLError):
+    _value = NVML_ERROR_CORRUPTED_INFOROM
+
+class NVMLError_GpuIsLost(NVMLError):
+    _value = NVML_ERROR_GPU_IS_LOST
+
+class NVMLError_ResetRequired(NVMLError):
+    _value = NVML_ERROR_RESET_REQUIRED
+
+class NVMLError_OperatingSystem(NVMLError):
+    _value = NVML_ERROR_OPERATING_SYSTEM
+
+class NVMLError_LibRmVersionMismatch(NVMLError):
+    _value = NVML_ERROR_LIB_RM_VERSION_MISMATCH
+
+class NVMLError_Unknown(NVMLError):
+    _value = NVML_ERROR_UNKNOWN
+
+for _cls in NVMLError.__subclasses__():
+    NVMLError._valClassMapping[_cls._value] = _cls
+del _cls
 
 
 def _nvmlCheckReturn(ret):
@@ -318,11 +360,69 @@ def _nvmlCheckReturn(ret):
     return ret
 
 
+# Fast path for expected errors #
+# The device query functions take an optional default argument. If it is given
+# and the query isn't supported by the device, default is returned instead of
+# raising NVMLError_NotSupported. Building, raising and catching an exception
+# costs more than most NVML calls, and on some boards most queries aren't
+# supported. Other errors are still raised.
+_nvmlNoDefault = object()
+def _nvmlDefaultOrRaise(ret, default, handle=None, key=None):
+    if (ret == NVML_ERROR_NOT_SUPPORTED):
+        if (key is not None):
+            _nvmlSetSupported(handle, key, False)
+        if (default is not _nvmlNoDefault):
+            return default
+    raise NVMLError(ret)
+
+
+# Capability cache #
+# Maps each device to a dict of the queries it was found to support (True) or
+# not (False). The keys are the names of the wrapper functions, or a tuple of
+# the name and the arguments the support depends on, e.g.
+# ("nvmlDeviceGetClockInfo", NVML_CLOCK_SM). Queries that returned
+# NVML_ERROR_NOT_SUPPORTED once are answered straight away after that, without
+# calling the driver. nvmlDeviceProbeCapabilities fills in the rest. The cache
+# is dropped when the library is shut down.
+_nvmlCapabilityCache = dict()
+
+# Queries that return NVML_ERROR_NOT_SUPPORTED while a mode of the device is
+# off, rather than because the board can't do them. Their answers can change
+# at any time, so they are never cached.
+_nvmlModeDependentQueries = frozenset([
+    "nvmlDeviceGetAccountingMode",
+    "nvmlDeviceGetAccountingBufferSize",
+    "nvmlDeviceGetAccountingPids",
+    "nvmlDeviceGetAccountingStats",
+])
+
+def _nvmlDeviceKey(handle):
+    # Every handle of a device points at the same address
+    try:
+        return addressof(handle.contents)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _nvmlIsUnsupported(handle, key):
+    caps = _nvmlCapabilityCache.get(_nvmlDeviceKey(handle))
+    return caps is not None and caps.get(key) is False
+
+def _nvmlSetSupported(handle, key, supported):
+    name = key[0] if isinstance(key, tuple) else key
+    if (name in _nvmlModeDependentQueries):
+        return
+    device = _nvmlDeviceKey(handle)
+    if (device is not None):
+        _nvmlCapabilityCache.setdefault(device, dict())[key] = supported
+
+
 # Function access #
 _nvmlGetFunctionPointer_cache = dict() # function pointers are cached to prevent unnecessary libLoadLock locking
 def _nvmlGetFunctionPointer(name):
     global nvmlLib
 
+    if _nvmlReinitAfterFork:
+        _nvmlReinit()
     if name in _nvmlGetFunctionPointer_cache:
         return _nvmlGetFunctionPointer_cache[name]
 
@@ -341,6 +441,35 @@ def _nvmlGetFunctionPointer(name):
         libLoadLock.release()
 
 
+# Fork handling #
+def _nvmlAfterFork():
+    # A forked child inherits the state of the bindings but not the threads of
+    # its parent, so the lock may be held and the driver state is the
+    # parent's. Start afresh, and initialize on first use if the parent had.
+    global libLoadLock, nvmlLib, _nvmlLib_refcount, _nvmlReinitAfterFork
+    libLoadLock = threading.Lock()
+    _nvmlGetFunctionPointer_cache.clear()
+    _nvmlCapabilityCache.clear()
+    _nvmlReinitAfterFork = _nvmlLib_refcount > 0
+    _nvmlLib_refcount = 0
+    if isinstance(nvmlLib, CDLL):
+        # Loaded again by nvmlInit. A stand-in library (see py3nvml.simulated)
+        # is kept, as there is nothing to load it from.
+        nvmlLib = None
+
+def _nvmlReinit():
+    global _nvmlReinitAfterFork
+    libLoadLock.acquire()
+    pending = _nvmlReinitAfterFork
+    _nvmlReinitAfterFork = False
+    libLoadLock.release()
+    if pending:
+        nvmlInit()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_nvmlAfterFork)
+
+
 # # Alternative object
 # Allows the object to be printed
 # Allows mismatched types to be assigned
@@ -363,6 +492,48 @@ def nvmlStructToFriendlyObject(struct):
     return obj
 
 
+# View a ctypes array of structures or scalars as a numpy array, without
+# copying. Structures become structured arrays with a field per member (unions
+# overlap), and handles become their addresses as uintp. Only the first count
+# elements are viewed if count is given. numpy is only imported when needed.
+def nvmlStructArrayToNumpy(array, count=None):
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('numpy is needed to return arrays')
+    if issubclass(array._type_, _Pointer):
+        dtype = np.dtype(np.uintp)
+    else:
+        dtype = np.dtype(array._type_)
+    if count is None:
+        count = len(array)
+    return np.frombuffer(array, dtype=dtype, count=count)
+
+
+# Split a ctypes array of c_nvmlSample_t, or a numpy view of one, into numpy
+# arrays of its timestamps and of its values, without copying. The value union
+# is read all at once as the type valueType (an _nvmlValueType_t) says it
+# holds, so no value loses precision.
+def nvmlSamplesToNumpy(valueType, samples, count=None):
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('numpy is needed to return arrays')
+    if not 0 <= valueType < len(_nvmlValueTypeCtypes):
+        raise ValueError('Unknown sample value type {}'.format(valueType))
+    dtype = np.dtype({
+        'names': ['timeStamp', 'value'],
+        'formats': [np.dtype(c_ulonglong),
+                    np.dtype(_nvmlValueTypeCtypes[valueType])],
+        'offsets': [c_nvmlSample_t.timeStamp.offset,
+                    c_nvmlSample_t.sampleValue.offset],
+        'itemsize': sizeof(c_nvmlSample_t)})
+    if count is None:
+        count = len(samples)
+    array = np.frombuffer(samples, dtype=dtype, count=count)
+    return (array['timeStamp'], array['value'])
+
+
 # pack the object so it can be passed to the NVML library
 def nvmlFriendlyObjectToStruct(obj, model):
     for x in model._fields_:
@@ -580,6 +751,10 @@ class c_nvmlSample_t(_PrintableStructure):
     ]
 
 
+# The C type of the c_nvmlValue_t member each _nvmlValueType_t selects
+_nvmlValueTypeCtypes = [c_double, c_uint, c_ulong, c_ulonglong]
+
+
 class c_nvmlViolationTime_t(_PrintableStructure):
     _fields_ = [
         ('referenceTime', c_ulonglong),
@@ -646,6 +821,9 @@ class c_nvmlAccountingStats_t(_PrintableStructure):
 
 ## C function wrappers ##
 def nvmlInit():
+    # An explicit init in a forked child replaces the one made on first use
+    global _nvmlReinitAfterFork
+    _nvmlReinitAfterFork = False
     _LoadNvmlLibrary()
 
     #
@@ -704,6 +882,9 @@ def nvmlShutdown():
     libLoadLock.acquire()
     if (0 < _nvmlLib_refcount):
         _nvmlLib_refcount -= 1
+    if (_nvmlLib_refcount == 0):
+        # handles may point elsewhere after the next init
+        _nvmlCapabilityCache.clear()
     libLoadLock.release()
     return None
 
@@ -738,7 +919,7 @@ def nvmlSystemGetDriverVersion():
     return bytes_to_str(c_version.value)
 
 # Added in 2.285
-def nvmlSystemGetHicVersion():
+def nvmlSystemGetHicVersion(as_array=False):
     c_count = c_uint(0)
     hics = None
     fn = _nvmlGetFunctionPointer("nvmlSystemGetHicVersion")
@@ -753,12 +934,16 @@ def nvmlSystemGetHicVersion():
 
     # if there are no hics
     if (c_count.value == 0):
+        if as_array:
+            return nvmlStructArrayToNumpy((c_nvmlHwbcEntry_t * 0)())
         return []
 
     hic_array = c_nvmlHwbcEntry_t * c_count.value
     hics = hic_array()
     ret = fn(byref(c_count), hics)
     _nvmlCheckReturn(ret)
+    if as_array:
+        return nvmlStructArrayToNumpy(hics, c_count.value)
     return bytes_to_str(hics)
 
 
@@ -824,13 +1009,15 @@ def nvmlUnitGetDeviceCount(unit):
     _nvmlCheckReturn(ret)
     return bytes_to_str(c_count.value)
 
-def nvmlUnitGetDevices(unit):
+def nvmlUnitGetDevices(unit, as_array=False):
     c_count = c_uint(nvmlUnitGetDeviceCount(unit))
     device_array = c_nvmlDevice_t * c_count.value
     c_devices = device_array()
     fn = _nvmlGetFunctionPointer("nvmlUnitGetDevices")
     ret = fn(unit, byref(c_count), c_devices)
     _nvmlCheckReturn(ret)
+    if as_array:
+        return nvmlStructArrayToNumpy(c_devices, c_count.value)
     return bytes_to_str(c_devices)
 
 ## Device get functions
@@ -873,47 +1060,65 @@ def nvmlDeviceGetHandleByPciBusId(pciBusId):
     _nvmlCheckReturn(ret)
     return bytes_to_str(device)
 
-def nvmlDeviceGetName(handle):
+def nvmlDeviceGetName(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetName")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_name = create_string_buffer(NVML_DEVICE_NAME_BUFFER_SIZE)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetName")
     ret = fn(handle, c_name, c_uint(NVML_DEVICE_NAME_BUFFER_SIZE))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetName")
     return bytes_to_str(c_name.value)
 
-def nvmlDeviceGetBoardId(handle):
+def nvmlDeviceGetBoardId(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetBoardId")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_id = c_uint();
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetBoardId")
     ret = fn(handle, byref(c_id))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetBoardId")
     return bytes_to_str(c_id.value)
 
-def nvmlDeviceGetMultiGpuBoard(handle):
+def nvmlDeviceGetMultiGpuBoard(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetMultiGpuBoard")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_multiGpu = c_uint();
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMultiGpuBoard")
     ret = fn(handle, byref(c_multiGpu))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetMultiGpuBoard")
     return bytes_to_str(c_multiGpu.value)
 
-def nvmlDeviceGetBrand(handle):
+def nvmlDeviceGetBrand(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetBrand")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_type = _nvmlBrandType_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetBrand")
     ret = fn(handle, byref(c_type))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetBrand")
     return bytes_to_str(c_type.value)
 
-def nvmlDeviceGetSerial(handle):
+def nvmlDeviceGetSerial(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetSerial")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_serial = create_string_buffer(NVML_DEVICE_SERIAL_BUFFER_SIZE)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetSerial")
     ret = fn(handle, c_serial, c_uint(NVML_DEVICE_SERIAL_BUFFER_SIZE))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetSerial")
     return bytes_to_str(c_serial.value)
 
-def nvmlDeviceGetCpuAffinity(handle, cpuSetSize):
+def nvmlDeviceGetCpuAffinity(handle, cpuSetSize, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetCpuAffinity")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     affinity_array = c_ulonglong * cpuSetSize
     c_affinity = affinity_array()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetCpuAffinity")
     ret = fn(handle, cpuSetSize, byref(c_affinity))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetCpuAffinity")
     return bytes_to_str(c_affinity)
 
 def nvmlDeviceSetCpuAffinity(handle):
@@ -928,42 +1133,57 @@ def nvmlDeviceClearCpuAffinity(handle):
     _nvmlCheckReturn(ret)
     return None
 
-def nvmlDeviceGetMinorNumber(handle):
+def nvmlDeviceGetMinorNumber(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetMinorNumber")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_minor_number = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMinorNumber")
     ret = fn(handle, byref(c_minor_number))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetMinorNumber")
     return bytes_to_str(c_minor_number.value)
 
-def nvmlDeviceGetUUID(handle):
+def nvmlDeviceGetUUID(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetUUID")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_uuid = create_string_buffer(NVML_DEVICE_UUID_BUFFER_SIZE)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetUUID")
     ret = fn(handle, c_uuid, c_uint(NVML_DEVICE_UUID_BUFFER_SIZE))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetUUID")
     return bytes_to_str(c_uuid.value)
 
-def nvmlDeviceGetInforomVersion(handle, infoRomObject):
+def nvmlDeviceGetInforomVersion(handle, infoRomObject, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetInforomVersion", infoRomObject))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_version = create_string_buffer(NVML_DEVICE_INFOROM_VERSION_BUFFER_SIZE)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetInforomVersion")
     ret = fn(handle, _nvmlInforomObject_t(infoRomObject),
 	         c_version, c_uint(NVML_DEVICE_INFOROM_VERSION_BUFFER_SIZE))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetInforomVersion", infoRomObject))
     return bytes_to_str(c_version.value)
 
 # Added in 4.304
-def nvmlDeviceGetInforomImageVersion(handle):
+def nvmlDeviceGetInforomImageVersion(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetInforomImageVersion")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_version = create_string_buffer(NVML_DEVICE_INFOROM_VERSION_BUFFER_SIZE)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetInforomImageVersion")
     ret = fn(handle, c_version, c_uint(NVML_DEVICE_INFOROM_VERSION_BUFFER_SIZE))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetInforomImageVersion")
     return bytes_to_str(c_version.value)
 
 # Added in 4.304
-def nvmlDeviceGetInforomConfigurationChecksum(handle):
+def nvmlDeviceGetInforomConfigurationChecksum(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetInforomConfigurationChecksum")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_checksum = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetInforomConfigurationChecksum")
     ret = fn(handle, byref(c_checksum))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetInforomConfigurationChecksum")
     return bytes_to_str(c_checksum.value)
 
 # Added in 4.304
@@ -973,68 +1193,94 @@ def nvmlDeviceValidateInforom(handle):
     _nvmlCheckReturn(ret)
     return None
 
-def nvmlDeviceGetDisplayMode(handle):
+def nvmlDeviceGetDisplayMode(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetDisplayMode")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_mode = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetDisplayMode")
     ret = fn(handle, byref(c_mode))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetDisplayMode")
     return bytes_to_str(c_mode.value)
 
-def nvmlDeviceGetDisplayActive(handle):
+def nvmlDeviceGetDisplayActive(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetDisplayActive")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_mode = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetDisplayActive")
     ret = fn(handle, byref(c_mode))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetDisplayActive")
     return bytes_to_str(c_mode.value)
 
 
-def nvmlDeviceGetPersistenceMode(handle):
+def nvmlDeviceGetPersistenceMode(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPersistenceMode")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_state = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPersistenceMode")
     ret = fn(handle, byref(c_state))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPersistenceMode")
     return bytes_to_str(c_state.value)
 
-def nvmlDeviceGetPciInfo(handle):
+def nvmlDeviceGetPciInfo(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPciInfo")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_info = nvmlPciInfo_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPciInfo_v2")
     ret = fn(handle, byref(c_info))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPciInfo")
     return bytes_to_str(c_info)
 
-def nvmlDeviceGetClockInfo(handle, type):
+def nvmlDeviceGetClockInfo(handle, type, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetClockInfo", type))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_clock = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetClockInfo")
     ret = fn(handle, _nvmlClockType_t(type), byref(c_clock))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetClockInfo", type))
     return bytes_to_str(c_clock.value)
 
 # Added in 2.285
-def nvmlDeviceGetMaxClockInfo(handle, type):
+def nvmlDeviceGetMaxClockInfo(handle, type, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetMaxClockInfo", type))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_clock = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMaxClockInfo")
     ret = fn(handle, _nvmlClockType_t(type), byref(c_clock))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetMaxClockInfo", type))
     return bytes_to_str(c_clock.value)
 
 # Added in 4.304
-def nvmlDeviceGetApplicationsClock(handle, type):
+def nvmlDeviceGetApplicationsClock(handle, type, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetApplicationsClock", type))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_clock = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetApplicationsClock")
     ret = fn(handle, _nvmlClockType_t(type), byref(c_clock))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetApplicationsClock", type))
     return bytes_to_str(c_clock.value)
 
 # Added in 5.319
-def nvmlDeviceGetDefaultApplicationsClock(handle, type):
+def nvmlDeviceGetDefaultApplicationsClock(handle, type, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetDefaultApplicationsClock", type))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_clock = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetDefaultApplicationsClock")
     ret = fn(handle, _nvmlClockType_t(type), byref(c_clock))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetDefaultApplicationsClock", type))
     return bytes_to_str(c_clock.value)
 
 # Added in 4.304
-def nvmlDeviceGetSupportedMemoryClocks(handle):
+def nvmlDeviceGetSupportedMemoryClocks(handle, default=_nvmlNoDefault, as_array=False):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetSupportedMemoryClocks")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     # first call to get the size
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetSupportedMemoryClocks")
@@ -1042,6 +1288,8 @@ def nvmlDeviceGetSupportedMemoryClocks(handle):
 
     if (ret == NVML_SUCCESS):
         # special case, no clocks
+        if as_array:
+            return nvmlStructArrayToNumpy((c_uint * 0)())
         return []
     elif (ret == NVML_ERROR_INSUFFICIENT_SIZE):
         # typical case
@@ -1050,7 +1298,10 @@ def nvmlDeviceGetSupportedMemoryClocks(handle):
 
         # make the call again
         ret = fn(handle, byref(c_count), c_clocks)
-        _nvmlCheckReturn(ret)
+        if (ret != NVML_SUCCESS):
+            return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetSupportedMemoryClocks")
+        if as_array:
+            return nvmlStructArrayToNumpy(c_clocks, c_count.value)
 
         procs = []
         for i in range(c_count.value):
@@ -1059,10 +1310,12 @@ def nvmlDeviceGetSupportedMemoryClocks(handle):
         return procs
     else:
         # error case
-        raise NVMLError(ret)
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetSupportedMemoryClocks")
 
 # Added in 4.304
-def nvmlDeviceGetSupportedGraphicsClocks(handle, memoryClockMHz):
+def nvmlDeviceGetSupportedGraphicsClocks(handle, memoryClockMHz, default=_nvmlNoDefault, as_array=False):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetSupportedGraphicsClocks", memoryClockMHz))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     # first call to get the size
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetSupportedGraphicsClocks")
@@ -1070,6 +1323,8 @@ def nvmlDeviceGetSupportedGraphicsClocks(handle, memoryClockMHz):
 
     if (ret == NVML_SUCCESS):
         # special case, no clocks
+        if as_array:
+            return nvmlStructArrayToNumpy((c_uint * 0)())
         return []
     elif (ret == NVML_ERROR_INSUFFICIENT_SIZE):
         # typical case
@@ -1078,7 +1333,10 @@ def nvmlDeviceGetSupportedGraphicsClocks(handle, memoryClockMHz):
 
         # make the call again
         ret = fn(handle, c_uint(memoryClockMHz), byref(c_count), c_clocks)
-        _nvmlCheckReturn(ret)
+        if (ret != NVML_SUCCESS):
+            return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetSupportedGraphicsClocks", memoryClockMHz))
+        if as_array:
+            return nvmlStructArrayToNumpy(c_clocks, c_count.value)
 
         procs = []
         for i in range(c_count.value):
@@ -1087,164 +1345,256 @@ def nvmlDeviceGetSupportedGraphicsClocks(handle, memoryClockMHz):
         return procs
     else:
         # error case
-        raise NVMLError(ret)
-
-def nvmlDeviceGetFanSpeed(handle):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetSupportedGraphicsClocks", memoryClockMHz))
+
+# Not an NVML function: every supported (memory clock, graphics clocks) pair,
+# asking for the graphics clocks straight into one reused buffer
+def nvmlDeviceGetSupportedClocks(handle, default=_nvmlNoDefault):
+    memoryClocks = nvmlDeviceGetSupportedMemoryClocks(handle, default=None)
+    if (memoryClocks is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    fn = _nvmlGetFunctionPointer("nvmlDeviceGetSupportedGraphicsClocks")
+    c_count = c_uint(0)
+    c_clocks = (c_uint * 256)()
+    clocks = []
+    for mem in memoryClocks:
+        if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetSupportedGraphicsClocks", mem))):
+            return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+        c_count.value = len(c_clocks)
+        ret = fn(handle, c_uint(mem), byref(c_count), c_clocks)
+        if (ret == NVML_ERROR_INSUFFICIENT_SIZE):
+            c_clocks = (c_uint * (c_count.value * 2))()
+            c_count.value = len(c_clocks)
+            ret = fn(handle, c_uint(mem), byref(c_count), c_clocks)
+        if (ret != NVML_SUCCESS):
+            return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetSupportedGraphicsClocks", mem))
+        clocks.append((mem, c_clocks[:c_count.value]))
+    return clocks
+
+def nvmlDeviceGetFanSpeed(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetFanSpeed")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_speed = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetFanSpeed")
     ret = fn(handle, byref(c_speed))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetFanSpeed")
     return bytes_to_str(c_speed.value)
 
-def nvmlDeviceGetTemperature(handle, sensor):
+def nvmlDeviceGetTemperature(handle, sensor, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetTemperature", sensor))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_temp = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetTemperature")
     ret = fn(handle, _nvmlTemperatureSensors_t(sensor), byref(c_temp))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetTemperature", sensor))
     return bytes_to_str(c_temp.value)
 
-def nvmlDeviceGetTemperatureThreshold(handle, threshold):
+def nvmlDeviceGetTemperatureThreshold(handle, threshold, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetTemperatureThreshold", threshold))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_temp = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetTemperatureThreshold")
     ret = fn(handle, _nvmlTemperatureThresholds_t(threshold), byref(c_temp))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetTemperatureThreshold", threshold))
     return bytes_to_str(c_temp.value)
 
 # DEPRECATED use nvmlDeviceGetPerformanceState
-def nvmlDeviceGetPowerState(handle):
+def nvmlDeviceGetPowerState(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPowerState")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_pstate = _nvmlPstates_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPowerState")
     ret = fn(handle, byref(c_pstate))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPowerState")
     return bytes_to_str(c_pstate.value)
 
-def nvmlDeviceGetPerformanceState(handle):
+def nvmlDeviceGetPerformanceState(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPerformanceState")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_pstate = _nvmlPstates_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPerformanceState")
     ret = fn(handle, byref(c_pstate))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPerformanceState")
     return bytes_to_str(c_pstate.value)
 
-def nvmlDeviceGetPowerManagementMode(handle):
+def nvmlDeviceGetPowerManagementMode(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPowerManagementMode")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_pcapMode = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPowerManagementMode")
     ret = fn(handle, byref(c_pcapMode))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPowerManagementMode")
     return bytes_to_str(c_pcapMode.value)
 
-def nvmlDeviceGetPowerManagementLimit(handle):
+def nvmlDeviceGetPowerManagementLimit(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPowerManagementLimit")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_limit = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPowerManagementLimit")
     ret = fn(handle, byref(c_limit))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPowerManagementLimit")
     return bytes_to_str(c_limit.value)
 
 # Added in 4.304
-def nvmlDeviceGetPowerManagementLimitConstraints(handle):
+def nvmlDeviceGetPowerManagementLimitConstraints(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPowerManagementLimitConstraints")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_minLimit = c_uint()
     c_maxLimit = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPowerManagementLimitConstraints")
     ret = fn(handle, byref(c_minLimit), byref(c_maxLimit))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPowerManagementLimitConstraints")
     return [c_minLimit.value, c_maxLimit.value]
 
 # Added in 4.304
-def nvmlDeviceGetPowerManagementDefaultLimit(handle):
+def nvmlDeviceGetPowerManagementDefaultLimit(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPowerManagementDefaultLimit")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_limit = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPowerManagementDefaultLimit")
     ret = fn(handle, byref(c_limit))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPowerManagementDefaultLimit")
     return bytes_to_str(c_limit.value)
 
 
 # Added in 331
-def nvmlDeviceGetEnforcedPowerLimit(handle):
+def nvmlDeviceGetEnforcedPowerLimit(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetEnforcedPowerLimit")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_limit = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetEnforcedPowerLimit")
     ret = fn(handle, byref(c_limit))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetEnforcedPowerLimit")
     return bytes_to_str(c_limit.value)
 
-def nvmlDeviceGetPowerUsage(handle):
+def nvmlDeviceGetPowerUsage(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPowerUsage")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_watts = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPowerUsage")
     ret = fn(handle, byref(c_watts))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPowerUsage")
     return bytes_to_str(c_watts.value)
 
 # Added in 4.304
-def nvmlDeviceGetGpuOperationMode(handle):
+def nvmlDeviceGetGpuOperationMode(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetGpuOperationMode")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_currState = _nvmlGpuOperationMode_t()
     c_pendingState = _nvmlGpuOperationMode_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetGpuOperationMode")
     ret = fn(handle, byref(c_currState), byref(c_pendingState))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetGpuOperationMode")
     return [c_currState.value, c_pendingState.value]
 
 # Added in 4.304
-def nvmlDeviceGetCurrentGpuOperationMode(handle):
-    return nvmlDeviceGetGpuOperationMode(handle)[0]
+def nvmlDeviceGetCurrentGpuOperationMode(handle, default=_nvmlNoDefault):
+    modes = nvmlDeviceGetGpuOperationMode(handle, default=None)
+    if (modes is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    return modes[0]
 
 # Added in 4.304
-def nvmlDeviceGetPendingGpuOperationMode(handle):
-    return nvmlDeviceGetGpuOperationMode(handle)[1]
-
-def nvmlDeviceGetMemoryInfo(handle):
+def nvmlDeviceGetPendingGpuOperationMode(handle, default=_nvmlNoDefault):
+    modes = nvmlDeviceGetGpuOperationMode(handle, default=None)
+    if (modes is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    return modes[1]
+
+def nvmlDeviceGetMemoryInfo(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetMemoryInfo")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_memory = c_nvmlMemory_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMemoryInfo")
     ret = fn(handle, byref(c_memory))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetMemoryInfo")
     return bytes_to_str(c_memory)
 
-def nvmlDeviceGetBAR1MemoryInfo(handle):
+def nvmlDeviceGetBAR1MemoryInfo(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetBAR1MemoryInfo")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_bar1_memory = c_nvmlBAR1Memory_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetBAR1MemoryInfo")
     ret = fn(handle, byref(c_bar1_memory))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetBAR1MemoryInfo")
     return bytes_to_str(c_bar1_memory)
 
-def nvmlDeviceGetComputeMode(handle):
+def nvmlDeviceGetComputeMode(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetComputeMode")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_mode = _nvmlComputeMode_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetComputeMode")
     ret = fn(handle, byref(c_mode))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetComputeMode")
     return bytes_to_str(c_mode.value)
 
-def nvmlDeviceGetEccMode(handle):
+def nvmlDeviceGetEccMode(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetEccMode")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_currState = _nvmlEnableState_t()
     c_pendingState = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetEccMode")
     ret = fn(handle, byref(c_currState), byref(c_pendingState))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetEccMode")
     return [c_currState.value, c_pendingState.value]
 
 # added to API
-def nvmlDeviceGetCurrentEccMode(handle):
-    return nvmlDeviceGetEccMode(handle)[0]
+def nvmlDeviceGetCurrentEccMode(handle, default=_nvmlNoDefault):
+    modes = nvmlDeviceGetEccMode(handle, default=None)
+    if (modes is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    return modes[0]
 
 # added to API
-def nvmlDeviceGetPendingEccMode(handle):
-    return nvmlDeviceGetEccMode(handle)[1]
-
-def nvmlDeviceGetTotalEccErrors(handle, errorType, counterType):
+def nvmlDeviceGetPendingEccMode(handle, default=_nvmlNoDefault):
+    modes = nvmlDeviceGetEccMode(handle, default=None)
+    if (modes is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    return modes[1]
+
+def nvmlDeviceGetTotalEccErrors(handle, errorType, counterType, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetTotalEccErrors", errorType, counterType))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_count = c_ulonglong()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetTotalEccErrors")
     ret = fn(handle, _nvmlMemoryErrorType_t(errorType),
 	         _nvmlEccCounterType_t(counterType), byref(c_count))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetTotalEccErrors", errorType, counterType))
     return bytes_to_str(c_count.value)
 
 # This is deprecated, instead use nvmlDeviceGetMemoryErrorCounter
-def nvmlDeviceGetDetailedEccErrors(handle, errorType, counterType):
+def nvmlDeviceGetDetailedEccErrors(handle, errorType, counterType, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetDetailedEccErrors", errorType, counterType))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_counts = c_nvmlEccErrorCounts_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetDetailedEccErrors")
     ret = fn(handle, _nvmlMemoryErrorType_t(errorType),
 	         _nvmlEccCounterType_t(counterType), byref(c_counts))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetDetailedEccErrors", errorType, counterType))
     return bytes_to_str(c_counts)
 
 # Added in 4.304
-def nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType, locationType):
+def nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType, locationType, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, ("nvmlDeviceGetMemoryErrorCounter", errorType, counterType, locationType))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_count = c_ulonglong()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMemoryErrorCounter")
     ret = fn(handle,
@@ -1252,65 +1602,92 @@ def nvmlDeviceGetMemoryErrorCounter(handle, errorType, counterType, locationType
              _nvmlEccCounterType_t(counterType),
              _nvmlMemoryLocation_t(locationType),
              byref(c_count))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, ("nvmlDeviceGetMemoryErrorCounter", errorType, counterType, locationType))
     return bytes_to_str(c_count.value)
 
-def nvmlDeviceGetUtilizationRates(handle):
+def nvmlDeviceGetUtilizationRates(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetUtilizationRates")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_util = c_nvmlUtilization_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetUtilizationRates")
     ret = fn(handle, byref(c_util))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetUtilizationRates")
     return bytes_to_str(c_util)
 
-def nvmlDeviceGetEncoderUtilization(handle):
+def nvmlDeviceGetEncoderUtilization(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetEncoderUtilization")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_util = c_uint()
     c_samplingPeriod = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetEncoderUtilization")
     ret = fn(handle, byref(c_util), byref(c_samplingPeriod))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetEncoderUtilization")
     return [c_util.value, c_samplingPeriod.value]
 
-def nvmlDeviceGetDecoderUtilization(handle):
+def nvmlDeviceGetDecoderUtilization(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetDecoderUtilization")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_util = c_uint()
     c_samplingPeriod = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetDecoderUtilization")
     ret = fn(handle, byref(c_util), byref(c_samplingPeriod))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetDecoderUtilization")
     return [c_util.value, c_samplingPeriod.value]
 
-def nvmlDeviceGetPcieReplayCounter(handle):
+def nvmlDeviceGetPcieReplayCounter(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetPcieReplayCounter")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_replay = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPcieReplayCounter")
     ret = fn(handle, byref(c_replay))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetPcieReplayCounter")
     return bytes_to_str(c_replay.value)
 
-def nvmlDeviceGetDriverModel(handle):
+def nvmlDeviceGetDriverModel(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetDriverModel")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_currModel = _nvmlDriverModel_t()
     c_pendingModel = _nvmlDriverModel_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetDriverModel")
     ret = fn(handle, byref(c_currModel), byref(c_pendingModel))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetDriverModel")
     return [c_currModel.value, c_pendingModel.value]
 
 # added to API
-def nvmlDeviceGetCurrentDriverModel(handle):
-    return nvmlDeviceGetDriverModel(handle)[0]
+def nvmlDeviceGetCurrentDriverModel(handle, default=_nvmlNoDefault):
+    modes = nvmlDeviceGetDriverModel(handle, default=None)
+    if (modes is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    return modes[0]
 
 # added to API
-def nvmlDeviceGetPendingDriverModel(handle):
-    return nvmlDeviceGetDriverModel(handle)[1]
+def nvmlDeviceGetPendingDriverModel(handle, default=_nvmlNoDefault):
+    modes = nvmlDeviceGetDriverModel(handle, default=None)
+    if (modes is None):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    return modes[1]
 
 # Added in 2.285
-def nvmlDeviceGetVbiosVersion(handle):
+def nvmlDeviceGetVbiosVersion(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetVbiosVersion")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_version = create_string_buffer(NVML_DEVICE_VBIOS_VERSION_BUFFER_SIZE)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetVbiosVersion")
     ret = fn(handle, c_version, c_uint(NVML_DEVICE_VBIOS_VERSION_BUFFER_SIZE))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetVbiosVersion")
     return bytes_to_str(c_version.value)
 
 # Added in 2.285
-def nvmlDeviceGetComputeRunningProcesses(handle):
+def nvmlDeviceGetComputeRunningProcesses(handle, default=_nvmlNoDefault, as_array=False):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetComputeRunningProcesses")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     # first call to get the size
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetComputeRunningProcesses")
@@ -1318,6 +1695,8 @@ def nvmlDeviceGetComputeRunningProcesses(handle):
 
     if (ret == NVML_SUCCESS):
         # special case, no running processes
+        if as_array:
+            return nvmlStructArrayToNumpy((c_nvmlProcessInfo_t * 0)())
         return []
     elif (ret == NVML_ERROR_INSUFFICIENT_SIZE):
         # typical case
@@ -1328,7 +1707,12 @@ def nvmlDeviceGetComputeRunningProcesses(handle):
 
         # make the call again
         ret = fn(handle, byref(c_count), c_procs)
-        _nvmlCheckReturn(ret)
+        if (ret != NVML_SUCCESS):
+            return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetComputeRunningProcesses")
+        if as_array:
+            # usedGpuMemory is left as NVML_VALUE_NOT_AVAILABLE_ulonglong
+            # where it isn't available
+            return nvmlStructArrayToNumpy(c_procs, c_count.value)
 
         procs = []
         for i in range(c_count.value):
@@ -1342,9 +1726,11 @@ def nvmlDeviceGetComputeRunningProcesses(handle):
         return procs
     else:
         # error case
-        raise NVMLError(ret)
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetComputeRunningProcesses")
 
-def nvmlDeviceGetGraphicsRunningProcesses(handle):
+def nvmlDeviceGetGraphicsRunningProcesses(handle, default=_nvmlNoDefault, as_array=False):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetGraphicsRunningProcesses")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     # first call to get the size
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetGraphicsRunningProcesses")
@@ -1352,6 +1738,8 @@ def nvmlDeviceGetGraphicsRunningProcesses(handle):
 
     if (ret == NVML_SUCCESS):
         # special case, no running processes
+        if as_array:
+            return nvmlStructArrayToNumpy((c_nvmlProcessInfo_t * 0)())
         return []
     elif (ret == NVML_ERROR_INSUFFICIENT_SIZE):
         # typical case
@@ -1362,7 +1750,12 @@ def nvmlDeviceGetGraphicsRunningProcesses(handle):
 
         # make the call again
         ret = fn(handle, byref(c_count), c_procs)
-        _nvmlCheckReturn(ret)
+        if (ret != NVML_SUCCESS):
+            return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetGraphicsRunningProcesses")
+        if as_array:
+            # usedGpuMemory is left as NVML_VALUE_NOT_AVAILABLE_ulonglong
+            # where it isn't available
+            return nvmlStructArrayToNumpy(c_procs, c_count.value)
 
         procs = []
         for i in range(c_count.value):
@@ -1376,14 +1769,17 @@ def nvmlDeviceGetGraphicsRunningProcesses(handle):
         return procs
     else:
         # error case
-        raise NVMLError(ret)
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetGraphicsRunningProcesses")
 
-def nvmlDeviceGetAutoBoostedClocksEnabled(handle):
+def nvmlDeviceGetAutoBoostedClocksEnabled(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetAutoBoostedClocksEnabled")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_isEnabled = _nvmlEnableState_t()
     c_defaultIsEnabled = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetAutoBoostedClocksEnabled")
     ret = fn(handle, byref(c_isEnabled), byref(c_defaultIsEnabled))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetAutoBoostedClocksEnabled")
     return [c_isEnabled.value, c_defaultIsEnabled.value]
     #Throws NVML_ERROR_NOT_SUPPORTED if hardware doesn't support setting auto boosted clocks
 
@@ -1482,11 +1878,14 @@ def nvmlDeviceRegisterEvents(handle, eventTypes, eventSet):
     return None
 
 # Added in 2.285
-def nvmlDeviceGetSupportedEventTypes(handle):
+def nvmlDeviceGetSupportedEventTypes(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetSupportedEventTypes")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_eventTypes = c_ulonglong()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetSupportedEventTypes")
     ret = fn(handle, byref(c_eventTypes))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetSupportedEventTypes")
     return bytes_to_str(c_eventTypes.value)
 
 # Added in 2.285
@@ -1514,68 +1913,92 @@ def nvmlDeviceOnSameBoard(handle1, handle2):
     return (onSameBoard.value != 0)
 
 # Added in 3.295
-def nvmlDeviceGetCurrPcieLinkGeneration(handle):
+def nvmlDeviceGetCurrPcieLinkGeneration(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetCurrPcieLinkGeneration")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetCurrPcieLinkGeneration")
     gen = c_uint()
     ret = fn(handle, byref(gen))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetCurrPcieLinkGeneration")
     return bytes_to_str(gen.value)
 
 # Added in 3.295
-def nvmlDeviceGetMaxPcieLinkGeneration(handle):
+def nvmlDeviceGetMaxPcieLinkGeneration(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetMaxPcieLinkGeneration")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMaxPcieLinkGeneration")
     gen = c_uint()
     ret = fn(handle, byref(gen))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetMaxPcieLinkGeneration")
     return bytes_to_str(gen.value)
 
 # Added in 3.295
-def nvmlDeviceGetCurrPcieLinkWidth(handle):
+def nvmlDeviceGetCurrPcieLinkWidth(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetCurrPcieLinkWidth")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetCurrPcieLinkWidth")
     width = c_uint()
     ret = fn(handle, byref(width))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetCurrPcieLinkWidth")
     return bytes_to_str(width.value)
 
 # Added in 3.295
-def nvmlDeviceGetMaxPcieLinkWidth(handle):
+def nvmlDeviceGetMaxPcieLinkWidth(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetMaxPcieLinkWidth")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetMaxPcieLinkWidth")
     width = c_uint()
     ret = fn(handle, byref(width))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetMaxPcieLinkWidth")
     return bytes_to_str(width.value)
 
 # Added in 4.304
-def nvmlDeviceGetSupportedClocksThrottleReasons(handle):
+def nvmlDeviceGetSupportedClocksThrottleReasons(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetSupportedClocksThrottleReasons")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_reasons= c_ulonglong()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetSupportedClocksThrottleReasons")
     ret = fn(handle, byref(c_reasons))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetSupportedClocksThrottleReasons")
     return bytes_to_str(c_reasons.value)
 
 # Added in 4.304
-def nvmlDeviceGetCurrentClocksThrottleReasons(handle):
+def nvmlDeviceGetCurrentClocksThrottleReasons(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetCurrentClocksThrottleReasons")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_reasons= c_ulonglong()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetCurrentClocksThrottleReasons")
     ret = fn(handle, byref(c_reasons))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetCurrentClocksThrottleReasons")
     return bytes_to_str(c_reasons.value)
 
 # Added in 5.319
-def nvmlDeviceGetIndex(handle):
+def nvmlDeviceGetIndex(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetIndex")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetIndex")
     c_index = c_uint()
     ret = fn(handle, byref(c_index))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetIndex")
     return bytes_to_str(c_index.value)
 
 
 # Added in 5.319
-def nvmlDeviceGetAccountingMode(handle):
+# The accounting queries are NOT_SUPPORTED while accounting mode is off, so
+# they don't go through the capability cache.
+def nvmlDeviceGetAccountingMode(handle, default=_nvmlNoDefault):
     c_mode = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetAccountingMode")
     ret = fn(handle, byref(c_mode))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default)
     return bytes_to_str(c_mode.value)
 
 
@@ -1593,35 +2016,48 @@ def nvmlDeviceClearAccountingPids(handle):
     return None
 
 
-def nvmlDeviceGetAccountingStats(handle, pid):
+def nvmlDeviceGetAccountingStats(handle, pid, default=_nvmlNoDefault):
     stats = c_nvmlAccountingStats_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetAccountingStats")
     ret = fn(handle, c_uint(pid), byref(stats))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default)
     if (stats.maxMemoryUsage == NVML_VALUE_NOT_AVAILABLE_ulonglong.value):
         # special case for WDDM on Windows, see comment above
         stats.maxMemoryUsage = None
     return bytes_to_str(stats)
 
 
-def nvmlDeviceGetAccountingPids(handle):
-    count = c_uint(nvmlDeviceGetAccountingBufferSize(handle))
+# bufferSize can be given to save a call to nvmlDeviceGetAccountingBufferSize.
+# Raises NVML_ERROR_INSUFFICIENT_SIZE if it is too small.
+def nvmlDeviceGetAccountingPids(handle, bufferSize=None, default=_nvmlNoDefault, as_array=False):
+    if bufferSize is None:
+        bufferSize = nvmlDeviceGetAccountingBufferSize(handle, default=None)
+        if (bufferSize is None):
+            return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    count = c_uint(bufferSize)
     pids = (c_uint * count.value)()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetAccountingPids")
     ret = fn(handle, byref(count), pids)
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default)
+    if as_array:
+        return nvmlStructArrayToNumpy(pids, count.value)
     return list(map(int, pids[0:count.value]))
 
 
-def nvmlDeviceGetAccountingBufferSize(handle):
+def nvmlDeviceGetAccountingBufferSize(handle, default=_nvmlNoDefault):
     bufferSize = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetAccountingBufferSize")
     ret = fn(handle, byref(bufferSize))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default)
     return int(bufferSize.value)
 
 
-def nvmlDeviceGetRetiredPages(device, sourceFilter):
+def nvmlDeviceGetRetiredPages(device, sourceFilter, default=_nvmlNoDefault, as_array=False):
+    if (_nvmlIsUnsupported(device, ("nvmlDeviceGetRetiredPages", sourceFilter))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_source = _nvmlPageRetirementCause_t(sourceFilter)
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetRetiredPages")
@@ -1632,7 +2068,7 @@ def nvmlDeviceGetRetiredPages(device, sourceFilter):
     # this should only fail with insufficient size
     if ((ret != NVML_SUCCESS) and
         (ret != NVML_ERROR_INSUFFICIENT_SIZE)):
-        raise NVMLError(ret)
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetRetiredPages", sourceFilter))
 
     # call again with a buffer
     # oversize the array for the rare cases where additional pages
@@ -1641,23 +2077,46 @@ def nvmlDeviceGetRetiredPages(device, sourceFilter):
     page_array = c_ulonglong * c_count.value
     c_pages = page_array()
     ret = fn(device, c_source, byref(c_count), c_pages)
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetRetiredPages", sourceFilter))
+    if as_array:
+        return nvmlStructArrayToNumpy(c_pages, c_count.value)
     return list(map(int, c_pages[0:c_count.value]))
 
 
-def nvmlDeviceGetRetiredPagesPendingStatus(device):
+# Not an NVML function: how many pages were retired for a cause, without
+# reading their addresses
+def nvmlDeviceGetRetiredPageCount(device, sourceFilter, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(device, ("nvmlDeviceGetRetiredPages", sourceFilter))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
+    c_count = c_uint(0)
+    fn = _nvmlGetFunctionPointer("nvmlDeviceGetRetiredPages")
+    ret = fn(device, _nvmlPageRetirementCause_t(sourceFilter), byref(c_count), None)
+    if ((ret != NVML_SUCCESS) and
+        (ret != NVML_ERROR_INSUFFICIENT_SIZE)):
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetRetiredPages", sourceFilter))
+    return int(c_count.value)
+
+
+def nvmlDeviceGetRetiredPagesPendingStatus(device, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(device, "nvmlDeviceGetRetiredPagesPendingStatus")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_pending = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetRetiredPagesPendingStatus")
     ret = fn(device, byref(c_pending))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, device, "nvmlDeviceGetRetiredPagesPendingStatus")
     return int(c_pending.value)
 
 
-def nvmlDeviceGetAPIRestriction(device, apiType):
+def nvmlDeviceGetAPIRestriction(device, apiType, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(device, ("nvmlDeviceGetAPIRestriction", apiType))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_permission = _nvmlEnableState_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetAPIRestriction")
     ret = fn(device, _nvmlRestrictedAPI_t(apiType), byref(c_permission))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetAPIRestriction", apiType))
     return int(c_permission.value)
 
 
@@ -1668,15 +2127,23 @@ def nvmlDeviceSetAPIRestriction(handle, apiType, isRestricted):
     return None
 
 
-def nvmlDeviceGetBridgeChipInfo(handle):
+def nvmlDeviceGetBridgeChipInfo(handle, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(handle, "nvmlDeviceGetBridgeChipInfo")):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     bridgeHierarchy = c_nvmlBridgeChipHierarchy_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetBridgeChipInfo")
     ret = fn(handle, byref(bridgeHierarchy))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, handle, "nvmlDeviceGetBridgeChipInfo")
     return bytes_to_str(bridgeHierarchy)
 
 
-def nvmlDeviceGetSamples(device, sampling_type, timeStamp):
+# Returns (valueType, samples). With decode=True, returns numpy arrays
+# (timeStamps, values) instead, the values of the type valueType says.
+def nvmlDeviceGetSamples(device, sampling_type, timeStamp, default=_nvmlNoDefault, as_array=False,
+                         decode=False):
+    if (_nvmlIsUnsupported(device, ("nvmlDeviceGetSamples", sampling_type))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_sampling_type = _nvmlSamplingType_t(sampling_type)
     c_time_stamp = c_ulonglong(timeStamp)
     c_sample_count = c_uint(0)
@@ -1688,35 +2155,47 @@ def nvmlDeviceGetSamples(device, sampling_type, timeStamp):
 
     # Stop if this fails
     if (ret != NVML_SUCCESS):
-        raise NVMLError(ret)
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetSamples", sampling_type))
 
     sampleArray = c_sample_count.value * c_nvmlSample_t
     c_samples = sampleArray()
     ret = fn(device, c_sampling_type, c_time_stamp,  byref(c_sample_value_type), byref(c_sample_count), c_samples)
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetSamples", sampling_type))
+    if decode:
+        return nvmlSamplesToNumpy(c_sample_value_type.value, c_samples, c_sample_count.value)
+    if as_array:
+        return (c_sample_value_type.value,
+                nvmlStructArrayToNumpy(c_samples, c_sample_count.value))
     return (c_sample_value_type.value, c_samples[0:c_sample_count.value])
 
 
-def nvmlDeviceGetViolationStatus(device, perfPolicyType):
+def nvmlDeviceGetViolationStatus(device, perfPolicyType, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(device, ("nvmlDeviceGetViolationStatus", perfPolicyType))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_perfPolicy_type = _nvmlPerfPolicyType_t(perfPolicyType)
     c_violTime = c_nvmlViolationTime_t()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetViolationStatus")
 
     ## Invoke the method to get violation time
     ret = fn(device, c_perfPolicy_type, byref(c_violTime))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetViolationStatus", perfPolicyType))
     return bytes_to_str(c_violTime)
 
 
-def nvmlDeviceGetPcieThroughput(device, counter):
+def nvmlDeviceGetPcieThroughput(device, counter, default=_nvmlNoDefault):
+    if (_nvmlIsUnsupported(device, ("nvmlDeviceGetPcieThroughput", counter))):
+        return _nvmlDefaultOrRaise(NVML_ERROR_NOT_SUPPORTED, default)
     c_util = c_uint()
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetPcieThroughput")
     ret = fn(device, _nvmlPcieUtilCounter_t(counter), byref(c_util))
-    _nvmlCheckReturn(ret)
+    if (ret != NVML_SUCCESS):
+        return _nvmlDefaultOrRaise(ret, default, device, ("nvmlDeviceGetPcieThroughput", counter))
     return bytes_to_str(c_util.value)
 
 
-def nvmlSystemGetTopologyGpuSet(cpuNumber):
+def nvmlSystemGetTopologyGpuSet(cpuNumber, as_array=False):
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlSystemGetTopologyGpuSet")
 
@@ -1725,16 +2204,17 @@ def nvmlSystemGetTopologyGpuSet(cpuNumber):
 
     if ret != NVML_SUCCESS:
         raise NVMLError(ret)
-    print(c_count.value)
     # call again with a buffer
     device_array = c_nvmlDevice_t * c_count.value
     c_devices = device_array()
     ret = fn(cpuNumber, byref(c_count), c_devices)
     _nvmlCheckReturn(ret)
+    if as_array:
+        return nvmlStructArrayToNumpy(c_devices, c_count.value)
     return list(c_devices[0:c_count.value])
 
 
-def nvmlDeviceGetTopologyNearestGpus(device, level):
+def nvmlDeviceGetTopologyNearestGpus(device, level, as_array=False):
     c_count = c_uint(0)
     fn = _nvmlGetFunctionPointer("nvmlDeviceGetTopologyNearestGpus")
 
@@ -1749,6 +2229,8 @@ def nvmlDeviceGetTopologyNearestGpus(device, level):
     c_devices = device_array()
     ret = fn(device, level, byref(c_count), c_devices)
     _nvmlCheckReturn(ret)
+    if as_array:
+        return nvmlStructArrayToNumpy(c_devices, c_count.value)
     return list(c_devices[0:c_count.value])
 
 
@@ -1758,3 +2240,117 @@ def nvmlDeviceGetTopologyCommonAncestor(device1, device2):
     ret = fn(device1, device2, byref(c_level))
     _nvmlCheckReturn(ret)
     return bytes_to_str(c_level.value)
+
+
+## Capability cache ##
+# The queries made by nvmlDeviceProbeCapabilities, as (function, arguments)
+_nvmlCapabilityProbes = [
+    (nvmlDeviceGetBrand, ()),
+    (nvmlDeviceGetBoardId, ()),
+    (nvmlDeviceGetMultiGpuBoard, ()),
+    (nvmlDeviceGetSerial, ()),
+    (nvmlDeviceGetMinorNumber, ()),
+    (nvmlDeviceGetInforomImageVersion, ()),
+    (nvmlDeviceGetInforomConfigurationChecksum, ()),
+    (nvmlDeviceGetDisplayMode, ()),
+    (nvmlDeviceGetDisplayActive, ()),
+    (nvmlDeviceGetPersistenceMode, ()),
+    (nvmlDeviceGetSupportedMemoryClocks, ()),
+    (nvmlDeviceGetFanSpeed, ()),
+    (nvmlDeviceGetPowerState, ()),
+    (nvmlDeviceGetPerformanceState, ()),
+    (nvmlDeviceGetPowerManagementMode, ()),
+    (nvmlDeviceGetPowerManagementLimit, ()),
+    (nvmlDeviceGetPowerManagementLimitConstraints, ()),
+    (nvmlDeviceGetPowerManagementDefaultLimit, ()),
+    (nvmlDeviceGetEnforcedPowerLimit, ()),
+    (nvmlDeviceGetPowerUsage, ()),
+    (nvmlDeviceGetGpuOperationMode, ()),
+    (nvmlDeviceGetMemoryInfo, ()),
+    (nvmlDeviceGetBAR1MemoryInfo, ()),
+    (nvmlDeviceGetComputeMode, ()),
+    (nvmlDeviceGetEccMode, ()),
+    (nvmlDeviceGetUtilizationRates, ()),
+    (nvmlDeviceGetEncoderUtilization, ()),
+    (nvmlDeviceGetDecoderUtilization, ()),
+    (nvmlDeviceGetPcieReplayCounter, ()),
+    (nvmlDeviceGetDriverModel, ()),
+    (nvmlDeviceGetVbiosVersion, ()),
+    (nvmlDeviceGetComputeRunningProcesses, ()),
+    (nvmlDeviceGetGraphicsRunningProcesses, ()),
+    (nvmlDeviceGetAutoBoostedClocksEnabled, ()),
+    (nvmlDeviceGetSupportedEventTypes, ()),
+    (nvmlDeviceGetCurrPcieLinkGeneration, ()),
+    (nvmlDeviceGetMaxPcieLinkGeneration, ()),
+    (nvmlDeviceGetCurrPcieLinkWidth, ()),
+    (nvmlDeviceGetMaxPcieLinkWidth, ()),
+    (nvmlDeviceGetSupportedClocksThrottleReasons, ()),
+    (nvmlDeviceGetCurrentClocksThrottleReasons, ()),
+    (nvmlDeviceGetRetiredPagesPendingStatus, ()),
+    (nvmlDeviceGetBridgeChipInfo, ()),
+    (nvmlDeviceGetTemperature, (NVML_TEMPERATURE_GPU,)),
+]
+for _i in range(NVML_INFOROM_COUNT):
+    _nvmlCapabilityProbes.append((nvmlDeviceGetInforomVersion, (_i,)))
+for _i in range(NVML_CLOCK_COUNT):
+    _nvmlCapabilityProbes.extend([
+        (nvmlDeviceGetClockInfo, (_i,)),
+        (nvmlDeviceGetMaxClockInfo, (_i,)),
+        (nvmlDeviceGetApplicationsClock, (_i,)),
+        (nvmlDeviceGetDefaultApplicationsClock, (_i,))])
+for _i in (NVML_TEMPERATURE_THRESHOLD_SHUTDOWN, NVML_TEMPERATURE_THRESHOLD_SLOWDOWN):
+    _nvmlCapabilityProbes.append((nvmlDeviceGetTemperatureThreshold, (_i,)))
+for _i in range(NVML_MEMORY_ERROR_TYPE_COUNT):
+    for _j in range(NVML_ECC_COUNTER_TYPE_COUNT):
+        _nvmlCapabilityProbes.append((nvmlDeviceGetTotalEccErrors, (_i, _j)))
+        for _k in range(NVML_MEMORY_LOCATION_COUNT):
+            _nvmlCapabilityProbes.append(
+                (nvmlDeviceGetMemoryErrorCounter, (_i, _j, _k)))
+for _i in range(NVML_PAGE_RETIREMENT_CAUSE_COUNT):
+    _nvmlCapabilityProbes.append((nvmlDeviceGetRetiredPages, (_i,)))
+for _i in range(NVML_RESTRICTED_API_COUNT):
+    _nvmlCapabilityProbes.append((nvmlDeviceGetAPIRestriction, (_i,)))
+for _i in range(NVML_PERF_POLICY_COUNT):
+    _nvmlCapabilityProbes.append((nvmlDeviceGetViolationStatus, (_i,)))
+for _i in range(NVML_PCIE_UTIL_COUNT):
+    _nvmlCapabilityProbes.append((nvmlDeviceGetPcieThroughput, (_i,)))
+del _i, _j, _k
+
+def nvmlDeviceProbeCapabilities(handle):
+    '''
+    Finds out which queries the device supports, by making each of them once.
+
+    Queries that are already known to be unsupported aren't made again. The
+    result is kept until the library is shut down.
+
+    Returns the same dict as nvmlDeviceGetCapabilities.
+    '''
+    for fn, args in _nvmlCapabilityProbes:
+        key = fn.__name__ if not args else (fn.__name__,) + args
+        try:
+            fn(handle, *args)
+        except NVMLError_NotSupported:
+            continue
+        except NVMLError:
+            # e.g. no permission. Tells us nothing about support
+            continue
+        _nvmlSetSupported(handle, key, True)
+    return nvmlDeviceGetCapabilities(handle)
+
+def nvmlDeviceGetCapabilities(handle):
+    '''
+    Returns what is known about the queries a device supports.
+
+    A dict mapping the name of the query function, or a tuple of the name and
+    the arguments the support depends on, to True if the device supports it or
+    False if not. Queries that haven't been made yet are missing.
+    '''
+    return dict(_nvmlCapabilityCache.get(_nvmlDeviceKey(handle), ()))
+
+def nvmlDeviceSetCapabilities(handle, capabilities):
+    '''
+    Adds to what is known about the queries a device supports, e.g. from a
+    dict returned by nvmlDeviceGetCapabilities in another process.
+    '''
+    for key, supported in capabilities.items():
+        _nvmlSetSupported(handle, key, supported)
@@ -0,0 +1,287 @@
+"""
+A compact binary recorder for gpu telemetry.
+
+:class:`Recorder` appends one fixed size record per gpu per snapshot to a
+memory-mapped segment file, and starts a new segment when the current one is
+full. A record is the time, the position of the gpu in the segment's list of
+UUIDs and the value of every recorded field as a 64 bit integer, 112 bytes
+with the default fields.
+
+Segments can be read back while they are being written.
+:meth:`Segment.array` maps a segment straight into a numpy structured array
+without parsing anything, and :meth:`Segment.records` reads it without numpy.
+
+E.g. to keep a day of per second metrics in 64MB segments
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.snapshot import Sampler
+    from py3nvml.recorder import Recorder, RECORD_FIELDS
+
+    nvmlInit()
+    sampler = Sampler(interval=1, fields=RECORD_FIELDS)
+    recorder = Recorder('/var/lib/gpu-metrics', max_segments=10)
+    sampler.add_callback(recorder.write)
+    sampler.start()
+
+and later
+
+.. code:: python
+
+    from py3nvml.recorder import load_segments
+
+    for seg in load_segments('/var/lib/gpu-metrics'):
+        a = seg.array()
+        power = seg.column(a, 'power.draw')
+        print(seg.uuids, a['timestamp'], power)
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+
+from py3nvml.snapshot import MISSING
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: The fields recorded by default
+RECORD_FIELDS = (
+    'memory.total', 'memory.used', 'memory.free', 'utilization.gpu',
+    'utilization.memory', 'power.draw', 'temperature.gpu', 'clocks.gr',
+    'clocks.sm', 'clocks.mem', 'pcie.tx', 'pcie.rx')
+
+MAGIC = b'PY3NVMLR'
+VERSION = 1
+# magic, version, header size, record size, number of records, metadata size
+_HEADER = struct.Struct('<8sIIIQI')
+_COUNT_OFFSET = 20
+_PAGE = 4096
+
+
+def _record_struct(nfields):
+    # timestamp, gpu, reserved, values
+    return struct.Struct('<dII{}q'.format(nfields))
+
+
+def record_dtype(nfields):
+    """ The numpy dtype of the records of a segment with nfields fields """
+    if np is None:
+        raise ImportError('numpy is needed to read segments as arrays')
+    return np.dtype([('timestamp', '<f8'), ('gpu', '<u4'),
+                     ('reserved', '<u4'), ('values', '<i8', (nfields,))])
+
+
+class Recorder(object):
+    """
+    Writes snapshots to segment files.
+
+    Segments are named '<prefix>-<number>.bin' in directory. Each recorder
+    starts a new segment, numbered after the existing ones. A segment also
+    ends when the set of gpus changes.
+
+    Parameters
+    ----------
+    directory : str
+        Where to put the segments. Made if it doesn't exist.
+    fields : sequence of str
+        The snapshot fields to record. Fields a snapshot doesn't have are
+        recorded as missing.
+    segment_size : int
+        Maximum size of a segment file, in bytes.
+    max_segments : int
+        How many segments to keep. The oldest are deleted when a new one is
+        started. If None, keeps them all.
+    prefix : str
+        Start of the segment file names.
+    """
+    def __init__(self, directory, fields=RECORD_FIELDS, segment_size=64 << 20,
+                 max_segments=None, prefix='gpu'):
+        self.directory = directory
+        self.fields = tuple(fields)
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.prefix = prefix
+        self._struct = _record_struct(len(self.fields))
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._uuids = None
+        self._capacity = 0
+        # snapshot fields -> positions of our fields in them
+        self._columns = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        existing = segment_paths(directory, prefix)
+        self._number = _segment_number(existing[-1]) + 1 if existing else 0
+
+    def _open(self, uuids):
+        path = os.path.join(self.directory, '{}-{:06d}.bin'.format(
+            self.prefix, self._number))
+        self._number += 1
+        meta = json.dumps({'fields': self.fields,
+                           'uuids': uuids}).encode('utf-8')
+        header_size = -(-(_HEADER.size + len(meta)) // _PAGE) * _PAGE
+        self._capacity = (self.segment_size - header_size) // \
+            self._struct.size
+        if self._capacity < len(uuids):
+            raise ValueError('segment_size is too small')
+        size = header_size + self._capacity * self._struct.size
+
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, header_size,
+                          self._struct.size, 0, len(meta))
+        self._map[_HEADER.size:_HEADER.size + len(meta)] = meta
+        self._header_size = header_size
+        self._count = 0
+        self._uuids = list(uuids)
+        self._prune()
+
+    def _prune(self):
+        if self.max_segments is None:
+            return
+        paths = segment_paths(self.directory, self.prefix)
+        for path in paths[:max(0, len(paths) - self.max_segments)]:
+            os.remove(path)
+
+    def _close(self):
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map.close()
+        # Give back the unused part of the segment
+        self._file.truncate(self._header_size +
+                            self._count * self._struct.size)
+        self._file.close()
+        self._map = self._file = self._uuids = None
+
+    def write(self, snapshot):
+        """
+        Appends a record for every gpu in a snapshot.
+
+        Can be used as a :class:`~py3nvml.snapshot.Sampler` callback.
+        """
+        uuids = list(snapshot.uuids)
+        n = len(snapshot.fields)
+        columns = self._columns.get(snapshot.fields)
+        if columns is None:
+            columns = self._columns[snapshot.fields] = [
+                snapshot.fields.index(f) if f in snapshot.fields else None
+                for f in self.fields]
+        values = snapshot.values
+
+        with self._lock:
+            if self._uuids != uuids or \
+                    self._count + len(uuids) > self._capacity:
+                self._close()
+                self._open(uuids)
+            pack_into = self._struct.pack_into
+            offset = self._header_size + self._count * self._struct.size
+            for g in range(len(uuids)):
+                row = g * n
+                pack_into(self._map, offset, snapshot.timestamp, g, 0,
+                          *[MISSING if c is None else values[row + c]
+                            for c in columns])
+                offset += self._struct.size
+            self._count += len(uuids)
+            # Only now are the records visible to readers
+            struct.pack_into('<Q', self._map, _COUNT_OFFSET, self._count)
+
+    def close(self):
+        """ Finishes the current segment """
+        with self._lock:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Segment(object):
+    """
+    A segment file written by a :class:`Recorder`.
+
+    Attributes
+    ----------
+    path : str
+    fields : tuple of str
+        The recorded fields, in the order of the values of each record.
+    uuids : list of str
+        The gpus. The gpu of each record is a position in this list.
+    count : int
+        How many records the segment held when it was opened.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                raise ValueError('{} is not a segment'.format(path))
+            (magic, version, self.header_size, self.record_size, self.count,
+             meta_size) = _HEADER.unpack(head)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{} is not a segment'.format(path))
+            meta = json.loads(f.read(meta_size).decode('utf-8'))
+        self.fields = tuple(meta['fields'])
+        self.uuids = meta['uuids']
+
+    def array(self):
+        """
+        Maps the records into a numpy structured array, with the fields
+        'timestamp', 'gpu' and 'values', which is a (records, fields) array of
+        int64. Missing values are :data:`~py3nvml.snapshot.MISSING`.
+        """
+        dtype = record_dtype(len(self.fields))
+        if self.count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode='r',
+                         offset=self.header_size, shape=(self.count,))
+
+    def column(self, array, field):
+        """ Returns the values of one field from :meth:`array` """
+        return array['values'][:, self.fields.index(field)]
+
+    def records(self):
+        """
+        Reads the records without numpy.
+
+        Yields
+        ------
+        (timestamp, uuid, values) : tuple
+            values is a tuple in the order of :attr:`fields`.
+        """
+        s = _record_struct(len(self.fields))
+        with open(self.path, 'rb') as f:
+            f.seek(self.header_size)
+            data = f.read(self.count * s.size)
+        for r in s.iter_unpack(data):
+            yield r[0], self.uuids[r[1]], r[3:]
+
+
+def _segment_number(path):
+    return int(re.search(r'-(\d+)\.bin$', path).group(1))
+
+
+def segment_paths(directory, prefix='gpu'):
+    """ Returns the paths of the segments in directory, oldest first """
+    pattern = re.compile(re.escape(prefix) + r'-\d+\.bin$')
+    paths = [os.path.join(directory, p) for p in os.listdir(directory)
+             if pattern.match(p)]
+    return sorted(paths, key=_segment_number)
+
+
+def load_segments(directory, prefix='gpu'):
+    """ Opens every segment in directory, oldest first """
+    return [Segment(p) for p in segment_paths(directory, prefix)]
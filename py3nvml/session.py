@@ -0,0 +1,107 @@
+"""
+Keeping NVML initialized across many short uses.
+
+Every nvmlInit/nvmlShutdown pair is a full handshake with the driver. Code
+that only needs NVML for a moment, like :func:`py3nvml.grab_gpus`, takes the
+process wide :class:`Session` instead: the first scope to enter initializes
+NVML, and it is only shut down when the last scope exits. Wrapping a batch of
+such calls in a session makes them all share one initialization.
+
+A child process doesn't inherit the scopes of its parent after a fork. The
+first scope in the child initializes NVML afresh, and leaving a scope that
+was entered before the fork does nothing in the child.
+
+E.g.
+
+.. code:: python
+
+    import py3nvml
+    from py3nvml.session import get_session
+
+    with get_session():
+        # one nvmlInit for all of them
+        for i in range(100):
+            py3nvml.grab_gpus(1)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import threading
+
+from py3nvml import py3nvml
+
+
+class Session(object):
+    """
+    A reentrant, thread safe scope during which NVML is initialized.
+
+    Use :func:`get_session` rather than making one, so all the code in the
+    process shares the same initialization.
+    """
+    def __init__(self):
+        self._reset(0)
+
+    def _reset(self, inherited):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._count = 0
+        # Scopes entered before a fork, that the child may still leave
+        self._inherited = inherited
+
+    def _check_fork(self):
+        # The scopes and the lock belong to the parent. The child starts with
+        # one thread, so swapping them here can't race.
+        if self._pid != os.getpid():
+            self._reset(self._count + self._inherited)
+
+    @property
+    def active(self):
+        """ Whether NVML is initialized by this session """
+        self._check_fork()
+        return self._count > 0
+
+    def acquire(self):
+        """
+        Enters a scope, initializing NVML if it's the first one.
+
+        Raises
+        ------
+        NVMLError
+            If NVML can't be initialized. The scope isn't entered.
+        """
+        self._check_fork()
+        with self._lock:
+            if self._count == 0:
+                py3nvml.nvmlInit()
+            self._count += 1
+
+    def release(self):
+        """ Exits a scope, shutting NVML down if it's the last one """
+        self._check_fork()
+        with self._lock:
+            if self._count == 0:
+                if self._inherited:
+                    self._inherited -= 1
+                    return
+                raise RuntimeError('release() called more times than '
+                                   'acquire()')
+            self._count -= 1
+            if self._count == 0:
+                py3nvml.nvmlShutdown()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_session = Session()
+
+
+def get_session():
+    """ Returns the :class:`Session` shared by the whole process """
+    return _session
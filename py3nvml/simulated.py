@@ -0,0 +1,863 @@
+"""
+A pure python stand-in for the NVML shared library.
+
+The bindings in :mod:`py3nvml.py3nvml` look up every C function on
+``py3nvml.nvmlLib``. A :class:`SimulatedNvml` object can be installed in its
+place so the real wrappers (and everything built on them) run against a set of
+fake devices. This is used by the tests and benchmarks, and is handy for
+developing tools on a machine without an NVIDIA GPU.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml import py3nvml
+    from py3nvml.simulated import SimulatedNvml
+
+    sim = SimulatedNvml(num_devices=4).install()
+    py3nvml.nvmlInit()
+    print(py3nvml.nvmlDeviceGetName(py3nvml.nvmlDeviceGetHandleByIndex(0)))
+    py3nvml.nvmlShutdown()
+    sim.uninstall()
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+from collections import OrderedDict
+from ctypes import addressof
+import threading
+import time
+
+from py3nvml import py3nvml
+from py3nvml.py3nvml import (
+    NVML_SUCCESS, NVML_ERROR_UNINITIALIZED, NVML_ERROR_INVALID_ARGUMENT,
+    NVML_ERROR_NOT_SUPPORTED, NVML_ERROR_NOT_FOUND,
+    NVML_ERROR_INSUFFICIENT_SIZE, NVML_ERROR_TIMEOUT,
+    NVML_ERROR_NO_PERMISSION, NVMLError,
+    struct_c_nvmlDevice_t, struct_c_nvmlEventSet_t, nvmlEventTypeAll,
+    nvmlEventTypePState, NVML_BRAND_TESLA, NVML_COMPUTEMODE_DEFAULT,
+    NVML_GOM_ALL_ON, NVML_DRIVER_WDDM, NVML_TEMPERATURE_GPU,
+    NVML_TEMPERATURE_THRESHOLD_SHUTDOWN, NVML_TEMPERATURE_THRESHOLD_SLOWDOWN,
+    NVML_CLOCK_GRAPHICS, NVML_CLOCK_SM, NVML_CLOCK_MEM,
+    NVML_PCIE_UTIL_TX_BYTES, NVML_PCIE_UTIL_RX_BYTES,
+    NVML_PERF_POLICY_POWER, NVML_PERF_POLICY_THERMAL,
+    NVML_MEMORY_LOCATION_COUNT, NVML_VALUE_TYPE_UNSIGNED_INT,
+    nvmlClocksThrottleReasonAll, nvmlClocksThrottleReasonGpuIdle)
+
+#: Functions that usually aren't supported on GeForce boards
+GEFORCE_UNSUPPORTED = frozenset([
+    'nvmlDeviceGetSerial', 'nvmlDeviceGetInforomImageVersion',
+    'nvmlDeviceGetInforomVersion', 'nvmlDeviceGetEccMode',
+    'nvmlDeviceGetMemoryErrorCounter', 'nvmlDeviceGetTotalEccErrors',
+    'nvmlDeviceGetRetiredPages', 'nvmlDeviceGetRetiredPagesPendingStatus',
+    'nvmlDeviceGetAccountingMode', 'nvmlDeviceGetAccountingBufferSize',
+    'nvmlDeviceGetAccountingPids', 'nvmlDeviceGetAccountingStats',
+    'nvmlDeviceGetDriverModel', 'nvmlDeviceGetGpuOperationMode',
+    'nvmlDeviceGetApplicationsClock', 'nvmlDeviceGetDefaultApplicationsClock',
+    'nvmlDeviceGetSupportedMemoryClocks', 'nvmlDeviceGetAutoBoostedClocksEnabled',
+    'nvmlDeviceGetEncoderUtilization', 'nvmlDeviceGetDecoderUtilization',
+    'nvmlDeviceGetPowerManagementLimitConstraints',
+    'nvmlDeviceGetBridgeChipInfo', 'nvmlDeviceGetBoardId',
+    'nvmlDeviceGetMultiGpuBoard', 'nvmlDeviceGetViolationStatus',
+    'nvmlDeviceSetApplicationsClocks', 'nvmlDeviceResetApplicationsClocks'])
+
+
+# The c_nvmlValue_t member of each _nvmlValueType_t
+_SAMPLE_FIELDS = ['dVal', 'uiVal', 'ulVal', 'ullVal']
+
+
+def _val(arg):
+    """ Unwrap a ctypes scalar passed by value """
+    return getattr(arg, 'value', arg)
+
+
+def _out(arg):
+    """ Unwrap a ctypes object passed with byref() """
+    return getattr(arg, '_obj', arg)
+
+
+class SimulatedProcess(object):
+    """ A process running on a simulated device """
+    def __init__(self, pid, usedGpuMemory, name=None):
+        self.pid = pid
+        self.usedGpuMemory = usedGpuMemory
+        self.name = name if name is not None else 'process-{}'.format(pid)
+
+
+class SimulatedDevice(object):
+    """
+    The state of one simulated GPU.
+
+    All attributes are plain python values and can be changed at any time to
+    simulate the device changing state. Any NVML function name added to
+    :attr:`unsupported` will return ``NVML_ERROR_NOT_SUPPORTED`` for this
+    device.
+    """
+    def __init__(self, index, name='Simulated GPU', total_memory=16 << 30):
+        self.index = index
+        self.name = name
+        self.uuid = 'GPU-{:08x}-5133-4e4d-4c00-{:012x}'.format(index, index)
+        self.serial = '{:013d}'.format(index)
+        self.minor_number = index
+        self.bus_id = '0000:{:02X}:00.0'.format(index + 1)
+        self.total_memory = total_memory
+        self.used_memory = 0
+        self.processes = []
+        self.pstate = 8
+        self.supported_events = nvmlEventTypeAll
+        self.accounting_mode = 1
+        self.accounting_buffer_size = 4000
+        # (pid, stats) of each process in the accounting buffer, oldest first
+        self.accounting = []
+        self.brand = NVML_BRAND_TESLA
+        self.vbios_version = '86.00.00.00.01'
+        self.inforom_image_version = 'G001.0000.01.04'
+        self.inforom_versions = {0: '1.1', 1: '4.1', 2: 'N/A'}
+        self.board_id = 0x100 + index
+        self.multi_gpu_board = 0
+        self.display_mode = 0
+        self.display_active = 0
+        self.persistence_mode = 1
+        self.compute_mode = NVML_COMPUTEMODE_DEFAULT
+        self.gpu_operation_mode = (NVML_GOM_ALL_ON, NVML_GOM_ALL_ON)
+        self.driver_model = (NVML_DRIVER_WDDM, NVML_DRIVER_WDDM)
+        self.fan_speed = 30
+        self.temperature = {NVML_TEMPERATURE_GPU: 40}
+        self.temperature_thresholds = {
+            NVML_TEMPERATURE_THRESHOLD_SHUTDOWN: 95,
+            NVML_TEMPERATURE_THRESHOLD_SLOWDOWN: 90}
+        self.power_management_mode = 1
+        # in milliwatts
+        self.power_usage = 50000
+        self.power_limit = 250000
+        self.default_power_limit = 250000
+        self.power_limit_constraints = (100000, 300000)
+        # in MHz
+        self.supported_clocks = OrderedDict([
+            (2505, [1480, 1404, 1328, 1252, 1176, 1100]), (405, [405])])
+        self.clocks = {NVML_CLOCK_GRAPHICS: 1100, NVML_CLOCK_SM: 1100,
+                       NVML_CLOCK_MEM: 2505}
+        self.max_clocks = {NVML_CLOCK_GRAPHICS: 1480, NVML_CLOCK_SM: 1480,
+                           NVML_CLOCK_MEM: 2505}
+        self.applications_clocks = {NVML_CLOCK_GRAPHICS: 1100,
+                                    NVML_CLOCK_MEM: 2505}
+        self.default_applications_clocks = dict(self.applications_clocks)
+        self.auto_boosted_clocks = (1, 1)
+        self.utilization = (0, 0)
+        self.encoder_utilization = (0, 167000)
+        self.decoder_utilization = (0, 167000)
+        self.bar1_total = 256 << 20
+        self.bar1_used = 2 << 20
+        self.pcie_link_generation = (3, 3)
+        self.pcie_link_width = (16, 16)
+        self.pcie_replay_counter = 0
+        # in KB/s, keyed by counter type
+        self.pcie_throughput = {NVML_PCIE_UTIL_TX_BYTES: 0,
+                                NVML_PCIE_UTIL_RX_BYTES: 0}
+        self.supported_throttle_reasons = nvmlClocksThrottleReasonAll
+        self.throttle_reasons = nvmlClocksThrottleReasonGpuIdle
+        # (referenceTime, violationTime) keyed by perf policy
+        self.violation_status = {NVML_PERF_POLICY_POWER: (0, 0),
+                                 NVML_PERF_POLICY_THERMAL: (0, 0)}
+        self.ecc_mode = (1, 1)
+        # keyed by (errorType, counterType, location)
+        self.ecc_errors = {}
+        # keyed by cause
+        self.retired_pages = {0: [], 1: []}
+        self.retired_pages_pending = 0
+        self.unsupported = set()
+        # False mimics a user that isn't allowed to change settings
+        self.writable = True
+        # sampling type -> (value type, list of (timeStamp, value)), see
+        # add_samples
+        self.samples = {}
+        self.sample_buffer_size = 120
+
+    @property
+    def free_memory(self):
+        return self.total_memory - self.used_memory
+
+    def add_process(self, pid, usedGpuMemory, name=None):
+        self.processes.append(SimulatedProcess(pid, usedGpuMemory, name))
+        self.used_memory += usedGpuMemory
+
+    def remove_process(self, pid):
+        for p in list(self.processes):
+            if p.pid == pid:
+                self.processes.remove(p)
+                self.used_memory -= p.usedGpuMemory
+
+    def add_samples(self, samplingType, samples,
+                    valueType=NVML_VALUE_TYPE_UNSIGNED_INT):
+        """
+        Adds (timeStamp, value) pairs to the sample buffer of a sampling type,
+        timeStamp in microseconds. Like the driver, only the last
+        sample_buffer_size samples are kept.
+        """
+        _, buf = self.samples.setdefault(samplingType, (valueType, []))
+        buf.extend(samples)
+        del buf[:-self.sample_buffer_size]
+
+    def _latest_accounting(self, pid):
+        for p, entry in reversed(self.accounting):
+            if p == pid:
+                return entry
+        return None
+
+    def account(self, pid, **stats):
+        """
+        Create or update the accounting stats of pid. Takes the fields of
+        c_nvmlAccountingStats_t as keyword arguments. Giving a finished pid
+        another startTime adds a new process that reused the pid. As with the
+        driver, the old one stays in the buffer.
+        """
+        entry = self._latest_accounting(pid)
+        if entry is None or (not entry['isRunning'] and stats.get(
+                'startTime', entry['startTime']) != entry['startTime']):
+            entry = {
+                'gpuUtilization': 0, 'memoryUtilization': 0,
+                'maxMemoryUsage': 0, 'time': 0,
+                'startTime': int(time.time() * 1e6), 'isRunning': 1}
+            self.accounting.append((pid, entry))
+        entry.update(stats)
+        del self.accounting[:-self.accounting_buffer_size]
+
+
+class SimulatedNvml(object):
+    """
+    Fake implementation of the libnvidia-ml C functions.
+
+    Each NVML entry point is a method of the same name taking the same ctypes
+    arguments the bindings pass to the real library, and returning an
+    ``nvmlReturn_t`` code. Functions that are not implemented are reported as
+    missing, exactly as they would be by an old driver.
+
+    Parameters
+    ----------
+    num_devices : int
+        How many devices to create.
+    driver_version : str
+        Reported by nvmlSystemGetDriverVersion.
+    devices : list of :class:`SimulatedDevice`
+        Use these devices instead of creating ``num_devices`` new ones.
+    latency : float
+        Seconds every call blocks for, to mimic a slow driver.
+    """
+    def __init__(self, num_devices=2, driver_version='384.81', devices=None,
+                 latency=0):
+        if devices is None:
+            devices = [SimulatedDevice(i) for i in range(num_devices)]
+        self.devices = devices
+        self.driver_version = driver_version
+        self.nvml_version = '9.' + driver_version
+        self.latency = latency
+        self.init_count = 0
+        self.calls = 0
+        # The error nvmlSystemGetProcessName returns for every process, e.g.
+        # NVML_ERROR_NO_PERMISSION, or None
+        self.process_name_error = None
+        self._handles = [struct_c_nvmlDevice_t() for _ in devices]
+        self._by_address = dict(
+            (addressof(h), d) for h, d in zip(self._handles, devices))
+        self._lock = threading.Lock()
+        self._event_cond = threading.Condition()
+        self._event_sets = {}
+        self._previous = None
+
+    # Installation
+    def install(self):
+        """ Make the py3nvml bindings use this object as the NVML library """
+        with py3nvml.libLoadLock:
+            self._previous = py3nvml.nvmlLib
+            py3nvml.nvmlLib = self
+            py3nvml._nvmlGetFunctionPointer_cache.clear()
+        return self
+
+    def uninstall(self):
+        """ Restore whichever library was loaded before :meth:`install` """
+        with py3nvml.libLoadLock:
+            if py3nvml.nvmlLib is self:
+                py3nvml.nvmlLib = self._previous
+            py3nvml._nvmlGetFunctionPointer_cache.clear()
+            py3nvml._nvmlLib_refcount = 0
+        self._previous = None
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def __getattribute__(self, name):
+        attr = object.__getattribute__(self, name)
+        if not name.startswith('nvml') or not callable(attr):
+            return attr
+        return _SimulatedFunction(self, name, attr)
+
+    def post_event(self, device, eventType=nvmlEventTypePState, eventData=0):
+        """
+        Deliver an event to every event set that registered for it on device.
+        """
+        with self._event_cond:
+            for _, registered, queue in self._event_sets.values():
+                if registered.get(device.index, 0) & eventType:
+                    queue.append((device.index, eventType, eventData))
+            self._event_cond.notify_all()
+
+    def _device(self, handle):
+        try:
+            return self._by_address[addressof(handle.contents)]
+        except (AttributeError, KeyError, ValueError):
+            return None
+
+    def _check_device(self, name, handle):
+        if self.init_count == 0:
+            return None, NVML_ERROR_UNINITIALIZED
+        device = self._device(handle)
+        if device is None:
+            return None, NVML_ERROR_INVALID_ARGUMENT
+        if name in device.unsupported:
+            return None, NVML_ERROR_NOT_SUPPORTED
+        return device, NVML_SUCCESS
+
+    # Initialization and system queries
+    def nvmlInit_v2(self):
+        self.init_count += 1
+        return NVML_SUCCESS
+
+    def nvmlShutdown(self):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        self.init_count -= 1
+        return NVML_SUCCESS
+
+    def nvmlErrorString(self, result):
+        msg = NVMLError._errcode_to_string.get(_val(result), 'Unknown Error')
+        return msg.encode('utf-8')
+
+    def nvmlSystemGetDriverVersion(self, c_version, length):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        c_version.value = self.driver_version.encode('utf-8')
+        return NVML_SUCCESS
+
+    def nvmlSystemGetNVMLVersion(self, c_version, length):
+        c_version.value = self.nvml_version.encode('utf-8')
+        return NVML_SUCCESS
+
+    def nvmlSystemGetProcessName(self, pid, c_name, length):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        if self.process_name_error is not None:
+            return self.process_name_error
+        for device in self.devices:
+            for p in device.processes:
+                if p.pid == _val(pid):
+                    c_name.value = p.name.encode('utf-8')
+                    return NVML_SUCCESS
+        return NVML_ERROR_NOT_FOUND
+
+    # Device enumeration
+    def nvmlDeviceGetCount_v2(self, c_count):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        _out(c_count).value = len(self.devices)
+        return NVML_SUCCESS
+
+    def nvmlDeviceGetHandleByIndex_v2(self, c_index, device):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        index = _val(c_index)
+        if not 0 <= index < len(self.devices):
+            return NVML_ERROR_INVALID_ARGUMENT
+        _out(device).contents = self._handles[index]
+        return NVML_SUCCESS
+
+    def nvmlDeviceGetHandleByUUID(self, c_uuid, device):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        uuid = py3nvml.bytes_to_str(_val(c_uuid))
+        for i, d in enumerate(self.devices):
+            if d.uuid == uuid:
+                _out(device).contents = self._handles[i]
+                return NVML_SUCCESS
+        return NVML_ERROR_NOT_FOUND
+
+    # Static device information
+    def nvmlDeviceGetName(self, handle, c_name, length):
+        device, ret = self._check_device('nvmlDeviceGetName', handle)
+        if ret == NVML_SUCCESS:
+            c_name.value = device.name.encode('utf-8')
+        return ret
+
+    def nvmlDeviceGetUUID(self, handle, c_uuid, length):
+        device, ret = self._check_device('nvmlDeviceGetUUID', handle)
+        if ret == NVML_SUCCESS:
+            c_uuid.value = device.uuid.encode('utf-8')
+        return ret
+
+    def nvmlDeviceGetSerial(self, handle, c_serial, length):
+        device, ret = self._check_device('nvmlDeviceGetSerial', handle)
+        if ret == NVML_SUCCESS:
+            c_serial.value = device.serial.encode('utf-8')
+        return ret
+
+    def nvmlDeviceGetMinorNumber(self, handle, c_minor_number):
+        device, ret = self._check_device('nvmlDeviceGetMinorNumber', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_minor_number).value = device.minor_number
+        return ret
+
+    def nvmlDeviceGetIndex(self, handle, c_index):
+        device, ret = self._check_device('nvmlDeviceGetIndex', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_index).value = device.index
+        return ret
+
+    def nvmlDeviceGetPciInfo_v2(self, handle, c_info):
+        device, ret = self._check_device('nvmlDeviceGetPciInfo_v2', handle)
+        if ret == NVML_SUCCESS:
+            info = _out(c_info)
+            info.busId = device.bus_id.encode('utf-8')
+            info.bus = device.index + 1
+            info.pciDeviceId = 0x1b0010de
+        return ret
+
+    # Dynamic device information
+    def nvmlDeviceGetMemoryInfo(self, handle, c_memory):
+        device, ret = self._check_device('nvmlDeviceGetMemoryInfo', handle)
+        if ret == NVML_SUCCESS:
+            memory = _out(c_memory)
+            memory.total = device.total_memory
+            memory.used = device.used_memory
+            memory.free = device.free_memory
+        return ret
+
+    def _running_processes(self, name, handle, c_count, c_procs):
+        device, ret = self._check_device(name, handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        count = _out(c_count)
+        n = len(device.processes)
+        if c_procs is None or count.value < n:
+            count.value = n
+            return NVML_SUCCESS if n == 0 else NVML_ERROR_INSUFFICIENT_SIZE
+        for i, p in enumerate(device.processes):
+            c_procs[i].pid = p.pid
+            c_procs[i].usedGpuMemory = p.usedGpuMemory
+        count.value = n
+        return NVML_SUCCESS
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle, c_count, c_procs):
+        return self._running_processes(
+            'nvmlDeviceGetComputeRunningProcesses', handle, c_count, c_procs)
+
+    def nvmlDeviceGetGraphicsRunningProcesses(self, handle, c_count, c_procs):
+        return self._running_processes(
+            'nvmlDeviceGetGraphicsRunningProcesses', handle, c_count, c_procs)
+
+    def nvmlDeviceGetPerformanceState(self, handle, c_pstate):
+        device, ret = self._check_device(
+            'nvmlDeviceGetPerformanceState', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_pstate).value = device.pstate
+        return ret
+
+    def nvmlDeviceGetPowerState(self, handle, c_pstate):
+        device, ret = self._check_device('nvmlDeviceGetPowerState', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_pstate).value = device.pstate
+        return ret
+
+    def nvmlDeviceGetInforomVersion(self, handle, infoRomObject, c_version,
+                                    length):
+        device, ret = self._check_device('nvmlDeviceGetInforomVersion', handle)
+        if ret == NVML_SUCCESS:
+            c_version.value = device.inforom_versions[
+                _val(infoRomObject)].encode('utf-8')
+        return ret
+
+    # Clocks
+    def _array(self, values, c_count, c_array):
+        count = _out(c_count)
+        if c_array is None or count.value < len(values):
+            count.value = len(values)
+            return NVML_SUCCESS if not values else \
+                NVML_ERROR_INSUFFICIENT_SIZE
+        for i, v in enumerate(values):
+            c_array[i] = v
+        count.value = len(values)
+        return NVML_SUCCESS
+
+    def nvmlDeviceGetSupportedMemoryClocks(self, handle, c_count, c_clocks):
+        device, ret = self._check_device(
+            'nvmlDeviceGetSupportedMemoryClocks', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        return self._array(list(device.supported_clocks), c_count, c_clocks)
+
+    def nvmlDeviceGetSupportedGraphicsClocks(self, handle, memoryClockMHz,
+                                             c_count, c_clocks):
+        device, ret = self._check_device(
+            'nvmlDeviceGetSupportedGraphicsClocks', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        clocks = device.supported_clocks.get(_val(memoryClockMHz))
+        if clocks is None:
+            return NVML_ERROR_NOT_FOUND
+        return self._array(clocks, c_count, c_clocks)
+
+    # ECC
+    def nvmlDeviceGetMemoryErrorCounter(self, handle, errorType, counterType,
+                                        locationType, c_count):
+        device, ret = self._check_device(
+            'nvmlDeviceGetMemoryErrorCounter', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_count).value = device.ecc_errors.get(
+                (_val(errorType), _val(counterType), _val(locationType)), 0)
+        return ret
+
+    def nvmlDeviceGetTotalEccErrors(self, handle, errorType, counterType,
+                                    c_count):
+        device, ret = self._check_device('nvmlDeviceGetTotalEccErrors', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_count).value = sum(
+                device.ecc_errors.get(
+                    (_val(errorType), _val(counterType), loc), 0)
+                for loc in range(NVML_MEMORY_LOCATION_COUNT))
+        return ret
+
+    def nvmlDeviceGetRetiredPages(self, handle, sourceFilter, c_count,
+                                  c_pages):
+        device, ret = self._check_device('nvmlDeviceGetRetiredPages', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        pages = device.retired_pages.get(_val(sourceFilter), [])
+        ret = self._array(pages, c_count, c_pages)
+        # Unlike most functions, this reports the size without an error
+        return NVML_SUCCESS if c_pages is None else ret
+
+    # Settings
+    def _check_writable(self, name, handle):
+        device, ret = self._check_device(name, handle)
+        if ret == NVML_SUCCESS and not device.writable:
+            return None, NVML_ERROR_NO_PERMISSION
+        return device, ret
+
+    def nvmlDeviceSetApplicationsClocks(self, handle, maxMemClockMHz,
+                                        maxGraphicsClockMHz):
+        device, ret = self._check_writable('nvmlDeviceSetApplicationsClocks',
+                                           handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        mem, gfx = _val(maxMemClockMHz), _val(maxGraphicsClockMHz)
+        if gfx not in device.supported_clocks.get(mem, []):
+            return NVML_ERROR_INVALID_ARGUMENT
+        device.applications_clocks = {NVML_CLOCK_GRAPHICS: gfx,
+                                      NVML_CLOCK_MEM: mem}
+        return NVML_SUCCESS
+
+    def nvmlDeviceResetApplicationsClocks(self, handle):
+        device, ret = self._check_writable(
+            'nvmlDeviceResetApplicationsClocks', handle)
+        if ret == NVML_SUCCESS:
+            device.applications_clocks = dict(
+                device.default_applications_clocks)
+        return ret
+
+    def nvmlDeviceSetPowerManagementLimit(self, handle, limit):
+        device, ret = self._check_writable(
+            'nvmlDeviceSetPowerManagementLimit', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        low, high = device.power_limit_constraints
+        if not low <= _val(limit) <= high:
+            return NVML_ERROR_INVALID_ARGUMENT
+        device.power_limit = _val(limit)
+        device.power_usage = min(device.power_usage, device.power_limit)
+        return NVML_SUCCESS
+
+    # Samples
+    def nvmlDeviceGetSamples(self, handle, samplingType, lastSeenTimeStamp,
+                             sampleValType, sampleCount, samples):
+        device, ret = self._check_device('nvmlDeviceGetSamples', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        buf = device.samples.get(_val(samplingType))
+        if buf is None:
+            return NVML_ERROR_NOT_SUPPORTED
+        value_type, values = buf
+        new = [(t, v) for t, v in values if t > _val(lastSeenTimeStamp)]
+        if not new:
+            return NVML_ERROR_NOT_FOUND
+        _out(sampleValType).value = value_type
+        count = _out(sampleCount)
+        if samples is None:
+            count.value = len(new)
+            return NVML_SUCCESS
+        field = _SAMPLE_FIELDS[value_type]
+        new = new[:count.value]
+        for i, (t, v) in enumerate(new):
+            samples[i].timeStamp = t
+            setattr(samples[i].sampleValue, field, v)
+        count.value = len(new)
+        return NVML_SUCCESS
+
+    # Accounting
+    def nvmlDeviceGetAccountingMode(self, handle, c_mode):
+        device, ret = self._check_device('nvmlDeviceGetAccountingMode', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_mode).value = device.accounting_mode
+        return ret
+
+    def nvmlDeviceSetAccountingMode(self, handle, mode):
+        device, ret = self._check_writable('nvmlDeviceSetAccountingMode',
+                                           handle)
+        if ret == NVML_SUCCESS:
+            device.accounting_mode = _val(mode)
+        return ret
+
+    def _check_accounting(self, name, handle):
+        # Like the driver, the stats are NOT_SUPPORTED while the mode is off
+        device, ret = self._check_device(name, handle)
+        if ret == NVML_SUCCESS and not device.accounting_mode:
+            return None, NVML_ERROR_NOT_SUPPORTED
+        return device, ret
+
+    def nvmlDeviceGetAccountingBufferSize(self, handle, bufferSize):
+        device, ret = self._check_accounting(
+            'nvmlDeviceGetAccountingBufferSize', handle)
+        if ret == NVML_SUCCESS:
+            _out(bufferSize).value = device.accounting_buffer_size
+        return ret
+
+    def nvmlDeviceGetAccountingPids(self, handle, count, pids):
+        device, ret = self._check_accounting('nvmlDeviceGetAccountingPids',
+                                             handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        count = _out(count)
+        if count.value < len(device.accounting):
+            count.value = len(device.accounting)
+            return NVML_ERROR_INSUFFICIENT_SIZE
+        for i, (pid, _) in enumerate(device.accounting):
+            pids[i] = pid
+        count.value = len(device.accounting)
+        return NVML_SUCCESS
+
+    def nvmlDeviceGetAccountingStats(self, handle, pid, stats):
+        device, ret = self._check_accounting(
+            'nvmlDeviceGetAccountingStats', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        # Of a reused pid, the driver only reports the latest process
+        entry = device._latest_accounting(_val(pid))
+        if entry is None:
+            return NVML_ERROR_NOT_FOUND
+        stats = _out(stats)
+        for key, value in entry.items():
+            setattr(stats, key, value)
+        return NVML_SUCCESS
+
+    # Events
+    def nvmlDeviceGetSupportedEventTypes(self, handle, c_eventTypes):
+        device, ret = self._check_device(
+            'nvmlDeviceGetSupportedEventTypes', handle)
+        if ret == NVML_SUCCESS:
+            _out(c_eventTypes).value = device.supported_events
+        return ret
+
+    def nvmlEventSetCreate(self, eventSet):
+        if self.init_count == 0:
+            return NVML_ERROR_UNINITIALIZED
+        s = struct_c_nvmlEventSet_t()
+        with self._event_cond:
+            # keep the struct alive as long as the set exists
+            self._event_sets[addressof(s)] = (s, {}, [])
+        _out(eventSet).contents = s
+        return NVML_SUCCESS
+
+    def _event_set(self, eventSet):
+        try:
+            return self._event_sets[addressof(eventSet.contents)]
+        except (AttributeError, KeyError, ValueError):
+            return None
+
+    def nvmlDeviceRegisterEvents(self, handle, eventTypes, eventSet):
+        device, ret = self._check_device('nvmlDeviceRegisterEvents', handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        with self._event_cond:
+            event_set = self._event_set(eventSet)
+            if event_set is None:
+                return NVML_ERROR_INVALID_ARGUMENT
+            if _val(eventTypes) & ~device.supported_events:
+                return NVML_ERROR_NOT_SUPPORTED
+            registered = event_set[1]
+            registered[device.index] = \
+                registered.get(device.index, 0) | _val(eventTypes)
+        return NVML_SUCCESS
+
+    def nvmlEventSetWait(self, eventSet, c_data, timeoutms):
+        deadline = time.time() + _val(timeoutms) / 1000.0
+        with self._event_cond:
+            event_set = self._event_set(eventSet)
+            if event_set is None:
+                return NVML_ERROR_INVALID_ARGUMENT
+            queue = event_set[2]
+            while not queue:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return NVML_ERROR_TIMEOUT
+                self._event_cond.wait(remaining)
+            index, eventType, eventData = queue.pop(0)
+        data = _out(c_data)
+        data.device.contents = self._handles[index]
+        data.eventType = eventType
+        data.eventData = eventData
+        return NVML_SUCCESS
+
+    def nvmlEventSetFree(self, eventSet):
+        with self._event_cond:
+            if self._event_set(eventSet) is None:
+                return NVML_ERROR_INVALID_ARGUMENT
+            del self._event_sets[addressof(eventSet.contents)]
+        return NVML_SUCCESS
+
+
+class _SimulatedFunction(object):
+    """
+    Wraps a :class:`SimulatedNvml` method so it behaves like a ctypes function
+    pointer (e.g. accepts a ``restype`` attribute) and counts calls.
+    """
+    def __init__(self, lib, name, method):
+        self.lib = lib
+        self.__name__ = name
+        self.method = method
+        self.restype = None
+
+    def __call__(self, *args):
+        lib = self.lib
+        if lib.latency:
+            time.sleep(lib.latency)
+        with lib._lock:
+            lib.calls += 1
+        return self.method(*args)
+
+
+# Most device queries just copy an attribute of the device into an output
+# argument. Generate those.
+def _scalar(name, attr):
+    def method(self, handle, out):
+        device, ret = self._check_device(name, handle)
+        if ret == NVML_SUCCESS:
+            _out(out).value = getattr(device, attr)
+        return ret
+    return method
+
+
+def _indexed(name, attr):
+    def method(self, handle, index, out):
+        device, ret = self._check_device(name, handle)
+        if ret != NVML_SUCCESS:
+            return ret
+        value = getattr(device, attr).get(_val(index))
+        if value is None:
+            return NVML_ERROR_NOT_SUPPORTED
+        if isinstance(value, tuple):
+            # a struct
+            for field, v in zip(_out(out)._fields_, value):
+                setattr(_out(out), field[0], v)
+        else:
+            _out(out).value = value
+        return NVML_SUCCESS
+    return method
+
+
+def _pair(name, attr):
+    def method(self, handle, out1, out2):
+        device, ret = self._check_device(name, handle)
+        if ret == NVML_SUCCESS:
+            _out(out1).value, _out(out2).value = getattr(device, attr)
+        return ret
+    return method
+
+
+def _string(name, attr):
+    def method(self, handle, c_str, length):
+        device, ret = self._check_device(name, handle)
+        if ret == NVML_SUCCESS:
+            c_str.value = getattr(device, attr).encode('utf-8')
+        return ret
+    return method
+
+
+def _struct(name, fields):
+    def method(self, handle, out):
+        device, ret = self._check_device(name, handle)
+        if ret == NVML_SUCCESS:
+            for field, attr in fields:
+                setattr(_out(out), field, attr(device))
+        return ret
+    return method
+
+
+_generated = [
+    ('nvmlDeviceGetBrand', _scalar, 'brand'),
+    ('nvmlDeviceGetBoardId', _scalar, 'board_id'),
+    ('nvmlDeviceGetMultiGpuBoard', _scalar, 'multi_gpu_board'),
+    ('nvmlDeviceGetDisplayMode', _scalar, 'display_mode'),
+    ('nvmlDeviceGetDisplayActive', _scalar, 'display_active'),
+    ('nvmlDeviceGetPersistenceMode', _scalar, 'persistence_mode'),
+    ('nvmlDeviceGetComputeMode', _scalar, 'compute_mode'),
+    ('nvmlDeviceGetFanSpeed', _scalar, 'fan_speed'),
+    ('nvmlDeviceGetPowerManagementMode', _scalar, 'power_management_mode'),
+    ('nvmlDeviceGetPowerUsage', _scalar, 'power_usage'),
+    ('nvmlDeviceGetPowerManagementLimit', _scalar, 'power_limit'),
+    ('nvmlDeviceGetEnforcedPowerLimit', _scalar, 'power_limit'),
+    ('nvmlDeviceGetPowerManagementDefaultLimit', _scalar,
+     'default_power_limit'),
+    ('nvmlDeviceGetPcieReplayCounter', _scalar, 'pcie_replay_counter'),
+    ('nvmlDeviceGetSupportedClocksThrottleReasons', _scalar,
+     'supported_throttle_reasons'),
+    ('nvmlDeviceGetCurrentClocksThrottleReasons', _scalar,
+     'throttle_reasons'),
+    ('nvmlDeviceGetRetiredPagesPendingStatus', _scalar,
+     'retired_pages_pending'),
+    ('nvmlDeviceGetTemperature', _indexed, 'temperature'),
+    ('nvmlDeviceGetTemperatureThreshold', _indexed, 'temperature_thresholds'),
+    ('nvmlDeviceGetClockInfo', _indexed, 'clocks'),
+    ('nvmlDeviceGetMaxClockInfo', _indexed, 'max_clocks'),
+    ('nvmlDeviceGetApplicationsClock', _indexed, 'applications_clocks'),
+    ('nvmlDeviceGetDefaultApplicationsClock', _indexed,
+     'default_applications_clocks'),
+    ('nvmlDeviceGetPcieThroughput', _indexed, 'pcie_throughput'),
+    ('nvmlDeviceGetViolationStatus', _indexed, 'violation_status'),
+    ('nvmlDeviceGetEccMode', _pair, 'ecc_mode'),
+    ('nvmlDeviceGetDriverModel', _pair, 'driver_model'),
+    ('nvmlDeviceGetGpuOperationMode', _pair, 'gpu_operation_mode'),
+    ('nvmlDeviceGetAutoBoostedClocksEnabled', _pair, 'auto_boosted_clocks'),
+    ('nvmlDeviceGetPowerManagementLimitConstraints', _pair,
+     'power_limit_constraints'),
+    ('nvmlDeviceGetEncoderUtilization', _pair, 'encoder_utilization'),
+    ('nvmlDeviceGetDecoderUtilization', _pair, 'decoder_utilization'),
+    ('nvmlDeviceGetVbiosVersion', _string, 'vbios_version'),
+    ('nvmlDeviceGetInforomImageVersion', _string, 'inforom_image_version'),
+    ('nvmlDeviceGetUtilizationRates', _struct, [
+        ('gpu', lambda d: d.utilization[0]),
+        ('memory', lambda d: d.utilization[1])]),
+    ('nvmlDeviceGetBAR1MemoryInfo', _struct, [
+        ('bar1Total', lambda d: d.bar1_total),
+        ('bar1Used', lambda d: d.bar1_used),
+        ('bar1Free', lambda d: d.bar1_total - d.bar1_used)]),
+    ('nvmlDeviceGetCurrPcieLinkGeneration', _struct, [
+        ('value', lambda d: d.pcie_link_generation[0])]),
+    ('nvmlDeviceGetMaxPcieLinkGeneration', _struct, [
+        ('value', lambda d: d.pcie_link_generation[1])]),
+    ('nvmlDeviceGetCurrPcieLinkWidth', _struct, [
+        ('value', lambda d: d.pcie_link_width[0])]),
+    ('nvmlDeviceGetMaxPcieLinkWidth', _struct, [
+        ('value', lambda d: d.pcie_link_width[1])]),
+]
+for _name, _make, _attr in _generated:
+    setattr(SimulatedNvml, _name, _make(_name, _attr))
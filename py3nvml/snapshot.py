@@ -0,0 +1,444 @@
+"""
+Snapshots of the state of the gpus, and the differences between them.
+
+A :class:`Snapshot` holds the numeric fields that nvidia_smi.XmlDeviceQuery
+reports for each gpu (memory, utilization, power, temperature, clocks,
+performance state, throttle reasons, ECC counters and retired pages) in one
+flat array of 64 bit integers, plus the running processes in another. That
+makes them cheap to keep around by the thousand, and comparing two of them is
+mostly a comparison of two arrays.
+
+E.g. to see what a job did to the node
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.snapshot import take_snapshot
+
+    nvmlInit()
+    before = take_snapshot()
+    ...
+    after = take_snapshot()
+    d = before.diff(after)
+    for uuid, field, old, new in d.changes:
+        print(uuid, field, old, new)
+    for uuid, pid, used in d.started:
+        print(uuid, pid, used)
+
+The field names are those of ``nvidia-smi --query-gpu``. Fields that a gpu
+doesn't support are None.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+from array import array
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from py3nvml import py3nvml
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Marks a field the gpu doesn't support in :attr:`Snapshot.values`
+MISSING = -1
+
+
+def _memory(h):
+    info = py3nvml.nvmlDeviceGetMemoryInfo(h, default=None)
+    return (None,) * 3 if info is None else (info.total, info.used, info.free)
+
+
+def _utilization(h):
+    util = py3nvml.nvmlDeviceGetUtilizationRates(h, default=None)
+    return (None,) * 2 if util is None else (util.gpu, util.memory)
+
+
+def _clocks(h):
+    return tuple(py3nvml.nvmlDeviceGetClockInfo(h, t, default=None)
+                 for t in (py3nvml.NVML_CLOCK_GRAPHICS, py3nvml.NVML_CLOCK_SM,
+                           py3nvml.NVML_CLOCK_MEM))
+
+
+def _ecc(h):
+    return tuple(py3nvml.nvmlDeviceGetTotalEccErrors(h, e, c, default=None)
+                 for c in (py3nvml.NVML_VOLATILE_ECC,
+                           py3nvml.NVML_AGGREGATE_ECC)
+                 for e in (py3nvml.NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                           py3nvml.NVML_MEMORY_ERROR_TYPE_UNCORRECTED))
+
+
+def _retired_pages(h):
+    values = []
+    sbe = py3nvml.NVML_PAGE_RETIREMENT_CAUSE_MULTIPLE_SINGLE_BIT_ECC_ERRORS
+    dbe = py3nvml.NVML_PAGE_RETIREMENT_CAUSE_DOUBLE_BIT_ECC_ERROR
+    for cause in (sbe, dbe):
+        pages = py3nvml.nvmlDeviceGetRetiredPages(h, cause, default=None)
+        values.append(None if pages is None else len(pages))
+    values.append(py3nvml.nvmlDeviceGetRetiredPagesPendingStatus(
+        h, default=None))
+    return tuple(values)
+
+
+def _pcie(h):
+    return tuple(py3nvml.nvmlDeviceGetPcieThroughput(h, c, default=None)
+                 for c in (py3nvml.NVML_PCIE_UTIL_TX_BYTES,
+                           py3nvml.NVML_PCIE_UTIL_RX_BYTES))
+
+
+def _single(fn, *args):
+    return lambda h: (fn(h, *args, default=None),)
+
+
+# (fields, query) pairs. Each query returns the values of its fields for a gpu
+_QUERIES = [
+    (('memory.total', 'memory.used', 'memory.free'), _memory),
+    (('utilization.gpu', 'utilization.memory'), _utilization),
+    (('power.draw',), _single(py3nvml.nvmlDeviceGetPowerUsage)),
+    (('temperature.gpu',), _single(py3nvml.nvmlDeviceGetTemperature,
+                                   py3nvml.NVML_TEMPERATURE_GPU)),
+    (('clocks.gr', 'clocks.sm', 'clocks.mem'), _clocks),
+    (('pstate',), _single(py3nvml.nvmlDeviceGetPerformanceState)),
+    (('clocks_throttle_reasons.active',),
+     _single(py3nvml.nvmlDeviceGetCurrentClocksThrottleReasons)),
+    (('ecc.errors.corrected.volatile.total',
+      'ecc.errors.uncorrected.volatile.total',
+      'ecc.errors.corrected.aggregate.total',
+      'ecc.errors.uncorrected.aggregate.total'), _ecc),
+    (('retired_pages.single_bit_ecc.count',
+      'retired_pages.double_bit.count',
+      'retired_pages.pending'), _retired_pages),
+    (('pcie.tx', 'pcie.rx'), _pcie),
+]
+
+#: All the fields a snapshot can hold. Units are as NVML reports them, e.g.
+#: bytes for memory, mW for power and KB/s for pcie throughput.
+FIELDS = tuple(f for fields, _ in _QUERIES for f in fields)
+
+#: The fields taken by default. The pcie counters are left out as NVML samples
+#: them for 20ms on each call.
+DEFAULT_FIELDS = tuple(f for f in FIELDS if not f.startswith('pcie.'))
+
+# Bit masks are stored as signed 64 bit integers
+_MASKS = frozenset(['clocks_throttle_reasons.active'])
+
+
+def _to_int64(value):
+    if value is None:
+        return MISSING
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_int64(field, value):
+    if value == MISSING:
+        return None
+    if field in _MASKS and value < 0:
+        return value + (1 << 64)
+    return value
+
+
+class Snapshot(object):
+    """
+    The state of a set of gpus at one point in time.
+
+    Attributes
+    ----------
+    timestamp : float
+        When the snapshot was taken, as returned by time.time().
+    uuids : tuple of str
+        The gpus, in order.
+    fields : tuple of str
+        The fields in the snapshot, in order.
+    values : array.array of int64
+        The value of every field for every gpu, gpu by gpu. Fields the gpu
+        doesn't support are :data:`MISSING`.
+    processes : array.array of int64
+        (gpu, pid, usedGpuMemory) triples of the running processes, sorted,
+        where gpu is the position of the gpu in uuids. usedGpuMemory is
+        :data:`MISSING` where the driver doesn't report it.
+    """
+    __slots__ = ('timestamp', 'uuids', 'fields', 'values', 'processes')
+
+    def __init__(self, timestamp, uuids, fields, values, processes):
+        self.timestamp = timestamp
+        self.uuids = tuple(uuids)
+        self.fields = tuple(fields)
+        self.values = values
+        self.processes = processes
+
+    def __eq__(self, other):
+        return (isinstance(other, Snapshot) and
+                self.uuids == other.uuids and self.fields == other.fields and
+                self.values == other.values and
+                self.processes == other.processes)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<Snapshot of {} gpus at {}>'.format(len(self.uuids),
+                                                    self.timestamp)
+
+    def value(self, uuid, field):
+        """ Returns one field of one gpu, or None if it isn't supported """
+        i = self.uuids.index(uuid) * len(self.fields) + \
+            self.fields.index(field)
+        return _from_int64(field, self.values[i])
+
+    def device(self, uuid):
+        """ Returns a dict of all the fields of one gpu """
+        n = len(self.fields)
+        start = self.uuids.index(uuid) * n
+        return dict((f, _from_int64(f, v)) for f, v in
+                    zip(self.fields, self.values[start:start + n]))
+
+    def device_processes(self, uuid):
+        """ Returns a dict of pid to usedGpuMemory on one gpu """
+        g = self.uuids.index(uuid)
+        p = self.processes
+        return dict((p[i + 1], _from_int64(None, p[i + 2]))
+                    for i in range(0, len(p), 3) if p[i] == g)
+
+    def as_array(self):
+        """
+        Returns the values as a (gpus, fields) numpy array of int64, sharing
+        memory with the snapshot.
+        """
+        if np is None:
+            raise ImportError('numpy is needed for Snapshot.as_array')
+        return np.frombuffer(self.values, dtype=np.int64).reshape(
+            len(self.uuids), len(self.fields))
+
+    def diff(self, other):
+        """ Returns what changed from this snapshot to other """
+        return diff(self, other)
+
+
+def take_snapshot(handles=None, fields=DEFAULT_FIELDS):
+    """
+    Takes a snapshot of the gpus.
+
+    NVML must be initialized.
+
+    Parameters
+    ----------
+    handles : list of (uuid, handle)
+        The gpus to take. If None, takes all the gpus.
+    fields : sequence of str
+        The fields to take, a subset of :data:`FIELDS`.
+
+    Returns
+    -------
+    snapshot : :class:`Snapshot`
+    """
+    if handles is None:
+        handles = []
+        for i in range(py3nvml.nvmlDeviceGetCount()):
+            h = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            handles.append((py3nvml.nvmlDeviceGetUUID(h), h))
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError('Unknown fields: {}'.format(', '.join(unknown)))
+    # Only make the queries needed for the fields asked for
+    queries = [(names, query) for names, query in _QUERIES
+               if any(f in fields for f in names)]
+    positions = dict((f, i) for i, f in enumerate(fields))
+
+    now = time.time()
+    values = array('q', [MISSING]) * (len(handles) * len(fields))
+    procs = []
+    for g, (_, h) in enumerate(handles):
+        offset = g * len(fields)
+        for names, query in queries:
+            for f, v in zip(names, query(h)):
+                if f in positions:
+                    values[offset + positions[f]] = _to_int64(v)
+        for p in py3nvml.nvmlDeviceGetComputeRunningProcesses(h, default=[]):
+            procs.append((g, p.pid, _to_int64(p.usedGpuMemory)))
+    procs.sort()
+    return Snapshot(now, [u for u, _ in handles], fields, values,
+                    array('q', [x for p in procs for x in p]))
+
+
+#: The difference between two snapshots.
+#:
+#: ``added`` and ``removed`` list the uuids of gpus in only one of them.
+#: ``changes`` lists (uuid, field, old, new) for every field that changed on a
+#: gpu in both. ``started`` and ``ended`` list (uuid, pid, usedGpuMemory) for
+#: processes in only one of them, ``memory`` lists (uuid, pid, old, new) for
+#: processes whose memory use changed.
+SnapshotDiff = namedtuple('SnapshotDiff', [
+    'before', 'after', 'added', 'removed', 'changes', 'started', 'ended',
+    'memory'])
+
+
+def _changed(a, b):
+    """ Positions where the two int64 arrays differ """
+    if a == b:
+        return []
+    if np is not None and len(a) > 64:
+        return np.flatnonzero(np.frombuffer(a, dtype=np.int64) !=
+                              np.frombuffer(b, dtype=np.int64)).tolist()
+    return [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+
+
+def _rows(snap, uuids):
+    # The values of the given gpus, in that order, as one array
+    n = len(snap.fields)
+    rows = array('q')
+    for u in uuids:
+        start = snap.uuids.index(u) * n
+        rows.extend(snap.values[start:start + n])
+    return rows
+
+
+def _process_dict(snap):
+    p = snap.processes
+    return dict(((snap.uuids[p[i]], p[i + 1]), p[i + 2])
+                for i in range(0, len(p), 3))
+
+
+def diff(a, b):
+    """
+    Finds what changed from snapshot a to snapshot b.
+
+    Both must hold the same fields. Gpus are matched by uuid.
+
+    Returns
+    -------
+    diff : :class:`SnapshotDiff`
+    """
+    if a.fields != b.fields:
+        raise ValueError('The snapshots hold different fields')
+    fields = a.fields
+    n = len(fields)
+
+    if a.uuids == b.uuids:
+        common = a.uuids
+        added = removed = []
+        old, new = a.values, b.values
+    else:
+        in_b = set(b.uuids)
+        in_a = set(a.uuids)
+        common = [u for u in a.uuids if u in in_b]
+        added = [u for u in b.uuids if u not in in_a]
+        removed = [u for u in a.uuids if u not in in_b]
+        old, new = _rows(a, common), _rows(b, common)
+
+    changes = []
+    for i in _changed(old, new):
+        f = fields[i % n]
+        changes.append((common[i // n], f, _from_int64(f, old[i]),
+                        _from_int64(f, new[i])))
+
+    started, ended, memory = [], [], []
+    if a.uuids != b.uuids or a.processes != b.processes:
+        pa, pb = _process_dict(a), _process_dict(b)
+        for key, used in pb.items():
+            if key not in pa:
+                started.append(key + (_from_int64(None, used),))
+            elif pa[key] != used:
+                memory.append(key + (_from_int64(None, pa[key]),
+                                     _from_int64(None, used)))
+        for key, used in pa.items():
+            if key not in pb:
+                ended.append(key + (_from_int64(None, used),))
+        started.sort()
+        ended.sort()
+        memory.sort()
+
+    return SnapshotDiff(a.timestamp, b.timestamp, added, removed, changes,
+                        started, ended, memory)
+
+
+class Sampler(object):
+    """
+    Takes snapshots of the gpus in a background thread.
+
+    Everything that wants the current state of the gpus (exporters, pools of
+    workers, ...) can share one sampler instead of each asking the driver.
+
+    NVML must be initialized for as long as the sampler is used.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between snapshots when started.
+    handles : list of (uuid, handle)
+        The gpus to take. If None, takes all the gpus.
+    fields : sequence of str
+        The fields to take, a subset of :data:`FIELDS`.
+    """
+    def __init__(self, interval=1.0, handles=None, fields=DEFAULT_FIELDS):
+        if handles is None:
+            handles = []
+            for i in range(py3nvml.nvmlDeviceGetCount()):
+                h = py3nvml.nvmlDeviceGetHandleByIndex(i)
+                handles.append((py3nvml.nvmlDeviceGetUUID(h), h))
+        self.handles = list(handles)
+        self.interval = interval
+        self.fields = tuple(fields)
+        self.logger = logging.getLogger(__name__)
+        self._latest = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add_callback(self, fn):
+        """
+        Calls fn(snapshot) from the sampling thread after every snapshot.
+        """
+        # Swapped rather than changed in place, so sample() can go through
+        # the list while callbacks are added or removed
+        self._callbacks = self._callbacks + [fn]
+
+    def remove_callback(self, fn):
+        """ Stops calling fn after every snapshot, if it was being called """
+        self._callbacks = [f for f in self._callbacks if f != fn]
+
+    def sample(self):
+        """ Takes a snapshot now, and returns it """
+        snap = take_snapshot(self.handles, self.fields)
+        with self._lock:
+            self._latest = snap
+        for fn in self._callbacks:
+            try:
+                fn(snap)
+            except Exception:
+                self.logger.exception('Snapshot callback {} failed'.format(fn))
+        return snap
+
+    def latest(self):
+        """ Returns the last snapshot taken, or None if there is none yet """
+        with self._lock:
+            return self._latest
+
+    def start(self):
+        """ Samples every interval seconds in a background thread """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                start = time.time()
+                try:
+                    self.sample()
+                except py3nvml.NVMLError as err:
+                    self.logger.warning('Could not take a snapshot: '
+                                        '{}'.format(err))
+                self._stop.wait(max(0, self.interval - (time.time() - start)))
+        self._thread = threading.Thread(target=run, name='Sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread started by :meth:`start` """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
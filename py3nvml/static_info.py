@@ -0,0 +1,269 @@
+"""
+A cache of the static information about the gpus, shared between processes.
+
+Short lived processes, like job prologues or command line tools, each spend a
+good part of their run time asking the driver for things that don't change
+until the next driver load: names, UUIDs, PCI bus ids, supported clocks and
+which queries the gpus support at all. :class:`StaticInfoCache` keeps those
+answers in a file the next process of the same user can read instead.
+
+The file is keyed by the driver version and the boot ID of the machine, so it
+is ignored after a reboot or a driver upgrade. As a driver reload with the same
+version changes neither, the UUID of every gpu is checked against the driver
+too (unless verify=False), which is one cheap call per gpu.
+
+Whether a query is supported is only saved for queries whose support doesn't
+depend on a mode that can be switched at any time, like accounting mode.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.static_info import get_static_info
+
+    nvmlInit()
+    for gpu in get_static_info():
+        print(gpu['index'], gpu['name'], gpu['uuid'], gpu['pci_bus_id'])
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+import logging
+import os
+import stat
+import tempfile
+
+from py3nvml import py3nvml
+
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+# Bump when the format of the file changes
+_VERSION = 2
+
+
+def _boot_id():
+    try:
+        with open(BOOT_ID_PATH) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _default_path():
+    # Only in directories of the user, never a shared one where someone else
+    # could put a file first
+    if 'PY3NVML_CACHE' in os.environ:
+        return os.environ['PY3NVML_CACHE']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'],
+                            'py3nvml-static.json')
+    cache = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'py3nvml', 'static.json')
+
+
+def _trusted(f):
+    # Whether an open file is the user's own and only they can write to it
+    if not hasattr(os, 'getuid'):
+        return True
+    st = os.fstat(f.fileno())
+    return st.st_uid == os.getuid() and \
+        not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _static_capabilities(capabilities):
+    # Leaves out the queries whose support depends on a mode of the gpu
+    return dict(
+        (k, v) for k, v in capabilities.items()
+        if (k[0] if isinstance(k, tuple) else k)
+        not in py3nvml._nvmlModeDependentQueries)
+
+
+def _query_device(index, handle):
+    """ Makes all the static queries for a gpu """
+    pci = py3nvml.nvmlDeviceGetPciInfo(handle)
+    clocks = py3nvml.nvmlDeviceGetSupportedClocks(handle, default=None)
+    if clocks is not None:
+        clocks = dict(clocks)
+    return {
+        'index': index,
+        'uuid': py3nvml.nvmlDeviceGetUUID(handle),
+        'name': py3nvml.nvmlDeviceGetName(handle),
+        'serial': py3nvml.nvmlDeviceGetSerial(handle, default=None),
+        'minor_number': py3nvml.nvmlDeviceGetMinorNumber(handle, default=None),
+        'brand': py3nvml.nvmlDeviceGetBrand(handle, default=None),
+        'vbios_version': py3nvml.nvmlDeviceGetVbiosVersion(
+            handle, default=None),
+        'pci_bus_id': py3nvml.bytes_to_str(pci.busId),
+        'total_memory': py3nvml.nvmlDeviceGetMemoryInfo(handle).total,
+        'supported_clocks': clocks,
+        'capabilities': _static_capabilities(
+            py3nvml.nvmlDeviceProbeCapabilities(handle)),
+    }
+
+
+def _encode(info):
+    # json needs str keys
+    info = dict(info)
+    if info['supported_clocks'] is not None:
+        info['supported_clocks'] = [
+            [mem, gfx] for mem, gfx in info['supported_clocks'].items()]
+    info['capabilities'] = [
+        [[k] if not isinstance(k, tuple) else list(k), v]
+        for k, v in info['capabilities'].items()]
+    return info
+
+
+def _decode(info):
+    if info['supported_clocks'] is not None:
+        info['supported_clocks'] = dict(
+            (mem, gfx) for mem, gfx in info['supported_clocks'])
+    info['capabilities'] = dict(
+        (k[0] if len(k) == 1 else tuple(k), v)
+        for k, v in info['capabilities'])
+    return info
+
+
+class StaticInfoCache(object):
+    """
+    A file holding the static information about every gpu.
+
+    NVML must be initialized to use the cache.
+
+    Parameters
+    ----------
+    path : str
+        The cache file. Defaults to the PY3NVML_CACHE environment variable,
+        'py3nvml-static.json' in XDG_RUNTIME_DIR if it is set, or else
+        'py3nvml/static.json' in XDG_CACHE_HOME (~/.cache). A file that
+        isn't owned by the user, or that others can write to, is never
+        used.
+    verify : bool
+        Check the UUID of every gpu against the driver before trusting the
+        file, to catch the driver being reloaded.
+    """
+    def __init__(self, path=None, verify=True):
+        self.path = _default_path() if path is None else path
+        self.verify = verify
+        self.logger = logging.getLogger(__name__)
+
+    def key(self):
+        """
+        Returns what the file must have been written under to be used, or None
+        if the boot ID of the machine can't be found, in which case the cache
+        is never used.
+        """
+        boot_id = _boot_id()
+        if boot_id is None:
+            return None
+        return {'version': _VERSION, 'boot_id': boot_id,
+                'driver_version': py3nvml.nvmlSystemGetDriverVersion()}
+
+    def load(self):
+        """
+        Reads the cache file.
+
+        The capabilities in the file are handed to the bindings, so queries the
+        gpus don't support are answered without calling the driver.
+
+        Returns
+        -------
+        devices : list of dict
+            The static information of each gpu, by index. None if there is no
+            usable file.
+        """
+        key = self.key()
+        if key is None:
+            return None
+        try:
+            with open(self.path) as f:
+                if not _trusted(f):
+                    self.logger.warning('Not using {}, as it is not owned by '
+                                        'this user or others can write to '
+                                        'it'.format(self.path))
+                    return None
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('key') != key:
+            return None
+
+        devices = [_decode(d) for d in data['devices']]
+        if len(devices) != py3nvml.nvmlDeviceGetCount():
+            return None
+        handles = [py3nvml.nvmlDeviceGetHandleByIndex(i)
+                   for i in range(len(devices))]
+        if self.verify:
+            for d, handle in zip(devices, handles):
+                if py3nvml.nvmlDeviceGetUUID(handle) != d['uuid']:
+                    self.logger.info('The gpus changed since {} was written'
+                                     .format(self.path))
+                    return None
+        for d, handle in zip(devices, handles):
+            py3nvml.nvmlDeviceSetCapabilities(
+                handle, _static_capabilities(d['capabilities']))
+        return devices
+
+    def save(self, devices):
+        """
+        Writes the static information of every gpu to the cache file.
+
+        The file is replaced atomically, so readers never see half of it, and
+        only the user can read or write it. Failing to write it is logged and
+        otherwise ignored.
+        """
+        key = self.key()
+        if key is None:
+            return
+        data = {'key': key, 'devices': [_encode(d) for d in devices]}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            # mkstemp creates it with O_EXCL and mode 0o600
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.py3nvml-')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except (IOError, OSError) as e:
+            self.logger.debug('Could not write {}: {}'.format(self.path, e))
+
+    def query(self):
+        """ Asks the driver for the static information of every gpu """
+        return [_query_device(i, py3nvml.nvmlDeviceGetHandleByIndex(i))
+                for i in range(py3nvml.nvmlDeviceGetCount())]
+
+    def get(self):
+        """
+        Returns the static information of every gpu, from the file if it can
+        be used, otherwise from the driver, in which case the file is written
+        for the next process.
+
+        Returns
+        -------
+        devices : list of dict
+            One dict per gpu, by index, with the keys 'index', 'uuid', 'name',
+            'serial', 'minor_number', 'brand', 'vbios_version', 'pci_bus_id',
+            'total_memory', 'supported_clocks' (a dict of memory clock to
+            list of graphics clocks, or None if not supported) and
+            'capabilities' (as returned by nvmlDeviceGetCapabilities).
+        """
+        devices = self.load()
+        if devices is None:
+            devices = self.query()
+            self.save(devices)
+        return devices
+
+
+def get_static_info(path=None, verify=True):
+    """
+    Returns the static information of every gpu, using the cache file shared
+    with other processes. See :meth:`StaticInfoCache.get`.
+    """
+    return StaticInfoCache(path, verify).get()
@@ -0,0 +1,239 @@
+"""
+Finding the gpus that are losing throughput to throttling.
+
+:class:`ThrottleAnalyzer` samples the active clock throttle reasons and the
+violation counters of every perf policy (power and thermal) on every gpu. The
+driver's violation counters are cumulative, so they are turned into the
+fraction of time each gpu was held back, both over the last interval and over
+a rolling window. A sample is three driver calls per gpu, and queries a gpu
+doesn't support are only made once.
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.throttle import ThrottleAnalyzer
+
+    nvmlInit()
+    analyzer = ThrottleAnalyzer(window=300)
+    analyzer.start(interval=5)
+    ...
+    for stats in analyzer.throttled(threshold=0.1):
+        print(stats.uuid, stats.power, stats.thermal, stats.active)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import deque, namedtuple
+import logging
+import threading
+import time
+
+from py3nvml import py3nvml
+
+#: The perf policies with violation counters, and their names
+POLICIES = [
+    (py3nvml.NVML_PERF_POLICY_POWER, 'power'),
+    (py3nvml.NVML_PERF_POLICY_THERMAL, 'thermal'),
+]
+
+#: The clock throttle reasons, and their names
+REASONS = [
+    (py3nvml.nvmlClocksThrottleReasonGpuIdle, 'gpu_idle'),
+    (py3nvml.nvmlClocksThrottleReasonApplicationsClocksSetting,
+     'applications_clocks_setting'),
+    (py3nvml.nvmlClocksThrottleReasonSwPowerCap, 'sw_power_cap'),
+    (py3nvml.nvmlClocksThrottleReasonHwSlowdown, 'hw_slowdown'),
+    (py3nvml.nvmlClocksThrottleReasonUnknown, 'unknown'),
+]
+
+#: The reasons that cost throughput. Idle gpus and clocks set by the user
+#: are not counted.
+LOSSY_REASONS = (py3nvml.nvmlClocksThrottleReasonSwPowerCap |
+                 py3nvml.nvmlClocksThrottleReasonHwSlowdown)
+
+#: The throttling of one gpu.
+#:
+#: ``power`` and ``thermal`` are the fraction of the window the gpu spent in
+#: violation of each policy, ``recent_power`` and ``recent_thermal`` the same
+#: over the last interval. They are None if the gpu doesn't keep the counter
+#: or there aren't two samples yet. ``reasons`` maps the name of each throttle
+#: reason to the fraction of samples in the window it was active in, and
+#: ``lossy`` is the fraction with any of :data:`LOSSY_REASONS`. ``active`` is
+#: the names of the reasons active in the last sample. ``seconds`` is the
+#: length of the window so far.
+ThrottleStats = namedtuple('ThrottleStats', [
+    'uuid', 'power', 'thermal', 'recent_power', 'recent_thermal', 'reasons',
+    'lossy', 'active', 'seconds'])
+
+
+def reason_names(mask):
+    """ Returns the names of the throttle reasons in a bit mask """
+    return [name for bit, name in REASONS if mask & bit]
+
+
+def _rate(a, b):
+    # referenceTime is in microseconds, violationTime in nanoseconds
+    if a is None or b is None or b[0] <= a[0]:
+        return None
+    return min(1.0, max(0.0, (b[1] - a[1]) / ((b[0] - a[0]) * 1000)))
+
+
+class _GpuState(object):
+    def __init__(self, uuid, handle):
+        self.uuid = uuid
+        self.handle = handle
+        # (timestamp, reasons, counters) where counters has a
+        # (referenceTime, violationTime) pair or None per policy
+        self.samples = deque()
+        # reason bit -> number of samples in the window it is active in
+        self.counts = dict((bit, 0) for bit, _ in REASONS)
+        self.lossy = 0
+        self.recent = (None,) * len(POLICIES)
+
+    def _count(self, reasons, n):
+        if reasons is None:
+            return
+        for bit in self.counts:
+            if reasons & bit:
+                self.counts[bit] += n
+        if reasons & LOSSY_REASONS:
+            self.lossy += n
+
+    def add(self, sample, cutoff):
+        if self.samples:
+            last = self.samples[-1][2]
+            self.recent = tuple(_rate(a, b) for a, b in zip(last, sample[2]))
+            # A counter went backwards, the driver was reloaded
+            if any(a is not None and b is not None and
+                   (b[0] < a[0] or b[1] < a[1])
+                   for a, b in zip(last, sample[2])):
+                self.clear()
+                self.recent = (None,) * len(POLICIES)
+        self.samples.append(sample)
+        self._count(sample[1], 1)
+        while len(self.samples) > 2 and self.samples[1][0] <= cutoff:
+            self._count(self.samples.popleft()[1], -1)
+
+    def clear(self):
+        self.samples.clear()
+        self.counts = dict((bit, 0) for bit, _ in REASONS)
+        self.lossy = 0
+
+    def stats(self):
+        first, last = self.samples[0], self.samples[-1]
+        window = [_rate(a, b) for a, b in zip(first[2], last[2])]
+        n = len(self.samples)
+        return ThrottleStats(
+            uuid=self.uuid, power=window[0], thermal=window[1],
+            recent_power=self.recent[0], recent_thermal=self.recent[1],
+            reasons=dict((name, self.counts[bit] / n)
+                         for bit, name in REASONS),
+            lossy=self.lossy / n,
+            active=[] if last[1] is None else reason_names(last[1]),
+            seconds=last[0] - first[0])
+
+
+class ThrottleAnalyzer(object):
+    """
+    Keeps a rolling window of the throttling of every gpu.
+
+    NVML must be initialized for as long as the analyzer is used.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to watch. If None, watches all gpus.
+    window : float
+        Seconds of samples to keep.
+    """
+    def __init__(self, devices=None, window=60.0):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.gpus = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.gpus.append(_GpuState(py3nvml.nvmlDeviceGetUUID(handle),
+                                       handle))
+        self.window = window
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def poll(self):
+        """ Takes one sample of every gpu """
+        samples = []
+        for gpu in self.gpus:
+            h = gpu.handle
+            reasons = py3nvml.nvmlDeviceGetCurrentClocksThrottleReasons(
+                h, default=None)
+            counters = []
+            for policy, _ in POLICIES:
+                v = py3nvml.nvmlDeviceGetViolationStatus(h, policy,
+                                                         default=None)
+                counters.append(None if v is None else
+                                (v.referenceTime, v.violationTime))
+            samples.append((time.time(), reasons, tuple(counters)))
+
+        with self.lock:
+            for gpu, sample in zip(self.gpus, samples):
+                gpu.add(sample, sample[0] - self.window)
+
+    def start(self, interval=1.0):
+        """ Polls every interval seconds in a background thread """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                start = time.time()
+                try:
+                    self.poll()
+                except py3nvml.NVMLError as err:
+                    self.logger.warning('Could not sample throttling: '
+                                        '{}'.format(err))
+                self._stop.wait(max(0, interval - (time.time() - start)))
+        self._thread = threading.Thread(target=run, name='ThrottleAnalyzer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread started by :meth:`start` """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns a :data:`ThrottleStats` for every gpu that has been sampled.
+        """
+        with self.lock:
+            return [gpu.stats() for gpu in self.gpus if gpu.samples]
+
+    def throttled(self, threshold=0.05):
+        """
+        Finds the gpus losing throughput to throttling.
+
+        Parameters
+        ----------
+        threshold : float
+            Smallest fraction of the window a gpu must have spent in violation
+            of a policy, or with one of :data:`LOSSY_REASONS` active.
+
+        Returns
+        -------
+        throttled : list of :data:`ThrottleStats`
+            Worst first.
+        """
+        found = []
+        for s in self.stats():
+            worst = max(s.power or 0, s.thermal or 0, s.lossy)
+            if worst >= threshold:
+                found.append((worst, s))
+        found.sort(key=lambda x: x[0], reverse=True)
+        return [s for _, s in found]
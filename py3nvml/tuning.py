@@ -0,0 +1,367 @@
+"""
+Setting applications clocks and power limits on many gpus at once.
+
+A :class:`Profile` is the applications clocks and power limit to run gpus at.
+:class:`Tuner` checks a profile against what each gpu supports before
+changing anything, applies it to all the gpus in parallel, remembers the
+settings it replaced and puts them back on :meth:`Tuner.rollback`, or straight
+away if the profile can't be applied to every gpu. :meth:`Tuner.evaluate`
+measures how a profile changes the work done per watt, using a
+:class:`~py3nvml.snapshot.Sampler`.
+
+Changing settings needs root, or the applications clocks permission (see
+nvmlDeviceSetAPIRestriction).
+
+E.g.
+
+.. code:: python
+
+    from py3nvml.py3nvml import nvmlInit
+    from py3nvml.snapshot import Sampler
+    from py3nvml.tuning import Tuner, Profile
+
+    nvmlInit()
+    tuner = Tuner()
+    profile = Profile(memory_clock=877, graphics_clock=1245,
+                      power_limit=200000)
+    for uuid, (before, after) in tuner.evaluate(
+            profile, Sampler(interval=1), duration=60).items():
+        print(uuid, before.per_watt, after.per_watt)
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from py3nvml import py3nvml
+from py3nvml.clocks import get_clock_table
+
+#: Settings for a gpu. The clocks are in MHz and the power limit in
+#: milliwatts. Settings that are None are left alone. The memory and graphics
+#: clocks must be given together.
+Profile = namedtuple('Profile', ['memory_clock', 'graphics_clock',
+                                 'power_limit'])
+Profile.__new__.__defaults__ = (None, None, None)
+
+#: How much work a gpu did and the power it drew, on average, while measured.
+#: ``power`` is in watts, ``per_watt`` is ``throughput / power``.
+Efficiency = namedtuple('Efficiency', ['throughput', 'power', 'per_watt',
+                                       'samples'])
+
+
+class TuningError(Exception):
+    """
+    Raised when a profile can't be applied.
+
+    Attributes
+    ----------
+    errors : dict
+        Maps the uuid of each gpu that failed to a list of problems.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super(TuningError, self).__init__('; '.join(
+            '{}: {}'.format(uuid, ', '.join(problems))
+            for uuid, problems in sorted(errors.items())))
+
+
+def sm_throughput(snapshot, uuid):
+    """
+    The default measure of work for :meth:`Tuner.evaluate`: the SM clock in
+    MHz times the fraction of time a kernel was running.
+    """
+    clock = snapshot.value(uuid, 'clocks.sm')
+    util = snapshot.value(uuid, 'utilization.gpu')
+    if clock is None or util is None:
+        return None
+    return clock * util / 100
+
+
+class _Gpu(object):
+    def __init__(self, uuid, handle):
+        self.uuid = uuid
+        self.handle = handle
+        self._constraints = None
+
+    def constraints(self):
+        # (power limit constraints, clock table), read once
+        if self._constraints is None:
+            self._constraints = (
+                py3nvml.nvmlDeviceGetPowerManagementLimitConstraints(
+                    self.handle, default=None),
+                get_clock_table(self.handle))
+        return self._constraints
+
+
+class Tuner(object):
+    """
+    Applies profiles to gpus, and undoes them.
+
+    NVML must be initialized for as long as the tuner is used.
+
+    Parameters
+    ----------
+    devices : iterable of int
+        Indices of the gpus to tune. If None, tunes all gpus.
+    workers : int
+        Threads to apply settings with. Defaults to one per gpu.
+    """
+    def __init__(self, devices=None, workers=None):
+        if devices is None:
+            devices = range(py3nvml.nvmlDeviceGetCount())
+        self.gpus = []
+        for i in devices:
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            self.gpus.append(_Gpu(py3nvml.nvmlDeviceGetUUID(handle), handle))
+        self.workers = workers or max(1, len(self.gpus))
+        self.logger = logging.getLogger(__name__)
+        # uuid -> the Profile the gpu had before it was first tuned
+        self.saved = {}
+        # uuids of the gpus this tuner set applications clocks on
+        self.clocks_set = set()
+
+    def _select(self, uuids):
+        if uuids is None:
+            return list(self.gpus)
+        known = dict((g.uuid, g) for g in self.gpus)
+        return [known[u] for u in uuids]
+
+    def _parallel(self, fn, gpus):
+        # Returns (uuid -> what fn returned, uuid -> the exception it raised)
+        with ThreadPoolExecutor(min(self.workers, max(1, len(gpus)))) as pool:
+            futures = [(g.uuid, pool.submit(fn, g)) for g in gpus]
+        results, errors = {}, {}
+        for uuid, f in futures:
+            if f.exception() is None:
+                results[uuid] = f.result()
+            else:
+                errors[uuid] = f.exception()
+        return results, errors
+
+    def current(self, uuid):
+        """ Returns the current settings of a gpu as a :data:`Profile` """
+        h = self._select([uuid])[0].handle
+        return Profile(
+            py3nvml.nvmlDeviceGetApplicationsClock(h, py3nvml.NVML_CLOCK_MEM,
+                                                   default=None),
+            py3nvml.nvmlDeviceGetApplicationsClock(
+                h, py3nvml.NVML_CLOCK_GRAPHICS, default=None),
+            py3nvml.nvmlDeviceGetPowerManagementLimit(h, default=None))
+
+    def check(self, profile, uuids=None):
+        """
+        Checks a profile against what the gpus support.
+
+        Parameters
+        ----------
+        profile : :data:`Profile`
+        uuids : list of str
+            The gpus to check. If None, checks all of them.
+
+        Returns
+        -------
+        problems : dict
+            Maps the uuid of each gpu the profile can't be applied to, to a
+            list of the reasons why. Empty if it can be applied to all.
+        """
+        problems = {}
+        clocks = (profile.memory_clock, profile.graphics_clock)
+        for gpu in self._select(uuids):
+            power, table = gpu.constraints()
+            found = []
+            if (clocks[0] is None) != (clocks[1] is None):
+                found.append('memory and graphics clocks must be set together')
+            elif clocks[0] is not None:
+                if table is None:
+                    found.append('applications clocks are not supported')
+                elif not table.supports(*clocks):
+                    found.append('{} MHz memory, {} MHz graphics is not a '
+                                 'supported pair of clocks'.format(*clocks))
+            if profile.power_limit is not None:
+                if power is None:
+                    found.append('power limits are not supported')
+                elif not power[0] <= profile.power_limit <= power[1]:
+                    found.append('power limit {} mW is outside {}-{} '
+                                 'mW'.format(profile.power_limit, *power))
+            if found:
+                problems[gpu.uuid] = found
+        return problems
+
+    def _set(self, gpu, profile):
+        h = gpu.handle
+        if profile.power_limit is not None:
+            py3nvml.nvmlDeviceSetPowerManagementLimit(h, profile.power_limit)
+        if profile.memory_clock is not None:
+            py3nvml.nvmlDeviceSetApplicationsClocks(
+                h, profile.memory_clock, profile.graphics_clock)
+            self.clocks_set.add(gpu.uuid)
+
+    def apply(self, profile, uuids=None):
+        """
+        Applies a profile to gpus in parallel.
+
+        Nothing is changed unless :meth:`check` passes on every gpu. If
+        setting any gpu fails, all the gpus are put back as they were before the
+        call.
+
+        Parameters
+        ----------
+        profile : :data:`Profile`
+        uuids : list of str
+            The gpus to tune. If None, tunes all of them.
+
+        Raises
+        ------
+        TuningError
+            If the profile can't be applied to all the gpus.
+        """
+        problems = self.check(profile, uuids)
+        if problems:
+            raise TuningError(problems)
+        gpus = self._select(uuids)
+        before, errors = self._parallel(lambda g: self.current(g.uuid), gpus)
+        if errors:
+            raise TuningError(dict((uuid, [str(err)])
+                                   for uuid, err in errors.items()))
+        for g in gpus:
+            self.saved.setdefault(g.uuid, before[g.uuid])
+
+        _, errors = self._parallel(lambda g: self._set(g, profile), gpus)
+        if not errors:
+            return
+        self.logger.warning('Could not apply {}, rolling back'.format(profile))
+        errors = dict((uuid, [str(err)]) for uuid, err in errors.items())
+        _, failed = self._parallel(
+            lambda g: self._restore(g, before[g.uuid]), gpus)
+        for uuid, err in failed.items():
+            errors.setdefault(uuid, []).append('rollback: {}'.format(err))
+        for g in gpus:
+            # Gpus that are back as they were when first tuned are done
+            if g.uuid not in failed and self.saved[g.uuid] == before[g.uuid]:
+                del self.saved[g.uuid]
+                self.clocks_set.discard(g.uuid)
+        raise TuningError(errors)
+
+    def _restore(self, gpu, saved):
+        current = self.current(gpu.uuid)
+        h = gpu.handle
+        # Only write what changed, so gpus that were never set are left be
+        if saved.power_limit not in (None, current.power_limit):
+            py3nvml.nvmlDeviceSetPowerManagementLimit(h, saved.power_limit)
+        if saved.memory_clock is not None and \
+                saved.graphics_clock is not None:
+            if saved[:2] != current[:2]:
+                py3nvml.nvmlDeviceSetApplicationsClocks(
+                    h, saved.memory_clock, saved.graphics_clock)
+        elif gpu.uuid in self.clocks_set:
+            # The clocks were unknown before, so only undo what this set
+            py3nvml.nvmlDeviceResetApplicationsClocks(h)
+
+    def rollback(self, uuids=None):
+        """
+        Puts back the settings the gpus had before they were first tuned.
+
+        Parameters
+        ----------
+        uuids : list of str
+            The gpus to put back. If None, all the tuned gpus.
+
+        Raises
+        ------
+        TuningError
+            If some gpus could not be put back. They stay saved, so the
+            rollback can be tried again.
+        """
+        if uuids is None:
+            uuids = list(self.saved)
+        gpus = self._select([u for u in uuids if u in self.saved])
+        _, errors = self._parallel(
+            lambda g: self._restore(g, self.saved[g.uuid]), gpus)
+        for g in gpus:
+            if g.uuid not in errors:
+                del self.saved[g.uuid]
+                self.clocks_set.discard(g.uuid)
+        if errors:
+            raise TuningError(dict((uuid, [str(err)])
+                                   for uuid, err in errors.items()))
+
+    def measure(self, sampler, duration, throughput=sm_throughput):
+        """
+        Measures the work per watt of the gpus.
+
+        Parameters
+        ----------
+        sampler : :class:`~py3nvml.snapshot.Sampler`
+            Takes the snapshots. Needs the 'power.draw' field, and whatever
+            throughput uses.
+        duration : float
+            Seconds to measure for. At least one snapshot is taken, then one
+            every sampler.interval seconds.
+        throughput : callable
+            throughput(snapshot, uuid) returns how much work the gpu is doing,
+            in any unit, or None if it can't tell.
+
+        Returns
+        -------
+        efficiency : dict
+            Maps uuid to an :data:`Efficiency`.
+        """
+        sums = {}
+        end = time.time() + duration
+        while True:
+            snap = sampler.sample()
+            for uuid in snap.uuids:
+                power = snap.value(uuid, 'power.draw')
+                work = throughput(snap, uuid)
+                if power is None or work is None:
+                    continue
+                s = sums.setdefault(uuid, [0, 0, 0])
+                s[0] += work
+                s[1] += power / 1000
+                s[2] += 1
+            if time.time() + sampler.interval > end:
+                break
+            time.sleep(sampler.interval)
+        result = {}
+        for uuid, (work, power, n) in sums.items():
+            work, power = work / n, power / n
+            result[uuid] = Efficiency(work, power,
+                                      work / power if power else None, n)
+        return result
+
+    def evaluate(self, profile, sampler, duration, throughput=sm_throughput,
+                 keep=False):
+        """
+        Measures the work per watt of the gpus before and after applying a
+        profile.
+
+        Parameters
+        ----------
+        profile : :data:`Profile`
+        sampler : :class:`~py3nvml.snapshot.Sampler`
+            Takes the snapshots of the gpus to tune.
+        duration : float
+            Seconds to measure for, each time.
+        throughput : callable
+            See :meth:`measure`.
+        keep : bool
+            Leave the profile applied. Otherwise the gpus are rolled back.
+
+        Returns
+        -------
+        efficiency : dict
+            Maps uuid to a (before, after) pair of :data:`Efficiency`.
+        """
+        uuids = [u for u, _ in sampler.handles]
+        before = self.measure(sampler, duration, throughput)
+        self.apply(profile, uuids)
+        try:
+            after = self.measure(sampler, duration, throughput)
+        finally:
+            if not keep:
+                self.rollback(uuids)
+        return dict((u, (before.get(u), after.get(u))) for u in uuids)
@@ -1,13 +1,260 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import errno
+import json
 import logging
 import os
+import stat
+import sys
+import tempfile
+import time
 import warnings
 from py3nvml import py3nvml
+from py3nvml.session import get_session
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
-def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0):
+
+def _pid_alive(pid):
+    """ Check whether a process with the given pid still exists """
+    if sys.platform[:3] == "win":
+        # os.kill would terminate the process on Windows. Rely on the lease
+        # expiring instead.
+        return True
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def _default_claims_path():
+    """ The registry file of the user, in a directory only they can write to """
+    if os.environ.get('PY3NVML_CLAIMS'):
+        return os.environ['PY3NVML_CLAIMS']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'],
+                            'py3nvml-gpu-claims.json')
+    if not hasattr(os, 'getuid'):
+        # The temp directory is already per user on Windows
+        return os.path.join(tempfile.gettempdir(), 'py3nvml-gpu-claims.json')
+    directory = os.path.join(tempfile.gettempdir(),
+                             'py3nvml-{}'.format(os.getuid()))
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    # Someone else may have made it first
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or \
+            st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise RuntimeError('{} is not a private directory of this user, '
+                           'set PY3NVML_CLAIMS to the registry file to '
+                           'use'.format(directory))
+    return os.path.join(directory, 'py3nvml-gpu-claims.json')
+
+
+class GpuClaimRegistry(object):
+    """
+    A registry of GPU claims shared by the processes of a user on a node.
+
+    :func:`grab_gpus` on its own only looks at how much memory is in use, so
+    many jobs starting at the same time all see the same free GPUs. Processes
+    that claim their GPUs through a registry instead get disjoint devices, as
+    the check-and-claim step happens atomically under a lock on the registry
+    file.
+
+    Claims are keyed by GPU UUID and belong to a pid. A claim is dropped when
+    its process dies or when its lease (if it has one) expires, so crashed jobs
+    don't hold on to their GPUs.
+
+    Parameters
+    ----------
+    path : str
+        The registry file. Defaults to the PY3NVML_CLAIMS environment variable,
+        or 'py3nvml-gpu-claims.json' in XDG_RUNTIME_DIR or in a private
+        directory of the user in the system temp directory. All processes that
+        should coordinate must use the same path. A new file is only readable
+        and writable by its owner. For the jobs of several users to
+        coordinate, make the file for them beforehand, writable by a group
+        they share, in a directory others can't write to. Anyone who can
+        write to the file can take over or block every gpu.
+    lease : float
+        Default number of seconds a claim lasts. If None, a claim lasts as long
+        as the claiming process.
+    """
+    def __init__(self, path=None, lease=None):
+        if path is None:
+            path = _default_claims_path()
+        self.path = path
+        self.lease = lease
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        return fd
+
+    def _close(self, fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+    def _read(self, fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        if not data:
+            return {}
+        try:
+            claims = json.loads(data.decode('utf-8'))
+        except ValueError:
+            logging.getLogger(__name__).warning(
+                'Ignoring corrupt GPU claim registry {}'.format(self.path))
+            return {}
+
+        # Drop claims from dead processes and expired leases
+        now = time.time()
+        return dict((uuid, c) for uuid, c in claims.items()
+                    if _pid_alive(c['pid']) and
+                    (c['expires'] is None or c['expires'] > now))
+
+    def _write(self, fd, claims):
+        data = json.dumps(claims).encode('utf-8')
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, data)
+
+    def claims(self):
+        """
+        Returns the live claims.
+
+        Returns
+        -------
+        claims : dict
+            Maps GPU UUID to a dict with the claiming 'pid' and the time the
+            claim 'expires' (or None).
+        """
+        fd = self._open()
+        try:
+            return self._read(fd)
+        finally:
+            self._close(fd)
+
+    def claim(self, uuids, num=1, pid=None, lease=None):
+        """
+        Atomically claims up to num of the given GPUs.
+
+        GPUs already claimed by another live process are skipped. GPUs already
+        claimed by pid are claimed again, refreshing their lease.
+
+        Parameters
+        ----------
+        uuids : iterable of str
+            Candidate GPU UUIDs, in order of preference.
+        num : int
+            How many GPUs to claim.
+        pid : int
+            The owner of the claims. Defaults to the calling process.
+        lease : float
+            Seconds the claims last. Defaults to the registry's lease.
+
+        Returns
+        -------
+        claimed : list of str
+            The UUIDs that were claimed. May be shorter than num.
+        """
+        return self._claim(uuids, num, pid, lease)[0]
+
+    def _claim(self, uuids, num=1, pid=None, lease=None):
+        # -> (claimed, new, others): the UUIDs claimed, those of them pid
+        # didn't hold before, and those skipped as another process holds them
+        if pid is None:
+            pid = os.getpid()
+        if lease is None:
+            lease = self.lease
+        expires = None if lease is None else time.time() + lease
+
+        fd = self._open()
+        try:
+            claims = self._read(fd)
+            claimed, new, others = [], [], []
+            for uuid in uuids:
+                if len(claimed) >= num:
+                    break
+                if uuid in claims and claims[uuid]['pid'] != pid:
+                    others.append(uuid)
+                    continue
+                if uuid not in claims:
+                    new.append(uuid)
+                claims[uuid] = {'pid': pid, 'expires': expires}
+                claimed.append(uuid)
+            self._write(fd, claims)
+        finally:
+            self._close(fd)
+        return claimed, new, others
+
+    def release(self, uuids=None, pid=None):
+        """
+        Releases claims held by pid.
+
+        Parameters
+        ----------
+        uuids : iterable of str
+            The GPUs to release. If None, releases all of pid's GPUs.
+        pid : int
+            The owner of the claims. Defaults to the calling process.
+        """
+        if pid is None:
+            pid = os.getpid()
+        fd = self._open()
+        try:
+            claims = self._read(fd)
+            for uuid in list(claims):
+                if claims[uuid]['pid'] == pid and \
+                        (uuids is None or uuid in uuids):
+                    del claims[uuid]
+            self._write(fd, claims)
+        finally:
+            self._close(fd)
+
+
+def _gpu_check(gpu_select, numDevices):
+    """ Flags which gpus the user asked us to consider """
+    if gpu_select is None:
+        gpu_check = [True] * max(numDevices, 8)
+    else:
+        gpu_check = [False] * max(numDevices, 8)
+        try:
+            gpu_check[gpu_select] = True
+        except TypeError:
+            try:
+                for i in gpu_select:
+                    gpu_check[i] = True
+            except:
+                raise ValueError('''Please provide an int or an iterable of ints
+                    for gpu_select''')
+    return gpu_check
+
+
+def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0, claim=False,
+              lease=None):
     """
     Checks for gpu availability and sets CUDA_VISIBLE_DEVICES as such.
 
@@ -15,6 +262,8 @@ def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0):
     limits what GPUS your program can see by altering the CUDA_VISIBLE_DEVICES
     variable. Other programs can still come along and snatch your gpu. This
     function is more about preventing **you** from stealing someone else's GPU.
+    If several jobs may start at the same time, pass claim=True so they
+    coordinate through a :class:`GpuClaimRegistry` and get different GPUs.
 
     If more than 1 GPU is requested but the full amount are available, then it
     will set the CUDA_VISIBLE_DEVICES variable to see all the available GPUs.
@@ -40,6 +289,13 @@ def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0):
         The fractional of a gpu memory that must be free for the script to see
         the gpu as free. Defaults to 1. Useful if someone has grabbed a tiny
         amount of memory on a gpu but isn't using it.
+    claim : bool or :class:`GpuClaimRegistry`
+        If True, claim the gpus in the default registry so that other callers
+        of grab_gpus with claim set don't get the same gpus. Can also be
+        a registry to use instead of the default one.
+    lease : float
+        How many seconds the claims last. If None, they last until this
+        process exits. Ignored if claim is False.
 
     Returns
     -------
@@ -55,77 +311,96 @@ def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0):
         If the gpu_select option was not understood (can fix by leaving this
         field blank, providing an int or an iterable of ints).
     """
+    return _grab_gpus(num_gpus, gpu_select, gpu_fraction, claim, lease)[0]
+
+
+def _grab_gpus(num_gpus, gpu_select, gpu_fraction, claim, lease):
+    # -> (number of gpus grabbed, UUIDs of the gpus newly claimed)
     # Set the visible devices to blank.
     os.environ['CUDA_VISIBLE_DEVICES'] = ""
 
     if num_gpus == 0:
-        return 0
+        return 0, []
 
     # Try connect with NVIDIA drivers
     logger = logging.getLogger(__name__)
+    session = get_session()
     try:
-        py3nvml.nvmlInit()
+        session.acquire()
     except:
         str_ = """Couldn't connect to nvml drivers. Check they are installed correctly.
                   Proceeding on cpu only..."""
         warnings.warn(str_, RuntimeWarning)
         logger.warn(str_)
-        return 0
+        return 0, []
 
-    numDevices = py3nvml.nvmlDeviceGetCount()
-    gpu_free = [False]*numDevices
+    new = []
+    try:
+        numDevices = py3nvml.nvmlDeviceGetCount()
+        gpu_free = [False]*numDevices
 
-    # Flag which gpus we can check
-    if gpu_select is None:
-        gpu_check = [True] * 8
-    else:
-        gpu_check = [False] * 8
-        try:
-            gpu_check[gpu_select] = True
-        except TypeError:
-            try:
-                for i in gpu_select:
-                    gpu_check[i] = True
-            except:
-                raise ValueError('''Please provide an int or an iterable of ints
-                    for gpu_select''')
+        # Flag which gpus we can check
+        gpu_check = _gpu_check(gpu_select, numDevices)
 
-    # Print out GPU device info. Useful for debugging.
-    for i in range(numDevices):
-        # If the gpu was specified, examine it
-        if not gpu_check[i]:
-            continue
+        # Print out GPU device info. Useful for debugging.
+        for i in range(numDevices):
+            # If the gpu was specified, examine it
+            if not gpu_check[i]:
+                continue
 
-        handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
-        info = py3nvml.nvmlDeviceGetMemoryInfo(handle)
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            info = py3nvml.nvmlDeviceGetMemoryInfo(handle)
 
-        str_ = "GPU {}:\t".format(i) + \
-               "Used Mem: {:>6}MB\t".format(info.used/(1024*1024)) + \
-               "Total Mem: {:>6}MB".format(info.total/(1024*1024))
-        logger.debug(str_)
+            str_ = "GPU {}:\t".format(i) + \
+                   "Used Mem: {:>6}MB\t".format(info.used/(1024*1024)) + \
+                   "Total Mem: {:>6}MB".format(info.total/(1024*1024))
+            logger.debug(str_)
 
-    # Now check if any devices are suitable
-    for i in range(numDevices):
-        # If the gpu was specified, examine it
-        if not gpu_check[i]:
-            continue
+        # Now check if any devices are suitable
+        for i in range(numDevices):
+            # If the gpu was specified, examine it
+            if not gpu_check[i]:
+                continue
 
-        handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
-        info = py3nvml.nvmlDeviceGetMemoryInfo(handle)
+            handle = py3nvml.nvmlDeviceGetHandleByIndex(i)
+            info = py3nvml.nvmlDeviceGetMemoryInfo(handle)
 
-        # Sometimes GPU has a few MB used when it is actually free
-        if (info.free+10)/info.total >= gpu_fraction:
-            gpu_free[i] = True
-        else:
-            logger.info('GPU {} has processes on it. Skipping.'.format(i))
+            # Sometimes GPU has a few MB used when it is actually free
+            if (info.free+10)/info.total >= gpu_fraction:
+                gpu_free[i] = True
+            else:
+                logger.info('GPU {} has processes on it. Skipping.'.format(i))
 
-    py3nvml.nvmlShutdown()
+        if claim:
+            registry = claim if isinstance(claim, GpuClaimRegistry) else \
+                GpuClaimRegistry()
+            uuids = dict((py3nvml.nvmlDeviceGetUUID(
+                py3nvml.nvmlDeviceGetHandleByIndex(i)), i)
+                for i, x in enumerate(gpu_free) if x)
+            claimed, new, others = registry._claim(
+                [u for u, i in sorted(uuids.items(), key=lambda x: x[1])],
+                num_gpus, lease=lease)
+            for u in others:
+                logger.info('GPU {} is claimed by another process. '
+                            'Skipping.'.format(uuids[u]))
+            # Only the claimed gpus may be used
+            claimed = set(uuids[u] for u in claimed)
+            for i in uuids.values():
+                if i not in claimed:
+                    gpu_free[i] = False
+    except BaseException:
+        # Don't hold on to gpus that won't be used
+        if new:
+            registry.release(new)
+        raise
+    finally:
+        session.release()
 
     # Now check whether we can create the session
     if sum(gpu_free) == 0:
         warnings.warn("Could not find enough GPUs for your job", RuntimeWarning)
         logger.warn(str_)
-        return 0
+        return 0, new
     else:
         if sum(gpu_free) >= num_gpus:
             # only use the first num_gpus gpus. Hide the rest from greedy
@@ -135,7 +410,7 @@ def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0):
             logger.debug('{} Gpus found free'.format(sum(gpu_free)))
             logger.info('Using {}'.format(use_gpus))
             os.environ['CUDA_VISIBLE_DEVICES'] = use_gpus
-            return num_gpus
+            return num_gpus, new
         else:
             # use everything we can.
             s = "Only {} GPUs found but {}".format(sum(gpu_free), num_gpus) + \
@@ -147,4 +422,159 @@ def grab_gpus(num_gpus=1, gpu_select=None, gpu_fraction=1.0):
             logger.debug('{} Gpus found free'.format(sum(gpu_free)))
             logger.info('Using {}'.format(use_gpus))
             os.environ['CUDA_VISIBLE_DEVICES'] = use_gpus
-            return sum(gpu_free)
+            return sum(gpu_free), new
+
+
+def wait_for_gpus(num_gpus=1, timeout=None, gpu_fraction=1.0, gpu_select=None,
+                  claim=False, lease=None, min_interval=0.1, max_interval=5.0):
+    """
+    Waits until enough gpus are free, then grabs them like :func:`grab_gpus`.
+
+    Use this instead of calling grab_gpus in a loop with a sleep. The gpus are
+    watched from a single NVML session. Where the devices support them, NVML
+    performance state and clock events wake the wait up as soon as a gpu
+    changes state (e.g. a job finishes). Memory and process changes don't
+    raise events, so the gpus are also polled, starting every min_interval
+    seconds and backing off to every max_interval seconds while nothing
+    changes.
+
+    Parameters
+    ----------
+    num_gpus : int
+        How many gpus your job needs.
+    timeout : float
+        Give up after this many seconds and grab whatever is free. If None,
+        wait forever.
+    gpu_fraction : float
+        The fraction of a gpu's memory that must be free for it to count as
+        free. See :func:`grab_gpus`.
+    gpu_select : iterable
+        A single int or an iterable of ints indicating gpu numbers to search
+        through. If left blank, will search through all gpus.
+    claim : bool or :class:`GpuClaimRegistry`
+        Claim the gpus so that other waiting jobs don't get the same ones, and
+        count gpus claimed by other processes as busy. See :func:`grab_gpus`.
+    lease : float
+        How many seconds the claims last. If None, they last until this
+        process exits.
+    min_interval : float
+        Shortest time in seconds between two polls.
+    max_interval : float
+        Longest time in seconds between two polls.
+
+    Returns
+    -------
+    success : int
+        Number of gpus 'grabbed'. Less than num_gpus only if the wait timed
+        out.
+
+    Raises
+    ------
+    RuntimeWarning
+        If couldn't connect with NVIDIA drivers.
+        If the wait timed out with fewer than num_gpus gpus free.
+    ValueError
+        If the gpu_select option was not understood.
+    """
+    if num_gpus == 0:
+        return grab_gpus(0)
+
+    if claim is True:
+        claim = GpuClaimRegistry()
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        if not _wait_until_free(num_gpus, deadline, gpu_fraction, gpu_select,
+                                claim, min_interval, max_interval):
+            # No NVML to wait with
+            return grab_gpus(num_gpus, gpu_select, gpu_fraction, claim, lease)
+        n, new = _grab_gpus(num_gpus, gpu_select, gpu_fraction, claim, lease)
+        if n >= num_gpus or (deadline is not None and time.time() >= deadline):
+            return n
+        # Someone else got in first. Let go of what this call claimed and
+        # keep waiting.
+        if claim and new:
+            claim.release(new)
+
+
+def _wait_until_free(num_gpus, deadline, gpu_fraction, gpu_select, claim,
+                     min_interval, max_interval):
+    # Returns once num_gpus gpus are free or the deadline passed, or False
+    # straight away if NVML can't be initialized
+    logger = logging.getLogger(__name__)
+    session = get_session()
+    try:
+        session.acquire()
+    except py3nvml.NVMLError:
+        return False
+
+    eventSet = None
+    try:
+        numDevices = py3nvml.nvmlDeviceGetCount()
+        gpu_check = _gpu_check(gpu_select, numDevices)
+        handles = [py3nvml.nvmlDeviceGetHandleByIndex(i)
+                   for i in range(numDevices) if gpu_check[i]]
+        uuids = [py3nvml.nvmlDeviceGetUUID(h) for h in handles] if claim \
+            else []
+
+        # Ask to be woken up on events that go with a gpu becoming idle
+        eventTypes = py3nvml.nvmlEventTypePState | py3nvml.nvmlEventTypeClock
+        registered = 0
+        try:
+            eventSet = py3nvml.nvmlEventSetCreate()
+            for h in handles:
+                try:
+                    supported = py3nvml.nvmlDeviceGetSupportedEventTypes(h)
+                    if supported & eventTypes:
+                        py3nvml.nvmlDeviceRegisterEvents(
+                            h, supported & eventTypes, eventSet)
+                        registered += 1
+                except py3nvml.NVMLError:
+                    pass
+        except py3nvml.NVMLError:
+            eventSet = None
+        logger.debug('Watching events on {} of {} gpus'.format(
+            registered, len(handles)))
+
+        interval = min_interval
+        last_used = None
+        while True:
+            used = []
+            num_free = 0
+            if claim:
+                others = set(u for u, c in claim.claims().items()
+                             if c['pid'] != os.getpid())
+            for j, h in enumerate(handles):
+                info = py3nvml.nvmlDeviceGetMemoryInfo(h)
+                used.append(info.used)
+                if (info.free+10)/info.total >= gpu_fraction and \
+                        not (claim and uuids[j] in others):
+                    num_free += 1
+
+            if num_free >= num_gpus:
+                break
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                break
+
+            # Poll quickly while things are changing, back off otherwise
+            if used != last_used:
+                interval = min_interval
+            else:
+                interval = min(interval * 2, max_interval)
+            last_used = used
+            wait = interval if deadline is None else \
+                min(interval, deadline - now)
+
+            if registered:
+                try:
+                    py3nvml.nvmlEventSetWait(eventSet, int(wait * 1000))
+                    interval = min_interval
+                except py3nvml.NVMLError_Timeout:
+                    pass
+            else:
+                time.sleep(wait)
+    finally:
+        if eventSet is not None:
+            py3nvml.nvmlEventSetFree(eventSet)
+        session.release()
+    return True
@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.accounting import AccountingCollector
+
+
+def test_accounting_collector():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        dev = sim.devices[0]
+        for pid in range(100, 110):
+            dev.account(pid, time=pid, isRunning=0)
+        dev.account(200, isRunning=1)
+
+        collector = AccountingCollector()
+        records = collector.poll()
+        assert sorted(r.pid for r in records) == list(range(100, 110))
+        assert all(r.complete for r in records)
+        assert list(collector.running()) == [(dev.uuid, 200)]
+
+        # Nothing changed, so only the running process gets looked at
+        calls = sim.calls
+        assert collector.poll() == []
+        # 2 devices * get pids + 1 running process
+        assert sim.calls - calls == 3
+
+        dev.account(200, isRunning=0, time=5)
+        records = collector.poll()
+        assert [(r.pid, r.time) for r in records] == [(200, 5)]
+        assert collector.poll() == []
+        nvmlShutdown()
+
+
+def test_accounting_collector_buffer_grows():
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        dev = sim.devices[0]
+        dev.accounting_buffer_size = 2
+        collector = AccountingCollector()
+        dev.account(1, isRunning=0)
+        assert len(collector.poll()) == 1
+        dev.accounting_buffer_size = 4
+        dev.account(2, isRunning=0)
+        dev.account(3, isRunning=0)
+        assert sorted(r.pid for r in collector.poll()) == [2, 3]
+        nvmlShutdown()
+
+
+def test_accounting_collector_pid_reused():
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        dev = sim.devices[0]
+        dev.account(100, isRunning=0, time=1, startTime=1000)
+        collector = AccountingCollector()
+        assert [r.time for r in collector.poll()] == [1]
+
+        # A new process gets the same pid while the old one is still in the
+        # driver's buffer
+        dev.account(100, isRunning=1, startTime=2000)
+        assert collector.poll() == []
+        assert list(collector.running()) == [(dev.uuid, 100)]
+        dev.account(100, isRunning=0, time=2)
+        records = collector.poll()
+        assert [(r.pid, r.time, r.startTime) for r in records] == \
+            [(100, 2, 2000)]
+        assert collector.poll() == []
+
+        # and again, finishing before the collector sees it run
+        dev.account(100, isRunning=0, time=3, startTime=3000)
+        assert [r.time for r in collector.poll()] == [3]
+        nvmlShutdown()
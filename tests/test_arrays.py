@@ -0,0 +1,114 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceGetComputeRunningProcesses,
+                             nvmlDeviceGetAccountingPids,
+                             nvmlDeviceGetRetiredPages,
+                             nvmlDeviceGetSamples,
+                             nvmlDeviceGetSupportedMemoryClocks,
+                             c_uint, c_nvmlDevice_t, c_nvmlSample_t,
+                             nvmlStructArrayToNumpy, nvmlSamplesToNumpy,
+                             NVML_TOTAL_POWER_SAMPLES,
+                             NVML_GPU_UTILIZATION_SAMPLES,
+                             NVML_MEMORY_UTILIZATION_SAMPLES,
+                             NVML_VALUE_TYPE_DOUBLE,
+                             NVML_VALUE_TYPE_UNSIGNED_INT,
+                             NVML_VALUE_TYPE_UNSIGNED_LONG_LONG)
+from py3nvml.simulated import SimulatedNvml
+
+np = pytest.importorskip('numpy')
+
+
+def test_struct_array_to_numpy():
+    values = (c_uint * 4)(1, 2, 3, 4)
+    a = nvmlStructArrayToNumpy(values, 3)
+    assert a.tolist() == [1, 2, 3]
+    # A view, not a copy
+    values[0] = 7
+    assert a[0] == 7
+    assert nvmlStructArrayToNumpy((c_nvmlDevice_t * 2)()).dtype == np.uintp
+
+
+def test_as_array():
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        d = sim.devices[0]
+        h = nvmlDeviceGetHandleByIndex(0)
+
+        procs = nvmlDeviceGetComputeRunningProcesses(h, as_array=True)
+        assert len(procs) == 0
+        d.add_process(10, 100)
+        d.add_process(11, 500)
+        procs = nvmlDeviceGetComputeRunningProcesses(h, as_array=True)
+        assert procs['pid'].tolist() == [10, 11]
+        assert procs['usedGpuMemory'].sum() == 600
+        assert [p.pid for p in nvmlDeviceGetComputeRunningProcesses(h)] == \
+            procs['pid'].tolist()
+
+        d.account(10)
+        d.account(12)
+        pids = nvmlDeviceGetAccountingPids(h, as_array=True)
+        assert pids.tolist() == nvmlDeviceGetAccountingPids(h) == [10, 12]
+
+        d.retired_pages[0] = [0x1000, 0x2000]
+        pages = nvmlDeviceGetRetiredPages(h, 0, as_array=True)
+        assert pages.dtype == np.uint64
+        assert pages.tolist() == [0x1000, 0x2000]
+
+        d.add_samples(NVML_TOTAL_POWER_SAMPLES, [(1, 100), (2, 200), (3, 300)])
+        value_type, samples = nvmlDeviceGetSamples(
+            h, NVML_TOTAL_POWER_SAMPLES, 1, as_array=True)
+        assert value_type == NVML_VALUE_TYPE_UNSIGNED_INT
+        assert samples['timeStamp'].tolist() == [2, 3]
+        assert samples['sampleValue']['uiVal'].tolist() == [200, 300]
+
+        clocks = nvmlDeviceGetSupportedMemoryClocks(h, as_array=True)
+        assert clocks.tolist() == nvmlDeviceGetSupportedMemoryClocks(h)
+        nvmlShutdown()
+
+
+def test_decode_samples():
+    samples = (c_nvmlSample_t * 3)()
+    for i, v in enumerate([0.5, -2.25, 1e300]):
+        samples[i].timeStamp = 10 + i
+        samples[i].sampleValue.dVal = v
+    stamps, values = nvmlSamplesToNumpy(NVML_VALUE_TYPE_DOUBLE, samples, 2)
+    assert stamps.dtype == np.uint64 and values.dtype == np.float64
+    assert stamps.tolist() == [10, 11]
+    assert values.tolist() == [0.5, -2.25]
+    with pytest.raises(ValueError):
+        nvmlSamplesToNumpy(7, samples)
+
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        d = sim.devices[0]
+        h = nvmlDeviceGetHandleByIndex(0)
+        # Too big for a double
+        big = (1 << 64) - 1
+        d.add_samples(NVML_TOTAL_POWER_SAMPLES, [(1, 100), (2, 4000000000)])
+        d.add_samples(NVML_GPU_UTILIZATION_SAMPLES, [(1, big), (2, 3)],
+                      NVML_VALUE_TYPE_UNSIGNED_LONG_LONG)
+        d.add_samples(NVML_MEMORY_UTILIZATION_SAMPLES, [(5, 0.75)],
+                      NVML_VALUE_TYPE_DOUBLE)
+
+        stamps, values = nvmlDeviceGetSamples(h, NVML_TOTAL_POWER_SAMPLES, 0,
+                                              decode=True)
+        assert values.dtype == np.uint32
+        assert values.tolist() == [100, 4000000000]
+        stamps, values = nvmlDeviceGetSamples(
+            h, NVML_GPU_UTILIZATION_SAMPLES, 0, decode=True)
+        assert values.dtype == np.uint64
+        assert values.tolist() == [big, 3]
+        stamps, values = nvmlDeviceGetSamples(
+            h, NVML_MEMORY_UTILIZATION_SAMPLES, 0, decode=True)
+        assert stamps.tolist() == [5] and values.tolist() == [0.75]
+
+        # The same values as reading the union one sample at a time
+        _, samples = nvmlDeviceGetSamples(h, NVML_GPU_UTILIZATION_SAMPLES, 0)
+        assert [s.sampleValue.ullVal for s in samples] == [big, 3]
+        nvmlShutdown()
@@ -0,0 +1,80 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.cgroups import CgroupAttributor
+
+A = 'a' * 64
+B = 'b' * 64
+
+
+def make_process(proc, pid, cgroup, start_time=100):
+    d = proc.join(str(pid))
+    d.ensure(dir=True)
+    d.join('stat').write('{} (x) S 1 1 1 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 '
+                         '{} 0 0\n'.format(pid, start_time))
+    d.join('cgroup').write('0::{}\n'.format(cgroup))
+
+
+def test_cgroup_attributor(tmpdir):
+    proc = tmpdir.mkdir('proc')
+    make_process(proc, 10, '/docker/' + A)
+    make_process(proc, 11, '/docker/' + A)
+    make_process(proc, 12, '/kubepods/pod1/' + B)
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        d0, d1 = sim.devices
+        d0.add_process(10, 100)
+        d1.add_process(10, 200)
+        d1.add_process(11, 50)
+        d0.add_process(12, 400)
+        d0.account(12, time=1000, isRunning=1)
+        # Finished before the attributor started
+        d1.account(99, time=7, isRunning=0)
+
+        attributor = CgroupAttributor(proc=str(proc))
+        usage = attributor.poll()
+        a = usage['/docker/' + A]
+        assert a.container == A and a.pids == (10, 11)
+        assert a.memory == 350 and a.gpus == {d0.uuid: 100, d1.uuid: 250}
+        b = usage['/kubepods/pod1/' + B]
+        assert b.memory == 400 and b.gpu_time == 1000 and b.finished == 0
+        assert usage[None].gpu_time == 7
+
+        # The process ends and its /proc entry goes, but it is still billed
+        d0.remove_process(12)
+        d0.account(12, time=1500, isRunning=0)
+        proc.join('12').remove()
+        b = attributor.poll()['/kubepods/pod1/' + B]
+        assert b.pids == () and b.memory == 0
+        assert b.gpu_time == 1500 and b.finished == 1
+
+        # Only new pids are looked up in /proc
+        proc.join('10').remove()
+        make_process(proc, 13, '/docker/' + A + '/child')
+        d1.add_process(13, 1)
+        assert attributor.poll()['/docker/' + A].memory == 350
+        containers = attributor.containers()
+        assert containers[A].memory == 351 and containers[A].pids == \
+            (10, 11, 13)
+        assert set(containers) == set([A, B])
+        nvmlShutdown()
+
+
+def test_cgroup_attributor_pid_reused(tmpdir):
+    proc = tmpdir.mkdir('proc')
+    make_process(proc, 10, '/docker/' + A)
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        sim.devices[0].add_process(10, 100)
+        attributor = CgroupAttributor(proc=str(proc), accounting=False)
+        assert attributor.poll()['/docker/' + A].memory == 100
+
+        # Between polls the process ends and another tenant's gets its pid
+        make_process(proc, 10, '/docker/' + B, start_time=200)
+        usage = attributor.poll()
+        assert '/docker/' + A not in usage
+        assert usage['/docker/' + B].pids == (10,)
+        nvmlShutdown()
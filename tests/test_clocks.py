@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             nvmlDeviceGetHandleByIndex,
+                             nvmlDeviceGetSupportedClocks)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.clocks import ClockTable, get_clock_table
+
+
+def test_clock_table():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        sim.devices[1].unsupported.add('nvmlDeviceGetSupportedMemoryClocks')
+        h0 = nvmlDeviceGetHandleByIndex(0)
+        assert dict(nvmlDeviceGetSupportedClocks(h0)) == \
+            sim.devices[0].supported_clocks
+        # memory clocks, then one call per memory clock
+        calls = sim.calls
+        table = ClockTable.from_device(h0)
+        assert sim.calls - calls == 4
+        assert ClockTable.from_device(nvmlDeviceGetHandleByIndex(1)) is None
+
+        assert get_clock_table(h0) is get_clock_table(h0)
+        nvmlShutdown()
+
+    assert list(table.memory) == [2505, 405]
+    assert table.width == 6
+    assert table.max_memory() == 2505
+    assert table.max_graphics(2505) == 1480
+    assert table.min_graphics(2505) == 1100
+    assert table.max_graphics(405) == 405
+    assert table.nearest_graphics(2505, 1300) == 1252
+    assert table.nearest_graphics(2505, 1000) == 1100
+    assert table.nearest_memory(3000) == 2505
+    assert table.nearest_memory(1000) == 405
+    assert table.supports(2505, 1328)
+    assert not table.supports(2505, 1329) and not table.supports(800, 405)
+    assert len(table.pairs()) == 7
+    assert table.as_dict() == sim.devices[0].supported_clocks
+    with pytest.raises(KeyError):
+        table.max_graphics(800)
+
+
+def test_clock_table_array():
+    np = pytest.importorskip('numpy')
+    table = ClockTable({877: [1380, 1300], 810: [1000]})
+    np.testing.assert_array_equal(table.as_array(),
+                                  [[1300, 1380], [1000, 0]])
+
+
+def test_clock_table_empty():
+    table = ClockTable({810: []})
+    assert ClockTable([]).max_memory() is None
+    assert ClockTable([]).nearest_memory(1000) is None
+    assert table.max_memory() == 810 and not table.graphics_clocks(810)
+    for lookup in (table.max_graphics, table.min_graphics):
+        with pytest.raises(KeyError):
+            lookup(810)
+    with pytest.raises(KeyError):
+        table.nearest_graphics(810, 1000)
+
+
+def test_xml_query_supported_clocks_error():
+    from py3nvml.py3nvml import NVML_ERROR_UNKNOWN
+    from py3nvml.nvidia_smi import XmlDeviceQuery
+    with SimulatedNvml(1) as sim:
+        query = sim.nvmlDeviceGetSupportedGraphicsClocks
+
+        def failing(handle, memoryClockMHz, c_count, c_clocks):
+            if memoryClockMHz.value == 405:
+                return NVML_ERROR_UNKNOWN
+            return query(handle, memoryClockMHz, c_count, c_clocks)
+        sim.nvmlDeviceGetSupportedGraphicsClocks = failing
+        xml = XmlDeviceQuery()
+        # Only the clock that failed loses its entry
+        assert '<supported_graphics_clock>1480 MHz' in xml
+        assert '<value>405 MHz</value>\n        <supported_graphics_clock>' \
+            'Unknown Error</supported_graphics_clock>' in xml
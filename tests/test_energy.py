@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             NVML_TOTAL_POWER_SAMPLES,
+                             NVML_VALUE_TYPE_DOUBLE)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.energy import EnergyMeter, integrate, _GpuMeter
+
+
+def _us(t):
+    return int(t * 10 ** 6)
+
+
+def test_integrate():
+    assert list(integrate([0, 1, 3], [100, 200, 200], 5)) == [5, 155, 555]
+    assert list(integrate([], [])) == []
+
+
+def test_energy_meter():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        d0, d1 = sim.devices
+        meter = EnergyMeter()
+        now = time.time()
+        # 100 W for 2s, then a ramp up to 300 W over 1s
+        d0.add_samples(NVML_TOTAL_POWER_SAMPLES,
+                       [(_us(now - 3 + i * 0.5), 100000) for i in range(5)] +
+                       [(_us(now), 300000)])
+        meter.poll()
+        assert abs(meter.energy([d0.uuid])[d0.uuid] - 400) < 1e-6
+        joules = meter.energy([d0.uuid], now - 2.5, now - 1.5)
+        assert abs(joules[d0.uuid] - 100) < 1e-6
+
+        # Only the new samples are read, in double precision this time
+        calls = sim.calls
+        d0.samples.clear()
+        d0.add_samples(NVML_TOTAL_POWER_SAMPLES,
+                       [(_us(now), 300000.0), (_us(now + 1), 300000.0)],
+                       NVML_VALUE_TYPE_DOUBLE)
+        meter.poll()
+        assert abs(meter.energy([d0.uuid])[d0.uuid] - 700) < 1e-6
+        # d1 has no sample buffer, so its power usage is read instead
+        assert sim.calls - calls == 3
+        d1.power_usage = 50000
+        meter.poll()
+        assert len(meter.gpus[1].times) == 3
+        nvmlShutdown()
+
+
+def test_job_energy():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        d0, d1 = sim.devices
+        for d in sim.devices:
+            d.add_samples(NVML_TOTAL_POWER_SAMPLES,
+                          [(_us(time.time() - 1), 200000)])
+        meter = EnergyMeter()
+        meter.begin('job', [d0.uuid])
+        time.sleep(0.01)
+        for d in sim.devices:
+            d.add_samples(NVML_TOTAL_POWER_SAMPLES,
+                          [(_us(time.time() + 1), 200000)])
+        job = meter.end('job')
+        assert list(job.joules) == [d0.uuid]
+        assert abs(job.total - 200 * (job.end - job.start)) < 1e-6
+        assert job.total > 0
+        nvmlShutdown()
+
+
+def test_energy_meter_ordered():
+    gpu = _GpuMeter('GPU-0', None)
+    gpu.add([1, 2], [100, 100])
+    # Samples a concurrent poll read late don't go back in time
+    gpu.add([0.5, 1.5], [300, 300])
+    gpu.add([2, 3], [100, 300])
+    assert list(gpu.times) == [1, 2, 3] and list(gpu.energy) == [0, 100, 300]
+
+    with SimulatedNvml(1):
+        nvmlInit()
+        meter = EnergyMeter()
+        read = meter._read
+        held = []
+
+        def reading(g):
+            # Nobody can poll between reading samples and adding them
+            held.append(meter._poll_lock.locked())
+            return read(g)
+        meter._read = reading
+        meter.poll()
+        assert held == [True]
+        nvmlShutdown()
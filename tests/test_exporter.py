@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from urllib.request import urlopen
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.exporter import MetricsExporter, CONTENT_TYPE
+
+
+def test_metrics_exporter():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        sim.devices[0].add_process(100, 1 << 20)
+        sim.devices[1].unsupported.add('nvmlDeviceGetPowerUsage')
+        exporter = MetricsExporter(interval=60)
+        host, port = exporter.start(port=0, addr='127.0.0.1')
+        try:
+            calls = sim.calls
+            resp = urlopen('http://127.0.0.1:{}/metrics'.format(port))
+            assert resp.headers['Content-Type'] == CONTENT_TYPE
+            body = resp.read().decode('utf-8')
+            # served from the last snapshot
+            assert sim.calls == calls
+        finally:
+            exporter.stop()
+        nvmlShutdown()
+
+    labels = 'gpu="0",uuid="{}",name="Simulated GPU"'.format(
+        sim.devices[0].uuid)
+    lines = body.splitlines()
+    assert 'nvml_power_draw_watts{{{}}} 50.0'.format(labels) in lines
+    assert len([l for l in lines if l.startswith('nvml_power_draw')]) == 1
+    assert 'nvml_clock_hertz{{{},clock="sm"}} 1100000000.0'.format(
+        labels) in lines
+    assert 'nvml_process_used_memory_bytes{{{},pid="100"}} 1048576'.format(
+        labels) in lines
+    assert lines.count('# TYPE nvml_clock_hertz gauge') == 1
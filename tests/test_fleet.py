@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import socket
+import tempfile
+import time
+
+import pytest
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml, SimulatedDevice
+from py3nvml.snapshot import Sampler
+from py3nvml.fleet import Agent, Collector, KEYFRAME, DELTA
+
+
+def _wait_for(fn, timeout=5):
+    end = time.time() + timeout
+    while not fn():
+        if time.time() > end:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+def _run_fleet(address):
+    devices = [SimulatedDevice(0, total_memory=80 << 30),
+               SimulatedDevice(1, total_memory=80 << 30),
+               SimulatedDevice(2, total_memory=16 << 30)]
+    with SimulatedNvml(devices=devices) as sim:
+        nvmlInit()
+        sampler = Sampler()
+        collector = Collector(address)
+        address = collector.start()
+        agents = [Agent(address, host='node{}'.format(i), keyframe_interval=2)
+                  for i in range(4)]
+        try:
+            snap = sampler.sample()
+            for a in agents:
+                assert a.send(snap)
+            _wait_for(lambda: len(collector.hosts()) == 4)
+            free = collector.free_gpus(min_free=40 << 30)
+            assert len(free) == 8
+            assert set(f[1] for f in free) == set(d.uuid for d in devices[:2])
+
+            # Only node0 sees a job start on its first gpu
+            sim.devices[0].add_process(100, 60 << 30)
+            busy = sampler.sample()
+            assert agents[0].encode(busy)[0] == DELTA
+            assert agents[0].send(busy)
+            _wait_for(lambda: collector.snapshot('node0') == busy)
+            free = collector.free_gpus(min_free=40 << 30)
+            assert ('node0', devices[0].uuid) not in [f[:2] for f in free]
+            assert len(free) == 7
+            assert collector.gpus()[0][2]['memory.total'] == 80 << 30
+
+            # Deltas are rebuilt into the same snapshot as the agent's
+            sim.devices[0].remove_process(100)
+            sim.devices[1].power_usage = 250000
+            quiet = sampler.sample()
+            assert agents[0].send(quiet)
+            _wait_for(lambda: collector.snapshot('node0') == quiet)
+            assert agents[0].encode(quiet)[0] == KEYFRAME
+
+            # Hosts that stopped reporting are left out
+            time.sleep(0.2)
+            assert agents[1].send(quiet)
+            _wait_for(lambda: collector.hosts()['node1'] < 0.1)
+            assert set(f[0] for f in collector.free_gpus(max_age=0.1)) == \
+                set(['node1'])
+        finally:
+            for a in agents:
+                a.close()
+            collector.stop()
+        nvmlShutdown()
+
+
+def test_fleet_tcp():
+    _run_fleet(('127.0.0.1', 0))
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                    reason='needs Unix sockets')
+def test_fleet_unix():
+    path = os.path.join(tempfile.mkdtemp(), 'collector.sock')
+    _run_fleet(path)
+    assert not os.path.exists(path)
+
+
+def test_agent_reconnects():
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        snap = Sampler().sample()
+        agent = Agent(('127.0.0.1', 1), host='node0', timeout=1)
+        assert not agent.send(snap)
+        collector = Collector(('127.0.0.1', 0))
+        agent.address = collector.start()
+        try:
+            assert agent.send(snap)
+            _wait_for(lambda: collector.hosts())
+            assert collector.snapshot('node0') == snap
+        finally:
+            agent.close()
+            collector.stop()
+        nvmlShutdown()
+
+
+def test_collector_rejects_bad_messages():
+    import struct
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        sampler = Sampler()
+        snap = sampler.sample()
+        agent = Agent(('127.0.0.1', 1), host='node0')
+        keyframe = agent.encode(snap)
+        agent._last = snap
+        sim.devices[0].power_usage += 1000
+        delta = bytearray(agent.encode(sampler.sample()))
+        nvmlShutdown()
+
+    collector = Collector(('127.0.0.1', 0), takeover_after=0.2)
+    with pytest.raises(ValueError):
+        collector.apply(bytes(delta), None, '10.0.0.1')
+    assert collector.apply(keyframe, None, '10.0.0.1') == 'node0'
+    # A change to a value that doesn't exist
+    struct.pack_into('<I', delta, 13, 1 << 20)
+    with pytest.raises(ValueError):
+        collector.apply(bytes(delta), 'node0', '10.0.0.1')
+
+    # Another address can't send for node0 while it is alive
+    with pytest.raises(ValueError):
+        collector.apply(keyframe, None, '10.0.0.2')
+    time.sleep(0.2)
+    assert collector.apply(keyframe, None, '10.0.0.2') == 'node0'
+
+    # Frames that are too big close the connection unread
+    collector.max_message_size = 1 << 10
+    address = collector.start()
+    try:
+        sock = socket.create_connection(address)
+        sock.sendall(struct.pack('<I', 1 << 30))
+        sock.settimeout(5)
+        assert sock.recv(1) == b''
+        sock.close()
+    finally:
+        collector.stop()
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             NVML_MEMORY_ERROR_TYPE_UNCORRECTED,
+                             NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                             NVML_VOLATILE_ECC, NVML_AGGREGATE_ECC,
+                             NVML_MEMORY_LOCATION_DEVICE_MEMORY,
+                             NVML_PAGE_RETIREMENT_CAUSE_DOUBLE_BIT_ECC_ERROR)
+from py3nvml.simulated import SimulatedNvml, GEFORCE_UNSUPPORTED
+from py3nvml.health import HealthScanner
+
+
+def test_health_scanner():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        d0, d1 = sim.devices
+        d1.unsupported.update(GEFORCE_UNSUPPORTED)
+        d0.ecc_errors[(NVML_MEMORY_ERROR_TYPE_CORRECTED, NVML_AGGREGATE_ECC,
+                       NVML_MEMORY_LOCATION_DEVICE_MEMORY)] = 2
+        scanner = HealthScanner()
+
+        reports = scanner.scan()
+        assert len(reports) == 1
+        assert reports[0].uuid == d0.uuid
+        assert reports[0].ecc == {'corrected.aggregate': 2}
+        assert reports[0].locations == {
+            'corrected.aggregate': {'device_memory': 2}}
+        assert reports[0].pending is False
+
+        # Nothing changed: only the totals and the pending flag are read
+        calls = sim.calls
+        assert scanner.scan() == []
+        assert sim.calls - calls == 5
+
+        # A double bit error, and its page waiting to be retired
+        for counter in (NVML_VOLATILE_ECC, NVML_AGGREGATE_ECC):
+            d0.ecc_errors[(NVML_MEMORY_ERROR_TYPE_UNCORRECTED, counter,
+                           NVML_MEMORY_LOCATION_DEVICE_MEMORY)] = 1
+        d0.retired_pages[NVML_PAGE_RETIREMENT_CAUSE_DOUBLE_BIT_ECC_ERROR] = [
+            0x1000]
+        d0.retired_pages_pending = 1
+        report, = scanner.scan()
+        assert report.ecc == {'uncorrected.volatile': 1,
+                              'uncorrected.aggregate': 1}
+        assert report.new_pages == {'double_bit': [0x1000]}
+        assert report.pending and report.rescanned
+
+        d0.ecc_errors[(NVML_MEMORY_ERROR_TYPE_CORRECTED, NVML_AGGREGATE_ECC,
+                       NVML_MEMORY_LOCATION_DEVICE_MEMORY)] = 5
+        report, = scanner.scan()
+        assert report.locations == {
+            'corrected.aggregate': {'device_memory': 3}}
+
+        # While retirement is pending, only the page counts are read, and the
+        # pages when a count changes. Only new pages are reported.
+        calls = sim.calls
+        assert scanner.scan() == []
+        assert sim.calls - calls == 7
+        d0.retired_pages[NVML_PAGE_RETIREMENT_CAUSE_DOUBLE_BIT_ECC_ERROR] = [
+            0x1000, 0x2000]
+        report, = scanner.scan()
+        assert report.new_pages == {'double_bit': [0x2000]}
+        d0.retired_pages_pending = 0
+        report, = scanner.scan()
+        assert report.pending is False and report.new_pages == {}
+        assert scanner.retired_pages(d0.uuid)['double_bit'] == [0x1000,
+                                                                0x2000]
+        nvmlShutdown()
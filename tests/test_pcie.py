@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, NVML_PCIE_UTIL_TX_BYTES,
+                             NVML_PCIE_UTIL_RX_BYTES)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.pcie import PcieMonitor, max_bandwidth
+
+
+def test_pcie_monitor():
+    with SimulatedNvml(4, latency=0.05) as sim:
+        nvmlInit()
+        d0 = sim.devices[0]
+        d0.pcie_link_generation = (1, 3)
+        d0.pcie_link_width = (8, 16)
+        d0.pcie_throughput = {NVML_PCIE_UTIL_TX_BYTES: 1000000,
+                              NVML_PCIE_UTIL_RX_BYTES: 500000}
+        sim.devices[1].unsupported.add('nvmlDeviceGetPcieThroughput')
+        with PcieMonitor() as monitor:
+            start = time.time()
+            samples = monitor.poll()
+            # 16 calls of 50ms, 0.8s one after the other
+            assert time.time() - start < 0.05 * 8
+            assert monitor.latest() == samples
+        nvmlShutdown()
+
+    s0, s1 = samples[:2]
+    assert s0.uuid == d0.uuid
+    assert s0.tx == 1000000 * 1024 and s0.rx == 500000 * 1024
+    assert s0.max == max_bandwidth(1, 8) == 2e9
+    assert s0.tx_utilization == 1024e6 / 2e9
+    assert s1.tx is s1.tx_utilization is None
+    assert s1.max == max_bandwidth(3, 16)
+    assert max_bandwidth(None, 16) is None
@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import os
+
+import pytest
+
+from py3nvml import py3nvml
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import Sampler
+from py3nvml.pool import snapshot_pool, worker_snapshot
+
+fork = pytest.mark.skipif(not hasattr(os, 'register_at_fork'),
+                          reason='needs os.register_at_fork')
+
+
+def _used(uuid):
+    return worker_snapshot().value(uuid, 'memory.used'), os.getpid()
+
+
+@fork
+def test_reinit_after_fork():
+    with SimulatedNvml(2) as sim:
+        py3nvml.nvmlInit()
+        py3nvml.nvmlDeviceGetCount()
+        pid = os.fork()
+        if pid == 0:
+            ok = py3nvml._nvmlLib_refcount == 0 and \
+                not py3nvml._nvmlGetFunctionPointer_cache
+            # Initialized again on first use
+            ok = ok and py3nvml.nvmlDeviceGetCount() == 2 and \
+                py3nvml._nvmlLib_refcount == 1
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert status == 0
+        assert py3nvml._nvmlLib_refcount == 1
+        py3nvml.nvmlShutdown()
+
+
+@fork
+def test_snapshot_pool():
+    ctx = multiprocessing.get_context('fork')
+    with SimulatedNvml(2) as sim:
+        py3nvml.nvmlInit()
+        sampler = Sampler()
+        uuid = sim.devices[0].uuid
+        pool = snapshot_pool(sampler, processes=2, context=ctx)
+        try:
+            used = sim.devices[0].used_memory
+            assert set(u for u, _ in pool.map(_used, [uuid] * 4)) == {used}
+            sim.devices[0].used_memory += 1 << 30
+            sampler.sample()
+            assert set(u for u, _ in pool.map(_used, [uuid] * 4)) == \
+                {used + (1 << 30)}
+        finally:
+            pool.terminate()
+            pool.join()
+        # The sampler doesn't publish for a pool that is gone
+        assert sampler._callbacks == []
+        with snapshot_pool(sampler, processes=1, context=ctx) as pool:
+            pool.close()
+            assert sampler._callbacks == []
+            pool.join()
+        py3nvml.nvmlShutdown()
+    assert worker_snapshot() is None
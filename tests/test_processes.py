@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from py3nvml import py3nvml
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.processes import ProcessMonitor
+from py3nvml.procinfo import ProcessInfoCache
+
+
+def test_process_monitor():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        sim.devices[0].add_process(10, 100, name='small')
+        sim.devices[0].add_process(11, 500, name='big')
+        sim.devices[1].add_process(11, 500, name='big')
+        monitor = ProcessMonitor()
+        monitor.poll()
+        assert monitor.top_memory(1) == [(11, 'big', 1000)]
+
+        # Names are only looked up for new processes
+        sim.devices[0].processes[0].usedGpuMemory = 300
+        sim.devices[0].processes[0].name = 'renamed'
+        monitor.poll()
+        assert monitor.name(10) == 'small'
+        assert monitor.top_growth(1)[0][:2] == (10, 'small')
+        assert len(monitor.usage(11)[sim.devices[1].uuid]) == 2
+
+        sim.devices[0].remove_process(10)
+        monitor.poll()
+        assert monitor.name(10) is None
+        nvmlShutdown()
+
+
+def test_process_monitor_device_error(monkeypatch):
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        sim.devices[0].add_process(10, 100, name='a')
+        sim.devices[1].add_process(11, 200, name='b')
+        monitor = ProcessMonitor()
+        monitor.poll()
+
+        # A gpu that can't be read keeps its processes and their history
+        get_procs = py3nvml.nvmlDeviceGetComputeRunningProcesses
+        lost = monitor.handles[1][1]
+
+        def flaky(handle):
+            if handle is lost:
+                raise py3nvml.NVMLError_Unknown()
+            return get_procs(handle)
+        monkeypatch.setattr(py3nvml, 'nvmlDeviceGetComputeRunningProcesses',
+                            flaky)
+        sim.devices[1].remove_process(11)
+        sim.devices[0].remove_process(10)
+        monitor.poll()
+        assert monitor.name(10) is None
+        assert monitor.name(11) == 'b'
+        assert len(monitor.usage(11)[sim.devices[1].uuid]) == 1
+        assert len(monitor.cache) == 1
+
+        monkeypatch.undo()
+        monitor.poll()
+        assert monitor.name(11) is None
+        nvmlShutdown()
+
+
+def test_process_monitor_pid_reused(tmpdir):
+    from test_procinfo import make_process
+    proc = tmpdir.mkdir('proc')
+    make_process(proc, 10, 1000, 'old', ['old'])
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        sim.devices[0].add_process(10, 100)
+        monitor = ProcessMonitor(cache=ProcessInfoCache(str(proc),
+                                                        use_nvml=False))
+        monitor.poll()
+        monitor.poll()
+        assert monitor.name(10) == 'old'
+        assert len(monitor.usage(10)[sim.devices[0].uuid]) == 2
+
+        # Between polls the process ends and a new one gets its pid
+        make_process(proc, 10, 2000, 'new', ['new'])
+        monitor.poll()
+        assert monitor.name(10) == 'new'
+        assert len(monitor.usage(10)[sim.devices[0].uuid]) == 1
+        nvmlShutdown()
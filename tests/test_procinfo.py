@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.procinfo import ProcessInfoCache, parse_cgroup
+
+CONTAINER = 'ab' * 32
+
+
+def make_process(proc, pid, start_time, comm, cmdline, uid=1000,
+                 cgroup='0::/user.slice\n'):
+    d = proc.mkdir(str(pid)) if not proc.join(str(pid)).check() \
+        else proc.join(str(pid))
+    d.join('stat').write('{} ({}) S 1 {} 0 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 '
+                         '{} 0 0\n'.format(pid, comm, pid, start_time))
+    d.join('comm').write(comm + '\n')
+    d.join('cmdline').write('\0'.join(cmdline) + '\0')
+    d.join('status').write('Name:\t{}\nUid:\t{}\t{}\t{}\t{}\n'.format(
+        comm, uid, uid, uid, uid))
+    d.join('cgroup').write(cgroup)
+
+
+def test_parse_cgroup():
+    assert parse_cgroup('0::/system.slice/docker-{}.scope\n'.format(
+        CONTAINER)) == '/system.slice/docker-{}.scope'.format(CONTAINER)
+    v1 = '12:cpu,cpuacct:/a\n4:memory:/docker/{}\n'.format(CONTAINER)
+    assert parse_cgroup(v1) == '/docker/{}'.format(CONTAINER)
+    assert parse_cgroup('') is None
+
+
+def test_process_info_cache(tmpdir):
+    proc = tmpdir.mkdir('proc')
+    make_process(proc, 42, 1000, 'my (odd) name', ['python', 'train.py'],
+                 cgroup='0::/kubepods/pod1/{}\n'.format(CONTAINER))
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        sim.devices[0].add_process(42, 1 << 30, name='/usr/bin/python')
+        cache = ProcessInfoCache(str(proc))
+        info = cache.get(42)
+        assert info.start_time == 1000 and info.name == '/usr/bin/python'
+        assert info.comm == 'my (odd) name'
+        assert info.cmdline == ['python', 'train.py']
+        assert info.uid == 1000 and info.container == CONTAINER
+
+        calls = sim.calls
+        assert cache.get(42) is info
+        assert sim.calls == calls
+
+        # The pid is reused by another process
+        make_process(proc, 42, 2000, 'other', ['other'], uid=0)
+        info = cache.get(42)
+        assert info.start_time == 2000 and info.uid == 0
+        assert info.container is None
+
+        # Without NVML, the name comes from the command line
+        assert ProcessInfoCache(str(proc), use_nvml=False).get(42).name == \
+            'other'
+        # Processes that nobody knows of
+        assert cache.get(43) is None
+        cache.prune([43])
+        assert len(cache) == 0
+        nvmlShutdown()
+
+
+def test_xml_query_unnamed_process():
+    from py3nvml.py3nvml import NVML_ERROR_NO_PERMISSION
+    from py3nvml.nvidia_smi import XmlDeviceQuery
+    with SimulatedNvml(1) as sim:
+        # Neither NVML nor /proc can name it, e.g. in a container
+        sim.process_name_error = NVML_ERROR_NO_PERMISSION
+        sim.devices[0].add_process(2**22 + 1, 1 << 30)
+        xml = XmlDeviceQuery()
+        assert '<pid>4194305</pid>' in xml
+        assert '<process_name>Insufficient Permissions</process_name>' in xml
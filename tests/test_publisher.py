@@ -0,0 +1,57 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import pytest
+
+from py3nvml.py3nvml import nvmlInit, nvmlShutdown
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import Sampler
+from py3nvml import publisher
+from py3nvml.publisher import SnapshotPublisher, SnapshotReader
+
+pytestmark = pytest.mark.skipif(publisher.shared_memory is None,
+                                reason='needs multiprocessing.shared_memory')
+
+
+def test_publish_and_read():
+    name = 'py3nvml_test_{}'.format(os.getpid())
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        sim.devices[1].add_process(1234, 1 << 30)
+        sampler = Sampler()
+        with SnapshotPublisher(sampler, name, max_processes=4) as pub:
+            reader = SnapshotReader(name)
+            assert reader.uuids == pub.uuids
+            assert reader.read() is None
+
+            snap = sampler.sample()
+            read = reader.read()
+            assert read == snap and read.timestamp == snap.timestamp
+            assert read.device_processes(sim.devices[1].uuid) == \
+                {1234: 1 << 30}
+            # Nothing new to copy
+            assert reader.read() is read
+
+            sim.devices[0].used_memory += 1
+            snap = sampler.sample()
+            assert reader.read(timeout=0) == snap
+
+            # The publisher died halfway through writing
+            pub.seq += 1
+            publisher._SEQ.pack_into(pub.buf, publisher._SEQ_OFFSET, pub.seq)
+            with pytest.raises(RuntimeError):
+                reader.read(timeout=0.01)
+            reader.close()
+
+            for pid in range(5):
+                sim.devices[0].add_process(pid, 1)
+            with pytest.raises(ValueError):
+                pub.publish(sampler.sample())
+        # The sampler stops publishing once the publisher is closed
+        assert sampler._callbacks == []
+        with pytest.raises(ValueError):
+            pub.publish(sampler.sample())
+        nvmlShutdown()
@@ -8,6 +8,7 @@ from py3nvml.py3nvml import *
 import pytest
 from py3nvml.utils import grab_gpus
 import os
+import sys
 
 
 def test_readme1():
@@ -41,3 +42,115 @@ def test_grabgpus4():
     assert '0' not in os.environ['CUDA_VISIBLE_DEVICES']
     assert '1' not in os.environ['CUDA_VISIBLE_DEVICES']
     assert '2' not in os.environ['CUDA_VISIBLE_DEVICES']
+
+
+def test_default_not_supported():
+    from py3nvml.simulated import SimulatedNvml
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        sim.devices[0].unsupported.add('nvmlDeviceGetFanSpeed')
+        handle = nvmlDeviceGetHandleByIndex(0)
+        assert nvmlDeviceGetFanSpeed(handle, default=None) is None
+        with pytest.raises(NVMLError_NotSupported):
+            nvmlDeviceGetFanSpeed(handle)
+        assert nvmlDeviceGetCurrentEccMode(handle, default='N/A') != 'N/A'
+        nvmlShutdown()
+        # Only NOT_SUPPORTED gives the default
+        with pytest.raises(NVMLError_Uninitialized):
+            nvmlDeviceGetFanSpeed(handle, default=None)
+
+
+def test_capability_cache():
+    from py3nvml.simulated import SimulatedNvml
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        sim.devices[0].unsupported.update(['nvmlDeviceGetFanSpeed',
+                                           'nvmlDeviceGetEccMode'])
+        handle = nvmlDeviceGetHandleByIndex(0)
+        assert nvmlDeviceGetFanSpeed(handle, default=None) is None
+        # Known to be unsupported, so answered without calling the driver,
+        # even through a new handle
+        calls = sim.calls
+        handle = nvmlDeviceGetHandleByIndex(0)
+        assert nvmlDeviceGetFanSpeed(handle, default=None) is None
+        with pytest.raises(NVMLError_NotSupported):
+            nvmlDeviceGetFanSpeed(handle)
+        assert sim.calls == calls + 1
+        # Other devices are unaffected
+        nvmlDeviceGetFanSpeed(nvmlDeviceGetHandleByIndex(1))
+
+        caps = nvmlDeviceProbeCapabilities(handle)
+        assert caps['nvmlDeviceGetFanSpeed'] is False
+        assert caps['nvmlDeviceGetEccMode'] is False
+        assert caps['nvmlDeviceGetPowerUsage'] is True
+        assert caps[('nvmlDeviceGetClockInfo', NVML_CLOCK_SM)] is True
+        assert nvmlDeviceGetCapabilities(handle) == caps
+        nvmlShutdown()
+
+        # Forgotten on shutdown
+        nvmlInit()
+        handle = nvmlDeviceGetHandleByIndex(0)
+        assert nvmlDeviceGetCapabilities(handle) == {}
+        nvmlShutdown()
+
+
+def test_capability_cache_mode_dependent():
+    from py3nvml.simulated import SimulatedNvml
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        sim.devices[0].accounting_mode = 0
+        handle = nvmlDeviceGetHandleByIndex(0)
+        assert nvmlDeviceGetAccountingPids(handle, default=None) is None
+        caps = nvmlDeviceProbeCapabilities(handle)
+        nvmlDeviceSetCapabilities(handle, {'nvmlDeviceGetAccountingStats':
+                                           False})
+        assert not any('Accounting' in str(k) for k in caps)
+        assert nvmlDeviceGetCapabilities(handle) == caps
+
+        # Turning accounting on takes effect straight away
+        nvmlDeviceSetAccountingMode(handle, NVML_FEATURE_ENABLED)
+        sim.devices[0].account(10)
+        assert nvmlDeviceGetAccountingPids(handle) == [10]
+        assert nvmlDeviceGetAccountingStats(handle, 10).isRunning == 1
+        nvmlShutdown()
+
+
+def test_capability_cache_arguments():
+    from py3nvml.simulated import SimulatedNvml
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        query = sim.nvmlDeviceGetSupportedGraphicsClocks
+
+        def graphics_clocks(handle, memoryClockMHz, c_count, c_clocks):
+            if memoryClockMHz.value == 405:
+                return NVML_ERROR_NOT_SUPPORTED
+            return query(handle, memoryClockMHz, c_count, c_clocks)
+        sim.nvmlDeviceGetSupportedGraphicsClocks = graphics_clocks
+        handle = nvmlDeviceGetHandleByIndex(0)
+        assert nvmlDeviceGetSupportedGraphicsClocks(handle, 405,
+                                                    default=None) is None
+        # Only the memory clock it failed at is known to be unsupported
+        assert nvmlDeviceGetSupportedGraphicsClocks(handle, 2505)
+        assert nvmlDeviceGetCapabilities(handle)[
+            ('nvmlDeviceGetSupportedGraphicsClocks', 405)] is False
+        assert nvmlDeviceGetSupportedClocks(handle, default=None) is None
+        nvmlShutdown()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='needs module __getattr__')
+def test_lazy_import():
+    import subprocess
+    code = ('import sys, py3nvml; '
+            'assert "py3nvml.utils" not in sys.modules; '
+            'assert "py3nvml.nvidia_smi" not in sys.modules; '
+            'py3nvml.grab_gpus; py3nvml.nvidia_smi; '
+            'assert "py3nvml.utils" in sys.modules')
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+def test_error_classes():
+    assert type(NVMLError(NVML_ERROR_NOT_FOUND)) is NVMLError_NotFound
+    assert NVMLError_AlreadyInitialized().value == \
+        NVML_ERROR_ALREADY_INITIALIZED
+    assert type(NVMLError(12345)) is NVMLError
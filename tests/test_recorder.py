@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+from py3nvml.snapshot import Snapshot, MISSING
+from py3nvml.recorder import Recorder, load_segments, segment_paths
+
+
+def _snapshot(t, uuids, used):
+    fields = ('memory.used', 'power.draw')
+    values = []
+    for u in used:
+        values += [u, 50000]
+    from array import array
+    return Snapshot(t, uuids, fields, array('q', values), array('q'))
+
+
+def test_recorder(tmpdir):
+    d = str(tmpdir)
+    fields = ('memory.used', 'power.draw', 'pcie.tx')
+    with Recorder(d, fields=fields) as rec:
+        for t in range(10):
+            rec.write(_snapshot(t, ['a', 'b'], [t, 2 * t]))
+        # reader sees what was written so far
+        seg, = load_segments(d)
+        assert seg.count == 20
+        # The gpus changed
+        rec.write(_snapshot(10, ['b'], [20]))
+
+    first, second = load_segments(d)
+    assert first.uuids == ['a', 'b'] and second.uuids == ['b']
+    assert first.fields == fields
+    a = first.array()
+    assert a['timestamp'].tolist() == [t for t in range(10) for _ in 'ab']
+    assert a['gpu'].tolist() == [0, 1] * 10
+    assert first.column(a, 'memory.used')[1::2].tolist() == \
+        [2 * t for t in range(10)]
+    assert (first.column(a, 'pcie.tx') == MISSING).all()
+    records = list(second.records())
+    assert records == [(10.0, 'b', (20, 50000, MISSING))]
+    # the unused space is given back
+    assert os.path.getsize(second.path) == \
+        second.header_size + second.record_size
+
+
+def test_recorder_rotation(tmpdir):
+    d = str(tmpdir)
+    rec = Recorder(d, fields=('memory.used',), segment_size=4096 + 24 * 10,
+                   max_segments=3)
+    for t in range(100):
+        rec.write(_snapshot(t, ['a', 'b'], [t, t]))
+    rec.close()
+    segs = load_segments(d)
+    assert len(segs) == 3
+    # 5 snapshots per segment, the last 15 are kept
+    times = np.concatenate([s.array()['timestamp'] for s in segs])
+    assert times.tolist() == [t for t in range(85, 100) for _ in 'ab']
+    # a new recorder carries on numbering
+    Recorder(d, fields=('memory.used',)).write(_snapshot(0, ['a'], [0]))
+    assert segment_paths(d)[-1].endswith('gpu-000020.bin')
@@ -0,0 +1,60 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import pytest
+
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.session import Session, get_session
+from py3nvml.utils import grab_gpus
+
+
+def test_session_scopes():
+    with SimulatedNvml(2) as sim:
+        session = get_session()
+        with session:
+            assert sim.init_count == 1
+            with session:
+                assert grab_gpus(1) == 1
+            # Nested scopes and grab_gpus shared the first initialization
+            assert sim.init_count == 1 and session.active
+        assert sim.init_count == 0 and not session.active
+        with pytest.raises(RuntimeError):
+            session.release()
+
+
+def test_session_fork(monkeypatch):
+    with SimulatedNvml(1) as sim:
+        session = Session()
+        session.acquire()
+        # A forked child doesn't inherit the scope, and initializes again
+        pid = os.getpid()
+        monkeypatch.setattr(os, 'getpid', lambda: pid + 1)
+        assert not session.active
+        with session:
+            assert sim.init_count == 2
+        monkeypatch.undo()
+
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_session_fork_in_scope():
+    with SimulatedNvml(1) as sim:
+        session = Session()
+        pid = None
+        try:
+            with session:
+                pid = os.fork()
+                if pid == 0:
+                    with session:
+                        ok = session.active
+            # The child leaves the scope it inherited without an error
+            ok = (pid != 0 or ok) and not session.active
+        except Exception:
+            ok = False
+        if pid == 0:
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert ok and status == 0 and sim.init_count == 0
@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pickle
+
+import pytest
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, NVML_CLOCK_SM,
+                             nvmlDeviceGetHandleByIndex, nvmlDeviceGetUUID,
+                             NVML_MEMORY_ERROR_TYPE_CORRECTED,
+                             NVML_VOLATILE_ECC)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import take_snapshot, FIELDS
+
+
+def test_snapshot_diff():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        d0, d1 = sim.devices
+        d0.add_process(100, 1 << 30)
+        d0.add_process(101, 1 << 20)
+        d1.unsupported.add('nvmlDeviceGetTotalEccErrors')
+        a = take_snapshot()
+        assert a.value(d0.uuid, 'memory.used') == (1 << 30) + (1 << 20)
+        assert a.value(d1.uuid, 'ecc.errors.corrected.volatile.total') is None
+        assert a.device_processes(d0.uuid) == {100: 1 << 30, 101: 1 << 20}
+        assert a.diff(take_snapshot()).changes == []
+
+        d0.remove_process(101)
+        d0.add_process(102, 1 << 20)
+        d1.clocks[NVML_CLOCK_SM] = 1400
+        d1.throttle_reasons = 0x8000000000000004
+        d0.ecc_errors[(NVML_MEMORY_ERROR_TYPE_CORRECTED, NVML_VOLATILE_ECC,
+                       0)] = 3
+        d0.retired_pages[0] = [0x1000]
+        b = take_snapshot()
+        d = a.diff(b)
+        assert d.added == d.removed == []
+        assert sorted(d.changes) == sorted([
+            (d0.uuid, 'ecc.errors.corrected.volatile.total', 0, 3),
+            (d0.uuid, 'retired_pages.double_bit.count', 0, 1),
+            (d1.uuid, 'clocks.sm', 1100, 1400),
+            (d1.uuid, 'clocks_throttle_reasons.active', 1,
+             0x8000000000000004)])
+        assert d.started == [(d0.uuid, 102, 1 << 20)]
+        assert d.ended == [(d0.uuid, 101, 1 << 20)]
+        assert d.memory == []
+
+        assert pickle.loads(pickle.dumps(b)) == b
+        with pytest.raises(ValueError):
+            a.diff(take_snapshot(fields=FIELDS))
+        nvmlShutdown()
+
+
+def test_snapshot_diff_devices():
+    with SimulatedNvml(3) as sim:
+        nvmlInit()
+        a = take_snapshot()
+        sim.devices[2].power_usage = 70000
+        sim.devices[1].add_process(100, 1 << 20)
+        # as if the first gpu fell off the bus
+        handles = []
+        for i in (1, 2):
+            h = nvmlDeviceGetHandleByIndex(i)
+            handles.append((nvmlDeviceGetUUID(h), h))
+        b = take_snapshot(handles)
+        d = a.diff(b)
+        assert d.removed == [a.uuids[0]]
+        assert d.added == []
+        assert d.changes == [
+            (a.uuids[1], 'memory.used', 0, 1 << 20),
+            (a.uuids[1], 'memory.free', 16 << 30, (16 << 30) - (1 << 20)),
+            (a.uuids[2], 'power.draw', 50000, 70000)]
+        assert d.started == [(a.uuids[1], 100, 1 << 20)]
+        nvmlShutdown()
@@ -0,0 +1,88 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+from py3nvml import static_info
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown,
+                             nvmlDeviceGetHandleByIndex, nvmlDeviceGetFanSpeed)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.static_info import StaticInfoCache
+
+
+def test_static_info_cache(tmpdir):
+    path = str(tmpdir.join('static.json'))
+    with SimulatedNvml(2) as sim:
+        sim.devices[1].unsupported.add('nvmlDeviceGetFanSpeed')
+        nvmlInit()
+        devices = StaticInfoCache(path).get()
+        assert os.path.exists(path)
+        assert [d['uuid'] for d in devices] == [d.uuid for d in sim.devices]
+        assert devices[0]['supported_clocks'][405] == [405]
+        nvmlShutdown()
+
+        # A new process gets the same answers with far fewer calls
+        nvmlInit()
+        calls = sim.calls
+        assert StaticInfoCache(path).get() == devices
+        # version, count, 2 handles and 2 uuids
+        assert sim.calls - calls == 6
+        # and knows what isn't supported without asking
+        calls = sim.calls
+        assert nvmlDeviceGetFanSpeed(nvmlDeviceGetHandleByIndex(1),
+                                     default=None) is None
+        assert sim.calls - calls == 1
+        nvmlShutdown()
+
+
+def test_static_info_cache_invalidation(tmpdir, monkeypatch):
+    path = str(tmpdir.join('static.json'))
+    boot_id = tmpdir.join('boot_id')
+    boot_id.write('a\n')
+    monkeypatch.setattr(static_info, 'BOOT_ID_PATH', str(boot_id))
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        cache = StaticInfoCache(path)
+        cache.get()
+        assert cache.load() is not None
+
+        sim.driver_version = '390.30'
+        assert cache.load() is None
+        cache.get()
+        assert cache.load() is not None
+
+        # Reboot
+        boot_id.write('b\n')
+        assert cache.load() is None
+        cache.get()
+
+        # Driver reloaded with other gpus
+        sim.devices[0].uuid = 'GPU-other'
+        assert cache.load() is None
+        assert StaticInfoCache(path, verify=False).load() is not None
+        assert cache.get()[0]['uuid'] == 'GPU-other'
+        nvmlShutdown()
+
+
+def test_static_info_cache_untrusted(tmpdir, monkeypatch):
+    monkeypatch.delenv('PY3NVML_CACHE', raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir))
+    path = str(tmpdir.join('py3nvml', 'static.json'))
+    with SimulatedNvml(1) as sim:
+        sim.devices[0].accounting_mode = 0
+        nvmlInit()
+        cache = StaticInfoCache()
+        assert cache.path == path
+        devices = cache.get()
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        # Accounting can be turned on at any time, so it isn't saved
+        assert not any('Accounting' in str(k)
+                       for k in devices[0]['capabilities'])
+        assert cache.load() is not None
+
+        # Someone else could have written it
+        os.chmod(path, 0o666)
+        assert cache.load() is None
+        nvmlShutdown()
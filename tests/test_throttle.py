@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, NVML_PERF_POLICY_POWER,
+                             NVML_PERF_POLICY_THERMAL,
+                             nvmlClocksThrottleReasonSwPowerCap,
+                             nvmlClocksThrottleReasonGpuIdle)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.throttle import ThrottleAnalyzer
+
+
+def test_throttle_analyzer():
+    with SimulatedNvml(2) as sim:
+        nvmlInit()
+        d0, d1 = sim.devices
+        d1.unsupported.add('nvmlDeviceGetViolationStatus')
+        analyzer = ThrottleAnalyzer(window=3600)
+
+        analyzer.poll()
+        d0.throttle_reasons = nvmlClocksThrottleReasonSwPowerCap
+        # 1s later, 0.5s of it power capped, none of it too hot
+        d0.violation_status = {NVML_PERF_POLICY_POWER: (10 ** 6, 5 * 10 ** 8),
+                               NVML_PERF_POLICY_THERMAL: (10 ** 6, 0)}
+        analyzer.poll()
+        s0, s1 = analyzer.stats()
+        assert s0.power == s0.recent_power == 0.5
+        assert s0.thermal == 0
+        assert s0.active == ['sw_power_cap']
+        assert s0.reasons['sw_power_cap'] == s0.lossy == 0.5
+        assert s1.power is s1.thermal is None
+        assert s1.active == ['gpu_idle'] and s1.lossy == 0
+
+        # Another 1s, not capped any more
+        calls = sim.calls
+        d0.throttle_reasons = nvmlClocksThrottleReasonGpuIdle
+        d0.violation_status = {NVML_PERF_POLICY_POWER: (2 * 10 ** 6,
+                                                        5 * 10 ** 8),
+                               NVML_PERF_POLICY_THERMAL: (2 * 10 ** 6, 0)}
+        analyzer.poll()
+        # The unsupported counters aren't asked for again
+        assert sim.calls - calls == 4
+        s0, s1 = analyzer.stats()
+        assert s0.recent_power == 0
+        assert s0.power == 0.25
+        assert [s.uuid for s in analyzer.throttled(0.2)] == [d0.uuid]
+        assert analyzer.throttled(0.5) == []
+
+        # The driver was reloaded and the counters start again
+        d0.violation_status = {NVML_PERF_POLICY_POWER: (10, 0),
+                               NVML_PERF_POLICY_THERMAL: (10, 0)}
+        analyzer.poll()
+        s0 = analyzer.stats()[0]
+        assert s0.power is None and s0.recent_power is None
+        assert s0.lossy == 0
+        nvmlShutdown()
@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+
+from py3nvml.py3nvml import (nvmlInit, nvmlShutdown, NVML_CLOCK_GRAPHICS,
+                             NVML_CLOCK_SM)
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.snapshot import Sampler
+from py3nvml.tuning import Tuner, Profile, TuningError
+
+
+def test_tuner_apply_and_rollback():
+    with SimulatedNvml(3) as sim:
+        nvmlInit()
+        d0, d1, d2 = sim.devices
+        d2.unsupported.add('nvmlDeviceGetSupportedMemoryClocks')
+        tuner = Tuner()
+        profile = Profile(memory_clock=2505, graphics_clock=1328,
+                          power_limit=200000)
+
+        problems = tuner.check(profile)
+        assert list(problems) == [d2.uuid]
+        assert tuner.check(Profile(2505, 1329), [d0.uuid])
+        assert tuner.check(Profile(power_limit=50000), [d0.uuid])
+        assert tuner.check(Profile(memory_clock=2505), [d0.uuid])
+        with pytest.raises(TuningError) as info:
+            tuner.apply(profile)
+        assert list(info.value.errors) == [d2.uuid]
+        # Nothing was changed
+        assert d0.power_limit == 250000 and tuner.saved == {}
+
+        tuner.apply(profile, [d0.uuid, d1.uuid])
+        assert d0.applications_clocks[NVML_CLOCK_GRAPHICS] == 1328
+        assert d1.power_limit == 200000
+        assert tuner.current(d0.uuid) == profile
+        # Tuning again still rolls back to the first settings
+        tuner.apply(Profile(power_limit=150000), [d0.uuid])
+        tuner.rollback()
+        assert tuner.saved == {}
+        for d in (d0, d1):
+            assert d.power_limit == 250000
+            assert d.applications_clocks == d.default_applications_clocks
+
+        # If one gpu can't be set, the others are put back
+        d1.writable = False
+        with pytest.raises(TuningError) as info:
+            tuner.apply(Profile(power_limit=200000), [d0.uuid, d1.uuid])
+        assert list(info.value.errors) == [d1.uuid]
+        assert d0.power_limit == 250000 and tuner.saved == {}
+        nvmlShutdown()
+
+
+def test_tuner_evaluate():
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        d = sim.devices[0]
+        d.utilization = (100, 50)
+        d.power_usage = 250000
+        tuner = Tuner()
+        # The simulated power draw drops to the new limit, the clock doesn't
+        result = tuner.evaluate(Profile(power_limit=125000),
+                                Sampler(interval=0.01), duration=0)
+        before, after = result[d.uuid]
+        assert before.power == 250 and after.power == 125
+        assert before.throughput == after.throughput == \
+            d.clocks[NVML_CLOCK_SM]
+        assert after.per_watt == 2 * before.per_watt
+        assert d.power_limit == 250000
+        nvmlShutdown()
+
+
+def test_tuner_rollback_leaves_clocks_alone():
+    with SimulatedNvml(1) as sim:
+        nvmlInit()
+        d = sim.devices[0]
+        # The clocks can't be read or reset, but a power limit can be set
+        d.unsupported.update(['nvmlDeviceGetApplicationsClock',
+                              'nvmlDeviceResetApplicationsClocks'])
+        tuner = Tuner()
+        tuner.apply(Profile(power_limit=200000))
+        tuner.rollback()
+        assert d.power_limit == 250000 and tuner.saved == {}
+        nvmlShutdown()
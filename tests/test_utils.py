@@ -0,0 +1,133 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+import os
+import threading
+import time
+import pytest
+from py3nvml.simulated import SimulatedNvml
+from py3nvml.utils import grab_gpus, wait_for_gpus, GpuClaimRegistry
+
+
+def test_claims_disjoint(tmpdir):
+    registry = GpuClaimRegistry(str(tmpdir.join('claims.json')))
+    uuids = ['GPU-a', 'GPU-b', 'GPU-c']
+    mine = registry.claim(uuids, 2)
+    theirs = registry.claim(uuids, 2, pid=os.getppid())
+    assert mine == ['GPU-a', 'GPU-b']
+    assert theirs == ['GPU-c']
+    registry.release()
+    assert list(registry.claims()) == ['GPU-c']
+
+
+def test_claims_expire(tmpdir):
+    registry = GpuClaimRegistry(str(tmpdir.join('claims.json')))
+    # A pid that can't exist
+    registry.claim(['GPU-a'], pid=2**22 + 1)
+    registry.claim(['GPU-b'], pid=os.getppid(), lease=0.01)
+    time.sleep(0.02)
+    assert registry.claims() == {}
+
+
+def test_grabgpus_claim(tmpdir, caplog):
+    registry = GpuClaimRegistry(str(tmpdir.join('claims.json')))
+    with SimulatedNvml(4) as sim:
+        registry.claim([sim.devices[0].uuid], pid=os.getppid())
+        with caplog.at_level(logging.INFO, 'py3nvml.utils'):
+            res = grab_gpus(2, claim=registry)
+        assert res == 2
+        assert os.environ['CUDA_VISIBLE_DEVICES'] == '1,2'
+        # Only the gpu someone else holds is said to be
+        assert [r.getMessage() for r in caplog.records
+                if 'claimed' in r.getMessage()] == \
+            ['GPU 0 is claimed by another process. Skipping.']
+        assert grab_gpus(2, claim=registry) == 2
+        assert os.environ['CUDA_VISIBLE_DEVICES'] == '1,2'
+
+
+def test_wait_for_gpus_event():
+    with SimulatedNvml(2) as sim:
+        for d in sim.devices:
+            d.add_process(1000 + d.index, d.total_memory // 2)
+
+        def finish():
+            time.sleep(0.2)
+            sim.devices[1].remove_process(1001)
+            sim.post_event(sim.devices[1])
+        threading.Thread(target=finish).start()
+
+        start = time.time()
+        # The poll interval is too long to notice the change without events
+        res = wait_for_gpus(1, timeout=5, min_interval=5)
+        assert time.time() - start < 2
+        assert res == 1
+        assert os.environ['CUDA_VISIBLE_DEVICES'] == '1'
+
+
+def test_wait_for_gpus_timeout():
+    with SimulatedNvml(2) as sim:
+        sim.devices[0].add_process(1000, 1 << 30)
+        with pytest.warns(RuntimeWarning):
+            res = wait_for_gpus(2, timeout=0.2, min_interval=0.01)
+        assert res == 1
+        assert os.environ['CUDA_VISIBLE_DEVICES'] == '1'
+
+
+def test_claims_private(tmpdir, monkeypatch):
+    monkeypatch.delenv('PY3NVML_CLAIMS', raising=False)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmpdir))
+    registry = GpuClaimRegistry()
+    assert registry.path == str(tmpdir.join('py3nvml-gpu-claims.json'))
+    registry.claim(['GPU-a'])
+    assert os.stat(registry.path).st_mode & 0o777 == 0o600
+    registry.release()
+
+
+def test_grabgpus_released_on_error(tmpdir, monkeypatch):
+    from py3nvml import py3nvml
+    registry = GpuClaimRegistry(str(tmpdir.join('claims.json')))
+    with SimulatedNvml(3) as sim:
+        sim.devices[0].unsupported.add('nvmlDeviceGetMemoryInfo')
+        with pytest.raises(py3nvml.NVMLError_NotSupported):
+            grab_gpus(1, claim=registry)
+        # The session was let go of
+        assert sim.init_count == 0
+        sim.devices[0].unsupported.clear()
+
+        # Fail after claiming, while logging the gpu someone else holds
+        registry.claim([sim.devices[0].uuid], pid=os.getppid())
+
+        def fail(*args, **kwargs):
+            raise RuntimeError('boom')
+        monkeypatch.setattr(logging.getLogger('py3nvml.utils'), 'info', fail)
+        with pytest.raises(RuntimeError):
+            grab_gpus(1, claim=registry)
+        assert sim.init_count == 0
+        assert list(registry.claims()) == [sim.devices[0].uuid]
+
+
+def test_wait_for_gpus_lost_race(tmpdir, monkeypatch):
+    from py3nvml import utils
+    registry = GpuClaimRegistry(str(tmpdir.join('claims.json')))
+    grab = utils._grab_gpus
+    lost = []
+
+    def racing_grab(num_gpus, gpu_select, gpu_fraction, claim, lease):
+        # Loses the race many times over, claiming one gpu each time
+        assert sim.devices[0].uuid in claim.claims()
+        if len(lost) < 1100:
+            lost.append(1)
+            return 0, claim._claim([sim.devices[1].uuid])[1]
+        return grab(num_gpus, gpu_select, gpu_fraction, claim, lease)
+
+    monkeypatch.setattr(utils, '_grab_gpus', racing_grab)
+    with SimulatedNvml(2) as sim:
+        # Held from an earlier call, so it isn't let go of
+        registry.claim([sim.devices[0].uuid])
+        res = wait_for_gpus(2, claim=registry, min_interval=0.001)
+        assert res == 2
+        assert len(lost) == 1100
+        assert sorted(registry.claims()) == sorted(d.uuid
+                                                   for d in sim.devices)